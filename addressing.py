@@ -0,0 +1,57 @@
+"""IPv4 and MAC addresses as plain integers, parsed once and formatted on demand."""
+import functools
+import ipaddress
+import random
+
+BROADCAST_MAC = 0xFFFFFFFFFFFF
+
+
+@functools.lru_cache(maxsize=65536)
+def ip_to_int(ip):
+    """Return the dotted-quad ip as a 32-bit int, or None if it is empty or invalid."""
+    try:
+        return int(ipaddress.IPv4Address(ip))
+    except ValueError:
+        return None
+
+
+@functools.lru_cache(maxsize=65536)
+def int_to_ip(value):
+    """Format a 32-bit int as a dotted quad ('' for None)."""
+    if value is None:
+        return ""
+    return f"{value >> 24 & 255}.{value >> 16 & 255}.{value >> 8 & 255}.{value & 255}"
+
+
+@functools.lru_cache(maxsize=65536)
+def cidr_to_int(cidr):
+    """Return (network_int, prefix_len) for a CIDR string, or None if it is invalid."""
+    try:
+        net = ipaddress.IPv4Network(cidr, strict=False)
+    except ValueError:
+        return None
+    return int(net.network_address), net.prefixlen
+
+
+def prefix_mask(prefix_len):
+    return (0xFFFFFFFF << (32 - prefix_len)) & 0xFFFFFFFF
+
+
+def mac_to_int(mac):
+    """Return a colon-separated MAC as a 48-bit int, or None if it is invalid."""
+    try:
+        value = int(mac.replace(':', '').replace('-', ''), 16)
+    except (AttributeError, ValueError):
+        return None
+    return value if 0 <= value <= BROADCAST_MAC else None
+
+
+@functools.lru_cache(maxsize=65536)
+def int_to_mac(value):
+    """Format a 48-bit int as a colon-separated MAC."""
+    digits = f"{value:012x}"
+    return ":".join(digits[i:i + 2] for i in range(0, 12, 2))
+
+
+def random_mac(rng=random):
+    return rng.getrandbits(48)
@@ -0,0 +1,120 @@
+"""Structured, lazily formatted event log kept in a bounded ring buffer.
+
+A record keeps the message template and its raw fields; the text is only
+built when someone reads it (the GUI log box, echo to stdout, an export).
+Fields whose names end in _ip or _mac hold integers and are shown as dotted
+quads and colon-separated MACs.
+
+Records below `level` or outside `categories` are rejected before a record
+is built. A disabled call still pays for the call and its arguments, so code
+that logs for every frame checks enabled() before building them.
+"""
+from collections import deque
+
+from addressing import int_to_ip, int_to_mac
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+OFF = 100
+
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'off': OFF}
+
+# Categories used by the simulator
+CATEGORIES = ('event', 'history', 'host', 'switch', 'router', 'arp', 'frame', 'flow', 'ui')
+
+DEFAULT_CAPACITY = 10000
+
+
+def _format_field(name, value):
+    if value is None:
+        return value
+    if name.endswith('_ip'):
+        return int_to_ip(value)
+    if name.endswith('_mac'):
+        return int_to_mac(value)
+    return value
+
+
+class LogRecord:
+    __slots__ = ('seq', 'time', 'level', 'category', 'device_uid', 'template', 'fields', '_message')
+
+    def __init__(self, seq, time, level, category, device_uid, template, fields):
+        self.seq = seq
+        self.time = time              # Simulated seconds
+        self.level = level
+        self.category = category
+        self.device_uid = device_uid  # uid of the device the record is about, if any
+        self.template = template      # str.format template over fields
+        self.fields = fields
+        self._message = None
+
+    @property
+    def message(self):
+        if self._message is None:
+            if self.fields:
+                self._message = self.template.format(
+                    **{name: _format_field(name, value) for name, value in self.fields.items()})
+            else:
+                self._message = self.template
+        return self._message
+
+    def __str__(self):
+        return self.message
+
+    def to_dict(self):
+        return {'seq': self.seq, 'time': self.time, 'level': self.level, 'category': self.category,
+                'device': self.device_uid, 'message': self.message, **self.fields}
+
+
+class EventLog:
+    def __init__(self, capacity=DEFAULT_CAPACITY, level=INFO, categories=None, echo=False):
+        self.records = deque(maxlen=capacity)
+        self.level = level
+        self.categories = None if categories is None else frozenset(categories)
+        self.echo = echo              # Also print each record as it is logged
+        self.total = 0                # Records accepted since the log was created
+        self._event_start = 0         # Value of total when the current event began
+
+    def __len__(self):
+        return len(self.records)
+
+    def enabled(self, level, category):
+        return level >= self.level and (self.categories is None or category in self.categories)
+
+    def add(self, time, level, category, template, device=None, fields=None):
+        if level < self.level or (self.categories is not None and category not in self.categories):
+            return None
+        record = LogRecord(self.total, time, level, category,
+                           device.uid if device is not None else None, template, fields)
+        self.records.append(record)
+        self.total += 1
+        if self.echo:
+            print(record.message)
+        return record
+
+    def begin_event(self):
+        """Mark the start of a new event; current_event() returns what is logged after this."""
+        self._event_start = self.total
+
+    def current_event_count(self):
+        """Number of records logged since begin_event() that are still in the buffer."""
+        return max(0, min(self.total - self._event_start, len(self.records)))
+
+    def current_event_slice(self, start, stop):
+        """Records start..stop-1 of the current event, without copying the rest."""
+        count = self.current_event_count()
+        base = len(self.records) - count
+        records = self.records
+        return [records[base + i] for i in range(max(start, 0), min(stop, count))]
+
+    def current_event(self):
+        """Records logged since begin_event() that are still in the buffer."""
+        return self.current_event_slice(0, self.current_event_count())
+
+    def messages(self, records=None):
+        return [record.message for record in (self.records if records is None else records)]
+
+    def clear(self):
+        self.records.clear()
+        self._event_start = self.total
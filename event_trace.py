@@ -0,0 +1,491 @@
+"""Compact binary trace of a simulation run, and replay of it without simulating.
+
+A trace starts with the topology it was recorded on, followed by one record
+per processed event and one per event it queued, appended as the run goes:
+
+    header    MAGIC, version
+    topology  devices (uid, type, position, ports, MAC, IP, mask, gateway,
+              router interfaces) then links (the two device uids, delay)
+    records   tag, time, event type, device uid and frame headers (MACs,
+              IPs, TTL, flow id, payload), packed with RECORD
+
+Enqueue records follow the event record that caused them. A 'forward'
+enqueue for another device is a frame the event's device put on the wire.
+Records are buffered and written in blocks, so tracing a long headless run
+costs one struct pack per event and enqueue.
+
+Alongside the trace, <trace>.idx holds one fixed-width INDEX_ENTRY per event
+(byte offset of its record, simulated time). It is memory-mapped when read,
+so seeking to an event number or a time is a lookup or a binary search over
+the file, however long the trace is, without loading it.
+
+Example:
+    sim.enable_trace('run.trace')
+    sim.start_simulation()
+    sim.run()
+    sim.trace.close()
+
+    python very_abstract_network_PDU_journey_simulator.py --replay run.trace
+"""
+import bisect
+import mmap
+import os
+import struct
+
+from event_log import INFO
+
+MAGIC = b'PDUTRACE'
+VERSION = 1
+BUFFER_SIZE = 1 << 16  # Bytes collected before a write
+
+EVENT = 1
+ENQUEUE = 2
+
+EVENT_TYPES = ('send', 'forward', 'arp_request', 'arp_response')
+DEVICE_TYPES = ('host', 'router', 'switch', 'hub', 'bridge')
+
+# Well-known payloads get a code; anything else is stored as text after the record
+TEXT_PAYLOAD = 0
+NO_PAYLOAD = 255
+PAYLOAD_CODES = {'ACK': 1, 'ARP_REQUEST': 2, 'ARP_RESPONSE': 3}
+PAYLOADS = {code: payload for payload, code in PAYLOAD_CODES.items()}
+
+HEADER = struct.Struct('<8sH')
+COUNT = struct.Struct('<I')
+DEVICE = struct.Struct('<iBddHQ')  # uid, type, x, y, port count, MAC
+INTERFACE = struct.Struct('<H')    # port, followed by IP and mask strings
+LINK = struct.Struct('<iid')       # device uids, delay
+# tag, time, event type, device uid, src MAC, dst MAC, src IP, dst IP, TTL, flow id, payload code
+RECORD = struct.Struct('<BdBiQQIIBiB')
+TEXT_LENGTH = struct.Struct('<H')
+
+INDEX_MAGIC = b'PDUTRIDX'
+INDEX_HEADER = struct.Struct('<8sH')
+INDEX_ENTRY = struct.Struct('<Qd')  # byte offset of the event record, simulated time
+
+REPLAY_WARMUP = 5000  # Most earlier events re-read after a seek to find the frames in flight
+
+_EVENT_CODES = {name: code for code, name in enumerate(EVENT_TYPES)}
+_DEVICE_CODES = {name: code for code, name in enumerate(DEVICE_TYPES)}
+
+
+def _pack_text(text):
+    data = text.encode('utf-8')
+    return TEXT_LENGTH.pack(len(data)) + data
+
+
+def index_path(path):
+    return path + '.idx'
+
+
+class _Reader:
+    """Reads structs and strings from a binary file."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def read(self, fmt):
+        data = self.f.read(fmt.size)
+        if len(data) < fmt.size:
+            raise EOFError
+        return fmt.unpack(data)
+
+    def text(self):
+        length, = self.read(TEXT_LENGTH)
+        data = self.f.read(length)
+        if len(data) < length:
+            raise EOFError
+        return data.decode('utf-8')
+
+
+########################################################################
+# Recording
+########################################################################
+class TraceWriter:
+    def __init__(self, path, sim, buffer_size=BUFFER_SIZE):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.index_file = open(index_path(path), 'wb')
+        self.buffer = bytearray()
+        self.index_buffer = bytearray(INDEX_HEADER.pack(INDEX_MAGIC, VERSION))
+        self.buffer_size = buffer_size
+        self.records = 0  # Event and enqueue records written
+        self.events = 0   # Event records written, one index entry each
+        self._flushed = 0  # Bytes of the trace already written to the file
+        self._write_topology(sim)
+
+    def _write_topology(self, sim):
+        out = self.buffer
+        out += HEADER.pack(MAGIC, VERSION)
+        out += COUNT.pack(len(sim.devices))
+        for device in sim.devices:
+            out += DEVICE.pack(device.uid, _DEVICE_CODES[device.type], device.x, device.y,
+                               len(device.ports), device.mac_int)
+            out += _pack_text(device.ip) + _pack_text(device.subnet_mask) + _pack_text(device.gateway)
+            out += COUNT.pack(len(device.interfaces))
+            for port, interface in device.interfaces.items():
+                out += INTERFACE.pack(port)
+                out += _pack_text(interface.get('ip', '')) + _pack_text(interface.get('mask', ''))
+        links = sorted(sim.links.values(), key=lambda link: link.id)
+        out += COUNT.pack(len(links))
+        for link in links:
+            out += LINK.pack(link.device1.uid, link.device2.uid, link.delay)
+
+    def _append(self, tag, when, event):
+        event_type = event[0]
+        src_mac = dst_mac = src_ip = dst_ip = ttl = 0
+        flow_id = -1
+        payload = None
+        if event_type == 'forward':
+            frame = event[2]
+            src_mac, dst_mac = frame.src_mac, frame.dst_mac
+            src_ip, dst_ip = frame.src_ip or 0, frame.dst_ip or 0
+            ttl, payload = frame.ttl, frame.payload
+            if frame.flow_id is not None:
+                flow_id = frame.flow_id
+        elif event_type == 'send':
+            src, dst, payload = event[1], event[2], event[3]
+            src_mac, src_ip, dst_ip = src.mac_int, src.ip_int or 0, dst.ip_int or 0
+            if event[5] is not None:
+                flow_id = event[5]
+        elif event_type == 'arp_request':
+            src_mac, dst_ip = event[1].mac_int, event[2] or 0
+        elif event_type == 'arp_response':
+            src_mac, dst_ip, dst_mac = event[1].mac_int, event[2] or 0, event[3] or 0
+        if payload is None:
+            code = NO_PAYLOAD
+        else:
+            code = PAYLOAD_CODES.get(payload, TEXT_PAYLOAD)
+        out = self.buffer
+        out += RECORD.pack(tag, when, _EVENT_CODES[event_type], event[1].uid,
+                           src_mac, dst_mac, src_ip, dst_ip, max(0, min(ttl, 255)), flow_id, code)
+        if code == TEXT_PAYLOAD:
+            out += _pack_text(str(payload))
+        self.records += 1
+        if len(out) >= self.buffer_size:
+            self.flush()
+
+    def event(self, when, event):
+        """Record an event the simulator just took off the queue."""
+        self.index_buffer += INDEX_ENTRY.pack(self._flushed + len(self.buffer), when)
+        self.events += 1
+        self._append(EVENT, when, event)
+
+    def enqueue(self, when, event):
+        """Record an event queued to run at simulated time when."""
+        self._append(ENQUEUE, when, event)
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self._flushed += len(self.buffer)
+        self.buffer.clear()
+        self.index_file.write(self.index_buffer)
+        self.index_buffer.clear()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+            self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+########################################################################
+# Reading
+########################################################################
+class TraceRecord:
+    __slots__ = ('tag', 'time', 'type', 'device', 'src_mac', 'dst_mac', 'src_ip', 'dst_ip',
+                 'ttl', 'flow_id', 'payload')
+
+    def __init__(self, tag, time, type_code, device, src_mac, dst_mac, src_ip, dst_ip, ttl, flow_id, payload):
+        self.tag = tag
+        self.time = time
+        self.type = EVENT_TYPES[type_code]
+        self.device = device      # uid of the device, as recorded
+        self.src_mac = src_mac or None
+        self.dst_mac = dst_mac or None
+        self.src_ip = src_ip or None
+        self.dst_ip = dst_ip or None
+        self.ttl = ttl
+        self.flow_id = None if flow_id < 0 else flow_id
+        self.payload = payload
+
+    def __repr__(self):
+        kind = 'event' if self.tag == EVENT else 'enqueue'
+        return f"TraceRecord({kind} {self.type} t={self.time} device={self.device} payload={self.payload!r})"
+
+
+class TraceReader:
+    """Reads a trace; the topology up front, the records as they are iterated."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        reader = _Reader(self.file)
+        magic, version = reader.read(HEADER)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a PDU trace")
+        if version != VERSION:
+            raise ValueError(f"{path} is trace version {version}, expected {VERSION}")
+        self.devices = []
+        for _ in range(reader.read(COUNT)[0]):
+            uid, type_code, x, y, port_count, mac = reader.read(DEVICE)
+            device = {'uid': uid, 'type': DEVICE_TYPES[type_code], 'x': x, 'y': y,
+                      'port_count': port_count, 'mac': mac,
+                      'ip': reader.text(), 'subnet_mask': reader.text(), 'gateway': reader.text(),
+                      'interfaces': {}}
+            for _ in range(reader.read(COUNT)[0]):
+                port, = reader.read(INTERFACE)
+                device['interfaces'][port] = {'ip': reader.text(), 'mask': reader.text()}
+            self.devices.append(device)
+        self.links = [reader.read(LINK) for _ in range(reader.read(COUNT)[0])]
+        self.records_start = self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+    def build(self, sim):
+        """Recreate the recorded topology in sim; returns {recorded uid: device}."""
+        sim.clear_network()
+        devices = {}
+        for spec in self.devices:
+            device = sim.device_class(spec['x'], spec['y'], spec['type'], spec['port_count'])
+            device.mac_int = spec['mac']
+            device.ip = spec['ip']
+            device.subnet_mask = spec['subnet_mask']
+            device.gateway = spec['gateway']
+            device.interfaces = {port: dict(interface) for port, interface in spec['interfaces'].items()}
+            devices[spec['uid']] = sim.register_device(device)
+        for uid1, uid2, delay in self.links:
+            sim.link_devices(devices[uid1], devices[uid2]).delay = delay
+        return devices
+
+    def records(self, offset=None):
+        """
+        Every record in order, from byte offset (the first record by default);
+        a record cut off at the end of the file is ignored.
+        """
+        self.file.seek(self.records_start if offset is None else offset)
+        reader = _Reader(self.file)
+        while True:
+            try:
+                values = reader.read(RECORD)
+                code = values[-1]
+                if code == TEXT_PAYLOAD:
+                    payload = reader.text()
+                elif code == NO_PAYLOAD:
+                    payload = None
+                else:
+                    payload = PAYLOADS[code]
+            except EOFError:
+                return
+            yield TraceRecord(*values[:-1], payload)
+
+    def event_offsets(self):
+        """(byte offset, time) of every event record, by scanning the trace."""
+        self.file.seek(self.records_start)
+        reader = _Reader(self.file)
+        while True:
+            offset = self.file.tell()
+            try:
+                values = reader.read(RECORD)
+                if values[-1] == TEXT_PAYLOAD:
+                    reader.text()
+            except EOFError:
+                return
+            if values[0] == EVENT:
+                yield offset, values[1]
+
+    def events(self, offset=None):
+        """(event record, [enqueue records it caused]) pairs in the order they ran, from byte offset."""
+        current = None
+        enqueues = []
+        for record in self.records(offset):
+            if record.tag == EVENT:
+                if current is not None:
+                    yield current, enqueues
+                current = record
+                enqueues = []
+            elif current is not None:
+                enqueues.append(record)
+        if current is not None:
+            yield current, enqueues
+
+########################################################################
+# Index
+########################################################################
+def build_index(path):
+    """Write <path>.idx for a trace that has none (or an outdated one)."""
+    reader = TraceReader(path)
+    try:
+        with open(index_path(path), 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, VERSION))
+            block = bytearray()
+            for offset, when in reader.event_offsets():
+                block += INDEX_ENTRY.pack(offset, when)
+                if len(block) >= BUFFER_SIZE:
+                    f.write(block)
+                    block.clear()
+            f.write(block)
+    finally:
+        reader.close()
+
+
+class _IndexTimes:
+    """Sequence view of the index's times, for bisect."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, number):
+        return self.index.time(number)
+
+
+class TraceIndex:
+    """
+    Event number -> (byte offset, time) of a trace, read from the memory-mapped
+    <trace>.idx. The index is built first if it is missing or older than the trace.
+    """
+    def __init__(self, path):
+        idx = index_path(path)
+        if not os.path.exists(idx) or os.path.getmtime(idx) < os.path.getmtime(path):
+            build_index(path)
+        self.file = open(idx, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = INDEX_HEADER.unpack_from(self.map, 0)
+        if magic != INDEX_MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{idx} is not a version {VERSION} trace index")
+        # Entries are counted from the size, so an index cut short by a crash still works
+        self.count = (len(self.map) - INDEX_HEADER.size) // INDEX_ENTRY.size
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, number):
+        return INDEX_ENTRY.unpack_from(self.map, INDEX_HEADER.size + number * INDEX_ENTRY.size)
+
+    def offset(self, number):
+        return self.entry(number)[0]
+
+    def time(self, number):
+        return self.entry(number)[1]
+
+    def events_until(self, when):
+        """Number of events at or before simulated time when."""
+        return bisect.bisect_right(_IndexTimes(self), when)
+
+    def events_before(self, when):
+        """Number of events strictly before simulated time when."""
+        return bisect.bisect_left(_IndexTimes(self), when)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+########################################################################
+# Replay
+########################################################################
+class TraceReplay:
+    """
+    Drives a simulator's view from a trace instead of simulating. The recorded
+    topology is rebuilt in sim; each step moves its clock to the next recorded
+    event, highlights and logs that event's device and reports the frames it
+    put on the wire through sim.on_transmit().
+
+    Provides the part of the simulator interface Playback uses, so a replay
+    plays back with the same speed controls as a live run. seek() and
+    seek_time() jump anywhere in the trace through its index.
+    """
+    def __init__(self, path, sim):
+        self.reader = TraceReader(path)
+        self.index = TraceIndex(path)
+        self.sim = sim
+        self.devices = self.reader.build(sim)  # {recorded uid: device}
+        self.event_queue = self                # Playback peeks at the next event through this
+        self.position = 0                      # Events played so far
+        self.max_delay = max((delay for _, _, delay in self.reader.links), default=0.0)
+        self._events = self.reader.events()
+        self._next = next(self._events, None)
+        self.simulation_running = self._next is not None
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def duration(self):
+        """Simulated time of the last recorded event."""
+        return self.index.time(len(self.index) - 1) if len(self.index) else 0.0
+
+    def __bool__(self):
+        return self._next is not None
+
+    def peek_time(self):
+        return self._next[0].time if self._next is not None else None
+
+    @property
+    def now(self):
+        return self.sim.now
+
+    def _play(self, quiet=False):
+        """Apply the next event; quiet only reports its frames, for catching up after a seek."""
+        record, enqueues = self._next
+        sim = self.sim
+        devices = self.devices
+        sim.event_queue.now = record.time
+        device = devices.get(record.device)
+        if device is not None:
+            if not quiet:
+                sim.set_active_device(device)
+                sim.log(INFO, 'event', "[Replay] {event} at {name}: {src_ip} -> {dst_ip} {payload}", device,
+                        event=record.type, name=device.ip or device.mac, src_ip=record.src_ip,
+                        dst_ip=record.dst_ip, payload=record.payload or '')
+            for enqueue in enqueues:
+                if enqueue.type == 'forward':
+                    receiver = devices.get(enqueue.device)
+                    if receiver is not None and receiver is not device:
+                        sim.on_transmit(device, receiver, enqueue.payload, enqueue.time)
+        self.position += 1
+        self._next = next(self._events, None)
+
+    def process_next_event(self):
+        if self._next is None:
+            return False
+        self._play()
+        return True
+
+    def finish_simulation(self):
+        self.simulation_running = False
+        self.sim.log(INFO, 'event', "=== Replay completed ===")
+
+    def seek(self, number, when=None):
+        """
+        Jump to just after the first number events (clamped to the trace), with
+        the clock at when if given. The frames still in flight there are
+        reported again by quietly replaying the events of the last max_delay.
+        """
+        index = self.index
+        number = max(0, min(number, len(index)))
+        if when is None:
+            when = index.time(number - 1) if number else 0.0
+        start = max(index.events_before(when - self.max_delay), number - REPLAY_WARMUP, 0)
+        self.sim.on_rewind()
+        self.sim.event_queue.now = index.time(start) if start < len(index) else when
+        self.position = start
+        self._events = self.reader.events(index.offset(start)) if start < len(index) else iter(())
+        self._next = next(self._events, None)
+        while self.position < number and self._next is not None:
+            self._play(quiet=True)
+        self.sim.event_queue.now = when
+        self.simulation_running = self._next is not None
+
+    def seek_time(self, when):
+        """Jump to simulated time when, with every event up to it played."""
+        self.seek(self.index.events_until(when), when)
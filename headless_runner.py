@@ -0,0 +1,197 @@
+"""Run a simulation task to completion without opening a window.
+
+Examples:
+    python headless_runner.py
+    python headless_runner.py --src 192.168.1.10 --dst 10.0.0.10
+    python headless_runner.py --topology my_networks:build_lab
+    python headless_runner.py --topology generate --subnets 500 --hosts-per-switch 20 --core ring
+    python headless_runner.py --flows 5000 --arrival poisson --rate 2000
+    python headless_runner.py --flows 500 --metrics-json metrics.json --metrics-csv metrics.csv
+    python headless_runner.py --log-level info --log-echo --log-categories router,arp
+    python headless_runner.py --flows 500 --trace run.trace
+    python headless_runner.py --topology lab.json
+    python headless_runner.py --topology generate --subnets 2000 --flows 50000 --rate 20000 --partitions 8
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+
+import event_log
+import metrics
+import partitioned
+import simulator_core
+import topology_generator
+import topology_io
+import traffic
+
+
+def load_topology(sim, spec, **generator_options):
+    """
+    Populate sim from a topology spec.
+
+    'demo' builds the demo network; 'generate' calls
+    topology_generator.generate_network(sim, **generator_options); a path
+    to a topology saved with topology_io loads it; 'module:function'
+    imports module and calls function(sim), which is expected to add
+    devices and wires to sim.
+    """
+    if spec == 'demo':
+        sim.create_random_network()
+        return
+    if spec == 'generate':
+        topology_generator.generate_network(sim, **generator_options)
+        return
+    if os.path.isfile(spec):
+        topology_io.load(sim, spec)
+        return
+    module_name, sep, func_name = spec.partition(':')
+    if not sep:
+        raise ValueError(f"Topology spec must be 'demo', 'generate', a file or 'module:function', got {spec!r}")
+    builder = getattr(importlib.import_module(module_name), func_name)
+    builder(sim)
+
+
+def pick_task(sim, src_ip=None, dst_ip=None):
+    """Resolve the task endpoints, defaulting to the first and last host."""
+    hosts = [d for d in sim.devices if d.type == 'host']
+    if len(hosts) < 2:
+        raise ValueError("The topology needs at least two hosts to run a task")
+    src = sim.find_device_by_ip(src_ip) if src_ip else hosts[0]
+    dst = sim.find_device_by_ip(dst_ip) if dst_ip else hosts[-1]
+    if src is None or dst is None:
+        raise ValueError(f"No host with IP {src_ip if src is None else dst_ip}")
+    return src, dst
+
+
+def _run(sim, max_events, partitions):
+    if partitions:
+        return partitioned.run(sim, partitions)
+    return sim.run(max_events=max_events)
+
+
+def run_task(sim, src, dst, max_events=None, partitions=None):
+    """Run a single request/response task and return a result dict."""
+    sim.set_task(src, dst)
+    sim.start_simulation()
+    started = time.perf_counter()
+    events = _run(sim, max_events, partitions)
+    elapsed = time.perf_counter() - started
+    return {
+        'source': src.ip,
+        'destination': dst.ip,
+        'success': sim.task_completed,
+        'events': events,
+        'sim_time': sim.now,
+        'wall_time': elapsed,
+    }
+
+
+def run_flows(sim, max_events=None, partitions=None):
+    """
+    Run every flow added to sim and return a result dict with the flow summary.
+    With partitions, the network is split across that many processes (see
+    partitioned.py); max_events does not apply then.
+    """
+    sim.start_simulation()
+    started = time.perf_counter()
+    events = _run(sim, max_events, partitions)
+    elapsed = time.perf_counter() - started
+    result = traffic.flow_summary(sim)
+    result.update({
+        'success': result['completed'] == result['flows'],
+        'events': events,
+        'sim_time': sim.now,
+        'wall_time': elapsed,
+    })
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a PDU journey simulation headlessly.")
+    parser.add_argument('--topology', default='demo',
+                        help="'demo', 'generate', a saved topology file or 'module:function' "
+                             "that builds the network (default: demo)")
+    parser.add_argument('--src', help="IP of the sending host (default: first host)")
+    parser.add_argument('--dst', help="IP of the receiving host (default: last host)")
+    parser.add_argument('--max-events', type=int, default=None,
+                        help="Stop after this many events")
+    parser.add_argument('--partitions', type=int, default=None,
+                        help="Split the network into this many regions, each simulated in its own process "
+                             "(at most one per core)")
+    generated = parser.add_argument_group("generated topologies (--topology generate)")
+    generated.add_argument('--subnets', type=int, default=4)
+    generated.add_argument('--hosts-per-switch', type=int, default=4)
+    generated.add_argument('--core', choices=topology_generator.CORES, default='tree')
+    generated.add_argument('--seed', type=int, default=0)
+    load = parser.add_argument_group("traffic (replaces the single src/dst task)")
+    load.add_argument('--flows', type=int, default=0, help="Number of concurrent flows to generate")
+    load.add_argument('--arrival', choices=tuple(traffic.ARRIVAL_PATTERNS), default='poisson')
+    load.add_argument('--rate', type=float, default=1000.0, help="Flow arrivals per simulated second")
+    parser.add_argument('--metrics-json', metavar='PATH', help="Write collected metrics to a JSON file")
+    parser.add_argument('--metrics-csv', metavar='PATH', help="Write collected metrics to a CSV file")
+    parser.add_argument('--trace', metavar='PATH',
+                        help="Stream every event to a binary trace file, for replay in the GUI")
+    parser.add_argument('--log-level', choices=tuple(event_log.LEVELS), default='off',
+                        help="Keep log records at or above this level (default: off)")
+    parser.add_argument('--log-categories', help="Comma-separated categories to keep, e.g. router,arp")
+    parser.add_argument('--log-echo', action='store_true', help="Print log records as they are made")
+    args = parser.parse_args(argv)
+    if args.partitions and (args.max_events is not None or args.trace):
+        parser.error("--partitions cannot be combined with --max-events or --trace")
+    cores = os.cpu_count() or 1
+    if args.partitions and args.partitions > cores:
+        # Regions beyond the cores only take turns, which is slower than fewer of them
+        print(f"Warning: {args.partitions} partitions but only {cores} core(s); using {cores}")
+        args.partitions = cores
+
+    sim = simulator_core.NetworkSimulator()
+    sim.event_log = event_log.EventLog(
+        level=event_log.LEVELS[args.log_level],
+        categories=args.log_categories.split(',') if args.log_categories else None,
+        echo=args.log_echo)
+    load_topology(sim, args.topology, subnets=args.subnets, hosts_per_switch=args.hosts_per_switch,
+                  core=args.core, seed=args.seed)
+    if args.metrics_json or args.metrics_csv:
+        sim.enable_metrics()
+    if args.trace:
+        sim.enable_trace(args.trace)
+
+    if args.flows:
+        traffic.TrafficGenerator(sim, args.arrival, args.rate, seed=args.seed).generate(args.flows)
+        result = run_flows(sim, max_events=args.max_events, partitions=args.partitions)
+        status = "SUCCESS" if result['success'] else "FAILED"
+        print(f"=== {status}: {result['completed']}/{result['flows']} flows completed | "
+              f"{result['events']} events, {result['sim_time'] * 1000:.3f} ms simulated, "
+              f"{result['wall_time'] * 1000:.2f} ms wall time, "
+              f"{result['events'] / result['wall_time']:.0f} events/s, "
+              f"{result['throughput']:.0f} flows per simulated second ===")
+    else:
+        src, dst = pick_task(sim, args.src, args.dst)
+        result = run_task(sim, src, dst, max_events=args.max_events, partitions=args.partitions)
+        status = "SUCCESS" if result['success'] else "FAILED"
+        print(f"=== {status}: {result['source']} -> {result['destination']} | "
+              f"{result['events']} events, {result['sim_time'] * 1000:.3f} ms simulated, "
+              f"{result['wall_time'] * 1000:.2f} ms wall time ===")
+
+    if sim.trace is not None:
+        sim.trace.close()
+        print(f"Trace: {sim.trace.records} records written to {args.trace}")
+    if sim.metrics is not None:
+        drops = sim.metrics.drops_by_reason()
+        print("Drops: " + (", ".join(f"{reason}={count}" for reason, count in sorted(drops.items())) or "none"))
+        totals = sim.metrics.totals()
+        hits = totals.get(metrics.FLOW_CACHE_HITS, 0)
+        misses = totals.get(metrics.FLOW_CACHE_MISSES, 0)
+        if hits + misses:
+            print(f"Flow cache: {hits} hits, {misses} misses ({hits / (hits + misses):.0%} hit rate)")
+        if args.metrics_json:
+            sim.metrics.write_json(args.metrics_json)
+        if args.metrics_csv:
+            sim.metrics.write_csv(args.metrics_csv)
+    return 0 if result['success'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
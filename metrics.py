@@ -0,0 +1,113 @@
+"""Counters and per-flow measurements collected while a simulation runs.
+
+The simulator only records into a MetricsRegistry after enable_metrics(), so
+runs that do not want metrics pay a single `is None` check per hook. Counts
+come from processed events: stepping back through the GUI history does not
+rewind them.
+"""
+import csv
+import json
+
+# Counter names used by the simulator. Drops are counted as 'dropped.<reason>'.
+FRAMES_IN = 'frames_in'
+FRAMES_OUT = 'frames_out'
+ARP_REQUESTS = 'arp_requests'
+FLOODS = 'floods'
+FLOW_CACHE_HITS = 'flow_cache_hits'
+FLOW_CACHE_MISSES = 'flow_cache_misses'
+DROP_PREFIX = 'dropped.'
+
+
+def histogram(values, bucket_width):
+    """Sorted (bucket start, count) pairs for values grouped into fixed-width buckets."""
+    counts = {}
+    for value in values:
+        bucket = int(value // bucket_width)
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return [(bucket * bucket_width, counts[bucket]) for bucket in sorted(counts)]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.device_counters = {}  # {device: {counter name: count}}
+        self.flow_records = {}     # {flow id: {'latency': seconds, 'hops': hop count}}
+
+    def reset(self):
+        self.device_counters.clear()
+        self.flow_records.clear()
+
+    def count(self, device, name, amount=1):
+        counters = self.device_counters.get(device)
+        if counters is None:
+            counters = self.device_counters[device] = {}
+        counters[name] = counters.get(name, 0) + amount
+
+    def drop(self, device, reason):
+        self.count(device, DROP_PREFIX + reason)
+
+    def record_flow(self, flow_id, **values):
+        self.flow_records.setdefault(flow_id, {}).update(values)
+
+    ####################################################################
+    # Queries
+    ####################################################################
+    def counter(self, device, name):
+        return self.device_counters.get(device, {}).get(name, 0)
+
+    def totals(self):
+        """Every counter summed over all devices."""
+        totals = {}
+        for counters in self.device_counters.values():
+            for name, value in counters.items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def drops_by_reason(self):
+        return {name[len(DROP_PREFIX):]: value for name, value in self.totals().items()
+                if name.startswith(DROP_PREFIX)}
+
+    def flow_values(self, key):
+        return [record[key] for record in self.flow_records.values() if key in record]
+
+    def latency_histogram(self, bucket_width=0.001):
+        """Flow completion latencies in simulated seconds, bucketed (1 ms by default)."""
+        return histogram(self.flow_values('latency'), bucket_width)
+
+    def hop_histogram(self):
+        """Hops each flow's request took to reach its destination."""
+        return histogram(self.flow_values('hops'), 1)
+
+    ####################################################################
+    # Export
+    ####################################################################
+    @staticmethod
+    def _device_label(device):
+        return device.ip or device.mac
+
+    def to_dict(self):
+        return {
+            'devices': [
+                {'uid': device.uid, 'type': device.type, 'address': self._device_label(device), **counters}
+                for device, counters in self.device_counters.items()
+            ],
+            'flows': [{'flow': flow_id, **record} for flow_id, record in self.flow_records.items()],
+            'totals': self.totals(),
+            'latency_histogram': self.latency_histogram(),
+            'hop_histogram': self.hop_histogram(),
+        }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def write_csv(self, path):
+        """One row per measurement: scope ('device' or 'flow'), id, address, metric, value."""
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['scope', 'id', 'address', 'metric', 'value'])
+            for device, counters in self.device_counters.items():
+                for name, value in sorted(counters.items()):
+                    writer.writerow(['device', device.uid, self._device_label(device), name, value])
+            for flow_id, record in self.flow_records.items():
+                for name, value in record.items():
+                    writer.writerow(['flow', flow_id, '', name, value])
@@ -0,0 +1,436 @@
+"""Run one simulation across several processes by splitting the network into regions.
+
+partition_network() cuts the network along router-to-router wires into
+regions of about the same size, and run() gives each region its own process
+and event queue. Frames crossing between regions are passed along by the
+coordinating process with conservative synchronization: nothing sent from
+another region can arrive sooner than the shortest delay of a wire between
+two regions (the lookahead), so every region can safely process all of its
+events earlier than the earliest pending event anywhere plus the lookahead.
+The regions advance together one such window at a time.
+
+The outcome is the same as NetworkSimulator.run(). The event queue orders
+events the same way however they are split up (see EventScheduler), so each
+region processes its events in the order the whole network would. The only
+thing the regions share is the stop: a run ends the moment the last flow
+completes. In a window where that can happen, the regions with unfinished
+flows run first and report when their last one completed; the others then
+run only up to the last of those.
+
+Workers are forked, so each starts with the whole network already in memory;
+this needs the 'fork' start method (Linux, macOS). Running the module
+benchmarks partitioned runs against the sequential engine:
+
+    python partitioned.py --subnets 1000 --hosts-per-switch 16 --flows 20000 --rate 20000 --partitions 2,4,8
+
+Regions only help with a core each: on one core they take turns and a run
+is 0.4-0.85x as fast as the sequential engine, which is why headless_runner
+uses no more partitions than there are cores. The benchmark also reports a
+projected speedup for one core per region, from the CPU time each region
+spends on every window (only the busiest region counts). Measured on a
+single-core machine (poisson arrivals at 20000/s, tree core), sequential
+time and projected speedup for 2 / 4 / 8 regions:
+
+    devices  flows   sequential   2      4      8
+         48    200      0.04 s   0.78x  0.86x
+        200    800      0.14 s   1.20x  1.50x  1.09x
+        500   2000      0.49 s   1.06x  1.35x  1.57x
+       1800   5000      1.83 s   1.32x  1.83x  1.56x
+       5400  10000      5.59 s   1.46x  2.32x  2.01x
+      18000  20000     13.80 s   1.25x  1.90x  1.96x
+
+Forking the workers and passing windows through the coordinator add a
+fixed ~30 ms, so in projection partitioning starts to win between 50 and
+200 devices (~0.1 s of sequential work). More regions are not always
+faster: the busiest region sets each window's pace, and 4 often beat 8.
+The projection leaves out memory bandwidth and pipe latency between cores,
+so check it with the benchmark on the target machine.
+"""
+import argparse
+import heapq
+import multiprocessing
+import pickle
+import sys
+import time
+import traceback
+
+import simulator_core
+import topology_generator
+import topology_io
+import traffic
+from pdu import Frame, PathNode
+
+
+def _cuttable(link):
+    return link.device1.type == 'router' and link.device2.type == 'router' and link.delay > 0
+
+
+def partition_network(sim, parts):
+    """
+    Split sim's devices into at most parts regions of about the same size.
+
+    Only wires between two routers with a positive delay are cut, so every
+    switch and host stays with its router. The clusters that leaves are laid
+    out depth-first along the router wires and dealt out in runs, so
+    neighbouring clusters tend to share a region. Returns the regions (lists
+    of devices) and the lookahead: the shortest delay of a wire between two
+    regions, or infinity if there is none.
+    """
+    cluster_of = {}
+    clusters = []
+    for device in sim.devices:
+        if device in cluster_of:
+            continue
+        cluster = [device]
+        cluster_of[device] = len(clusters)
+        for member in cluster:  # Grows as neighbours join
+            for neighbour, link in member.connections.items():
+                if neighbour not in cluster_of and not _cuttable(link):
+                    cluster_of[neighbour] = len(clusters)
+                    cluster.append(neighbour)
+        clusters.append(cluster)
+
+    order = []
+    seen = [False] * len(clusters)
+    for first in range(len(clusters)):
+        if seen[first]:
+            continue
+        seen[first] = True
+        stack = [first]
+        while stack:
+            index = stack.pop()
+            order.append(index)
+            for member in clusters[index]:
+                for neighbour in member.connections:
+                    other = cluster_of[neighbour]
+                    if not seen[other]:
+                        seen[other] = True
+                        stack.append(other)
+
+    parts = max(1, min(parts, len(clusters)))
+    regions = [[] for _ in range(parts)]
+    placed = 0
+    for index in order:
+        regions[placed * parts // len(sim.devices)].extend(clusters[index])
+        placed += len(clusters[index])
+    regions = [region for region in regions if region]
+
+    region_of = {device: i for i, region in enumerate(regions) for device in region}
+    lookahead = min((link.delay for link in sim.links.values()
+                     if region_of[link.device1] != region_of[link.device2]), default=float('inf'))
+    return regions, lookahead
+
+########################################################################
+# Workers
+########################################################################
+def _pack(entry):
+    """A queue entry bound for another region, as plain values: devices by uid, the frame as a tuple."""
+    when, depth, origin, seq, (_, receiver, frame, path) = entry
+    return (when, depth, origin, seq, receiver.uid,
+            (frame.src_mac, frame.dst_mac, frame.src_ip, frame.dst_ip, frame.payload, frame.ttl, frame.flow_id),
+            [device.uid for device in path.to_list()])
+
+
+def _unpack(packed, devices):
+    when, depth, origin, seq, receiver, frame, hops = packed
+    path = None
+    for uid in hops:
+        path = PathNode(devices[uid], path)
+    return (when, depth, origin, seq, ('forward', devices[receiver], Frame(*frame), path))
+
+
+class _RegionQueue(simulator_core.EventScheduler):
+    """A region's event queue; events for devices in other regions are set aside for them."""
+
+    def __init__(self, region, region_of):
+        super().__init__()
+        self.region = region
+        self.region_of = region_of  # {device: region index}
+        self.outbox = {}            # {region index: [packed entries]}
+
+    def push(self, when, event):
+        region = self.region_of[event[1]]
+        if region == self.region:
+            super().push(when, event)
+        else:
+            self.outbox.setdefault(region, []).append(_pack(self.entry(when, event)))
+
+
+def _work(conn, sim, region, region_of):
+    try:
+        _serve(conn, sim, region, region_of)
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+
+
+def _serve(conn, sim, region, region_of):
+    devices = {device.uid: device for device in sim.devices}
+    shared = sim.event_queue
+    queue = _RegionQueue(region, region_of)
+    queue._heap = [entry for entry in shared.entries() if region_of[entry[4][1]] == region]
+    heapq.heapify(queue._heap)
+    queue._seq = shared._seq
+    queue.now = shared.now
+    sim.event_queue = queue
+    # Flows complete at their source, so each region tracks the ones it sends;
+    # simulation_running drops once all of those are done.
+    sim.flows = {flow_id: flow for flow_id, flow in sim.flows.items() if region_of[flow.source] == region}
+    heap = queue._heap
+    processed = 0
+    while True:
+        command = conn.recv()
+        if command is None:
+            break
+        started = time.process_time()
+        inbox, end, stop, halt = command
+        for bundle in inbox:
+            for packed in pickle.loads(bundle):
+                heapq.heappush(heap, _unpack(packed, devices))
+        done = None
+        while heap and heap[0][0] < end:
+            if stop is not None and heap[0][:4] > stop:
+                break
+            sim.process_next_event()
+            processed += 1
+            if halt and not sim.simulation_running:
+                done = queue.current[:4]
+                break
+        # Pickled here so the coordinator passes them on without unpacking them
+        bundles = {target: (min(packed[0] for packed in entries), pickle.dumps(entries, pickle.HIGHEST_PROTOCOL))
+                   for target, entries in queue.outbox.items()}
+        queue.outbox = {}
+        busy = time.process_time() - started
+        conn.send(('ok', (bundles, queue.peek_time(), len(sim.flows) - sim.completed_flows, done, busy)))
+
+    members = [device for device in sim.devices if region_of[device] == region]
+    metrics = None
+    if sim.metrics is not None:
+        metrics = ({device.uid: counters for device, counters in sim.metrics.device_counters.items()},
+                   sim.metrics.flow_records)
+    conn.send(('ok', {
+        'events': processed,
+        'now': sim.now,
+        'flows': {flow_id: flow.completed_at for flow_id, flow in sim.flows.items()},
+        'arp': {device.uid: device.arp_table for device in members},
+        'mac': {device.uid: {mac: neighbour.uid for mac, neighbour in device.mac_table.items()}
+                for device in members},
+        'metrics': metrics,
+    }))
+
+########################################################################
+# Coordinator
+########################################################################
+class _Regions:
+    """The coordinator's end of the worker processes."""
+
+    def __init__(self, sim, regions, lookahead):
+        self.lookahead = lookahead
+        self.region_of = {device: i for i, region in enumerate(regions) for device in region}
+        self.inboxes = [[] for _ in regions]  # [(earliest time, pickled entries)] waiting for each region
+        self.next_times = [None] * len(regions)
+        self.remaining = [0] * len(regions)
+        for entry in sim.event_queue.entries():
+            i = self.region_of[entry[4][1]]
+            if self.next_times[i] is None or entry[0] < self.next_times[i]:
+                self.next_times[i] = entry[0]
+        for flow in sim.flows.values():
+            self.remaining[self.region_of[flow.source]] += 1
+        self.windows = 0
+        self.busy = 0.0      # CPU seconds the regions spent on their windows
+        self.critical = 0.0  # Same, counting only the busiest region of each step
+        context = multiprocessing.get_context('fork')
+        self.connections = []
+        self.workers = []
+        for i in range(len(regions)):
+            conn, child = context.Pipe()
+            worker = context.Process(target=_work, args=(child, sim, i, self.region_of), daemon=True)
+            worker.start()
+            child.close()
+            self.connections.append(conn)
+            self.workers.append(worker)
+
+    def _receive(self, i):
+        status, value = self.connections[i].recv()
+        if status == 'error':
+            raise RuntimeError(f"Region {i} failed:\n{value}")
+        return value
+
+    def advance(self, regions, end, stop=None, halt=False):
+        """
+        Let regions process their events earlier than end (and no later than
+        the entry key stop); with halt, each stops right after completing its
+        last flow. Returns the keys of the events where they did.
+        """
+        for i in regions:
+            self.connections[i].send(([bundle for _, bundle in self.inboxes[i]], end, stop, halt))
+            self.inboxes[i] = []
+        done = []
+        longest = 0.0
+        for i in regions:
+            bundles, self.next_times[i], self.remaining[i], key, busy = self._receive(i)
+            for target, bundle in bundles.items():
+                self.inboxes[target].append(bundle)
+            if key is not None:
+                done.append(key)
+            self.busy += busy
+            longest = max(longest, busy)
+        self.critical += longest
+        return done
+
+    def run(self, last_start):
+        everywhere = range(len(self.connections))
+        while True:
+            pending = [when for when in self.next_times if when is not None]
+            pending.extend(when for inbox in self.inboxes for when, _ in inbox)
+            if not pending:
+                return  # Drained
+            end = min(pending) + self.lookahead
+            self.windows += 1
+            if end <= last_start:
+                # A flow starts after this window, so the run cannot end in it
+                self.advance(everywhere, end)
+                continue
+            busy = [i for i in everywhere if self.remaining[i]]
+            done = self.advance(busy, end, halt=True)
+            if not any(self.remaining):
+                # The last flow completed in this window; nothing after it runs
+                self.advance(everywhere, end, stop=max(done))
+                return
+            self.advance([i for i in everywhere if not self.remaining[i]], end)
+
+    def finish(self):
+        for conn in self.connections:
+            conn.send(None)
+        return [self._receive(i) for i in range(len(self.connections))]
+
+    def close(self):
+        for worker in self.workers:
+            worker.join(timeout=1)
+            if worker.is_alive():
+                worker.terminate()
+        for conn in self.connections:
+            conn.close()
+
+
+def run(sim, partitions, stats=None):
+    """
+    Run a simulation started with sim.start_simulation() to the end across
+    up to partitions processes, like sim.run(); returns the number of events
+    processed. A stats dict, if given, is filled with 'regions', 'windows',
+    'busy' (CPU seconds all regions spent on windows) and 'critical' (the
+    same counting only the busiest region of each step).
+
+    Flow completions, metrics, the clock and every device's ARP and MAC
+    table are brought back into sim. Events left in the queues when the last
+    flow completes, pending ARP buffers and the event log stay with the
+    workers. History and traces are not supported.
+    """
+    if not sim.simulation_running:
+        return 0
+    if sim.journal is not None or sim.trace is not None:
+        raise ValueError("History and traces cannot be recorded in a partitioned run")
+    regions, lookahead = partition_network(sim, partitions)
+    if len(regions) < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+        return sim.run()
+
+    workers = _Regions(sim, regions, lookahead)
+    try:
+        workers.run(max((flow.start for flow in sim.flows.values()), default=0.0))
+        results = workers.finish()
+    finally:
+        workers.close()
+    print(f"=== {len(regions)} regions, lookahead {lookahead * 1000:.3f} ms, {workers.windows} windows ===")
+    if stats is not None:
+        stats.update(regions=len(regions), windows=workers.windows, busy=workers.busy, critical=workers.critical)
+
+    devices = {device.uid: device for device in sim.devices}
+    events = 0
+    now = sim.now
+    for result in results:
+        events += result['events']
+        now = max(now, result['now'])
+        for flow_id, completed_at in result['flows'].items():
+            sim.flows[flow_id].completed_at = completed_at
+        for uid, table in result['arp'].items():
+            devices[uid].arp_table = table
+        for uid, table in result['mac'].items():
+            devices[uid].mac_table = {mac: devices[neighbour] for mac, neighbour in table.items()}
+        if result['metrics'] is not None:
+            counters, records = result['metrics']
+            for uid, values in counters.items():
+                for name, value in values.items():
+                    sim.metrics.count(devices[uid], name, value)
+            for flow_id, values in records.items():
+                sim.metrics.record_flow(flow_id, **values)
+    sim.clear_flow_caches()
+    sim.completed_flows = sum(flow.completed for flow in sim.flows.values())
+    sim.task_completed = sim.task_flow is not None and sim.task_flow.completed
+    sim.event_queue.reset()
+    sim.event_queue.now = now
+    sim.simulation_running = False
+    return events
+
+########################################################################
+# Benchmark
+########################################################################
+def _outcome(sim, events):
+    """Everything a run produced that has to match between engines."""
+    return (events, sim.now,
+            sorted((flow.id, flow.completed_at) for flow in sim.flows.values()),
+            sorted(sim.metrics.totals().items()),
+            sorted((flow_id, sorted(record.items())) for flow_id, record in sim.metrics.flow_records.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time partitioned runs against the sequential engine.")
+    parser.add_argument('--subnets', type=int, default=500)
+    parser.add_argument('--hosts-per-switch', type=int, default=16)
+    parser.add_argument('--core', choices=topology_generator.CORES, default='tree')
+    parser.add_argument('--flows', type=int, default=20000)
+    parser.add_argument('--arrival', choices=tuple(traffic.ARRIVAL_PATTERNS), default='poisson')
+    parser.add_argument('--rate', type=float, default=20000.0, help="Flow arrivals per simulated second")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--partitions', default='2,4,8', help="Comma-separated partition counts to time")
+    args = parser.parse_args(argv)
+
+    base = simulator_core.NetworkSimulator()
+    topology_generator.generate_network(base, args.subnets, args.hosts_per_switch, args.core, seed=args.seed)
+    topology = topology_io.to_bytes(base)
+    cores = multiprocessing.cpu_count()
+    print(f"{len(base.devices)} devices, {args.flows} flows, {cores} cores")
+    counts = [int(count) for count in args.partitions.split(',')]
+    if max(counts) > cores:
+        print(f"Warning: more regions than cores, so regions take turns and their wall times are not speedups. "
+              f"'projected' assumes one core per region: the busiest region's CPU time in each window "
+              f"instead of every region's.")
+
+    def measure(partitions):
+        sim = simulator_core.NetworkSimulator()
+        topology_io.from_bytes(sim, topology)
+        sim.enable_metrics()
+        traffic.TrafficGenerator(sim, args.arrival, args.rate, seed=args.seed).generate(args.flows)
+        sim.start_simulation()
+        stats = {}
+        started = time.perf_counter()
+        events = sim.run() if partitions is None else run(sim, partitions, stats)
+        elapsed = time.perf_counter() - started
+        # Regions that shared a core ran one after another; with a core each
+        # only the busiest of each window would have been on the clock.
+        projected = elapsed - stats.get('busy', 0.0) + stats.get('critical', 0.0)
+        return elapsed, projected, _outcome(sim, events)
+
+    baseline, _, expected = measure(None)
+    rows = [("sequential", baseline, baseline, expected[0], "yes")]
+    for partitions in counts:
+        elapsed, projected, outcome = measure(partitions)
+        rows.append((str(partitions), elapsed, projected, outcome[0], "yes" if outcome == expected else "NO"))
+
+    print(f"{'partitions':>10}  {'wall s':>8}  {'events/s':>10}  {'speedup':>7}  {'projected':>9}  identical")
+    for name, elapsed, projected, events, same in rows:
+        print(f"{name:>10}  {elapsed:8.2f}  {events / elapsed:10.0f}  {baseline / elapsed:6.2f}x  "
+              f"{baseline / projected:8.2f}x  {same}")
+    return 0 if all(row[4] == "yes" for row in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""The Frame (PDU) type carried by 'forward' events."""
+
+DEFAULT_TTL = 64
+
+
+class Frame:
+    """
+    A frame with its L2/L3 headers. Frames are shared between every event
+    that carries them (a switch flood queues the same object on each port),
+    so they are never modified once created: a device that changes a header
+    makes a copy with with_ttl() or readdress(), and the payload is shared.
+
+    flow_id ties data frames and their ACKs to the flow that sent them; ARP
+    frames have none.
+    """
+    __slots__ = ('src_mac', 'dst_mac', 'src_ip', 'dst_ip', 'payload', 'ttl', 'flow_id')
+
+    def __init__(self, src_mac, dst_mac, src_ip, dst_ip, payload, ttl=DEFAULT_TTL, flow_id=None):
+        self.src_mac = src_mac
+        self.dst_mac = dst_mac
+        self.src_ip = src_ip
+        self.dst_ip = dst_ip
+        self.payload = payload
+        self.ttl = ttl
+        self.flow_id = flow_id
+
+    def with_ttl(self, ttl):
+        """Copy of this frame with a new TTL."""
+        return Frame(self.src_mac, self.dst_mac, self.src_ip, self.dst_ip, self.payload, ttl, self.flow_id)
+
+    def readdress(self, src_mac, dst_mac, ttl):
+        """Copy with new L2 addresses and TTL, as a router does when forwarding."""
+        return Frame(src_mac, dst_mac, self.src_ip, self.dst_ip, self.payload, ttl, self.flow_id)
+
+    def __repr__(self):
+        return (f"Frame(src_mac={self.src_mac:#x}, dst_mac={self.dst_mac:#x}, "
+                f"src_ip={self.src_ip}, dst_ip={self.dst_ip}, payload={self.payload!r}, ttl={self.ttl}, "
+                f"flow_id={self.flow_id})")
+
+
+class PathNode:
+    """
+    One hop of a frame's journey, linked to the hop before it.
+
+    Extending a path is O(1) and shares every earlier hop with the paths it
+    branched from, so a flood costs one node per port instead of a list copy.
+    Each node also carries a 64-bit fingerprint of the devices on its path, so
+    contains() answers "not visited" in O(1) and only walks the parents on a
+    fingerprint hit. Use to_list() when the whole path is actually needed.
+    """
+    __slots__ = ('device', 'parent', 'depth', 'fingerprint')
+
+    def __init__(self, device, parent=None):
+        self.device = device
+        self.parent = parent
+        bit = 1 << (hash(device) & 63)
+        if parent is None:
+            self.depth = 1
+            self.fingerprint = bit
+        else:
+            self.depth = parent.depth + 1
+            self.fingerprint = parent.fingerprint | bit
+
+    def __len__(self):
+        return self.depth
+
+    def extend(self, device):
+        """The path with device appended as the next hop."""
+        return PathNode(device, self)
+
+    @property
+    def previous_device(self):
+        """The device the frame came from, or None at the start of the path."""
+        return self.parent.device if self.parent is not None else None
+
+    def contains(self, device):
+        if not self.fingerprint & (1 << (hash(device) & 63)):
+            return False
+        node = self
+        while node is not None:
+            if node.device is device:
+                return True
+            node = node.parent
+        return False
+
+    def to_list(self):
+        """The devices on the path, first hop first."""
+        devices = [None] * self.depth
+        node = self
+        for i in range(self.depth - 1, -1, -1):
+            devices[i] = node.device
+            node = node.parent
+        return devices
@@ -0,0 +1,113 @@
+"""Playback clock that advances a simulator independently of the frame rate.
+
+The GUI calls advance() once per frame. Simulated time moves with wall time,
+scaled by the playback speed, and every event due by then is processed, but
+never for longer than the frame budget: when the simulation cannot keep up
+the clock slips instead of piling up a backlog, so frames keep coming at a
+steady rate whatever the speed.
+
+At 1x, one DEFAULT_LINK_DELAY of simulated time (one hop) takes
+seconds_per_hop of wall time.
+"""
+import time
+
+from simulator_core import DEFAULT_LINK_DELAY
+
+SPEEDS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 100, 250, 1000)
+FRAME_BUDGET = 0.008  # Wall seconds of simulation work allowed per frame
+
+
+class Playback:
+    def __init__(self, sim, seconds_per_hop=0.5, frame_budget=FRAME_BUDGET, clock=time.perf_counter):
+        self.sim = sim
+        self.seconds_per_hop = seconds_per_hop
+        self.frame_budget = frame_budget
+        self.clock = clock
+        self.speed_index = SPEEDS.index(1)
+        self.paused = False
+        self.run_to_end = False        # Ignore the clock and run as fast as the budget allows
+        self.sim_time = 0.0            # Simulated time playback has reached
+        self._last_wall = None
+
+    @property
+    def speed(self):
+        return SPEEDS[self.speed_index]
+
+    @property
+    def time(self):
+        """
+        Simulated time to draw the network at: the playback clock, never behind
+        the last processed event, and infinite once the run has stopped so that
+        nothing is left in flight.
+        """
+        if not self.sim.simulation_running:
+            return float('inf')
+        return max(self.sim_time, self.sim.now)
+
+    def start(self):
+        """Play a freshly started simulation from its first event."""
+        self.sim_time = self.sim.now
+        self.run_to_end = False
+        self.paused = False
+        self._last_wall = None
+
+    def sync(self):
+        """Carry on from the simulation's current time, e.g. after a replay seek."""
+        self.sim_time = self.sim.now
+        self._last_wall = None
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+
+    def faster(self):
+        self.speed_index = min(self.speed_index + 1, len(SPEEDS) - 1)
+
+    def slower(self):
+        self.speed_index = max(self.speed_index - 1, 0)
+
+    def finish(self):
+        """Run the rest of the simulation without pacing."""
+        self.run_to_end = True
+        self.paused = False
+
+    def status(self):
+        if not self.sim.simulation_running:
+            return "Stopped"
+        if self.paused:
+            return "Paused"
+        if self.run_to_end:
+            return "Running to end"
+        return f"Playing {self.speed:g}x"
+
+    def advance(self):
+        """
+        Process the events due since the last call, within the frame budget.
+        Returns the number of events processed; sets simulation_running to
+        False once the queue drains.
+        """
+        sim = self.sim
+        now = self.clock()
+        elapsed = 0.0 if self._last_wall is None else now - self._last_wall
+        self._last_wall = now
+        if not sim.simulation_running or self.paused:
+            return 0
+
+        # Events stepped through by hand while paused move playback along too
+        self.sim_time = max(self.sim_time, sim.now)
+        if not self.run_to_end:
+            self.sim_time += elapsed * self.speed * DEFAULT_LINK_DELAY / self.seconds_per_hop
+        queue = sim.event_queue
+        deadline = now + self.frame_budget
+        processed = 0
+        while sim.simulation_running and queue:
+            if not self.run_to_end and queue.peek_time() > self.sim_time:
+                break
+            sim.process_next_event()
+            processed += 1
+            if self.clock() >= deadline:
+                # Out of budget: let the clock slip rather than build a backlog
+                self.sim_time = min(self.sim_time, sim.now)
+                break
+        if not queue and sim.simulation_running:
+            sim.finish_simulation()
+        return processed
@@ -0,0 +1,106 @@
+"""Compiled routing tables with longest-prefix-match lookup, and the per-router flow cache."""
+from collections import OrderedDict
+
+from addressing import ip_to_int, cidr_to_int, prefix_mask
+
+FLOW_CACHE_SIZE = 1024  # Destinations a router remembers forwarding decisions for
+
+
+class RoutingTable:
+    """
+    A router's routes compiled into one hash table per prefix length, searched
+    from the longest prefix down, so a lookup is at most 33 dict probes no
+    matter how many routes there are and always returns the most specific match.
+
+    Each route is a dict with 'network' (CIDR) and at least one of 'interface'
+    (port number) or 'next_hop' (IP). When 'interface' is missing it is taken
+    from the interface whose subnet contains the next hop. Routes that are
+    invalid or cannot be tied to an interface are skipped and kept in `rejected`.
+
+    Lookups take and return integer addresses: the matched entry is a dict
+    with 'network' (the CIDR string), 'interface' and 'next_hop' (int or None).
+    """
+    def __init__(self, routes=(), interfaces=None):
+        self.rejected = []
+        self._tables = {}     # prefix_len -> {network_int: route}
+        self._lengths = []    # Prefix lengths present, longest first
+        self._masks = []
+        interfaces = interfaces or {}
+        own_ips = {ip_to_int(intf.get('ip', '')) for intf in interfaces.values()}
+        for route in routes:
+            compiled = self._compile_route(route, interfaces, own_ips)
+            if compiled is None:
+                self.rejected.append(route)
+                continue
+            network, prefix_len, entry = compiled
+            # Like a real RIB, the first route for an identical prefix wins.
+            self._tables.setdefault(prefix_len, {}).setdefault(network, entry)
+        self._lengths = sorted(self._tables, reverse=True)
+        self._masks = [prefix_mask(length) for length in self._lengths]
+
+    def __len__(self):
+        return sum(len(table) for table in self._tables.values())
+
+    @staticmethod
+    def _compile_route(route, interfaces, own_ips):
+        parsed = cidr_to_int(route.get('network', ''))
+        if parsed is None:
+            return None
+        network, prefix_len = parsed
+        next_hop = ip_to_int(route.get('next_hop') or '')
+        if next_hop in own_ips:
+            next_hop = None  # "Next hop" is one of our own interfaces: directly connected
+        interface = route.get('interface')
+        if interface is None and next_hop is not None:
+            for port, intf in interfaces.items():
+                intf_ip = ip_to_int(intf.get('ip', ''))
+                intf_mask = ip_to_int(intf.get('mask', ''))
+                if intf_ip is not None and intf_mask is not None and \
+                        next_hop & intf_mask == intf_ip & intf_mask:
+                    interface = port
+                    break
+        if interface is None:
+            return None
+        entry = {'network': route['network'], 'interface': interface, 'next_hop': next_hop}
+        return network & prefix_mask(prefix_len), prefix_len, entry
+
+    def lookup(self, address):
+        """Return the most specific route for an integer IPv4 address, or None."""
+        tables = self._tables
+        for length, mask in zip(self._lengths, self._masks):
+            route = tables[length].get(address & mask)
+            if route is not None:
+                return route
+        return None
+
+
+class FlowCache:
+    """
+    A router's recent forwarding decisions, keyed by destination IP (int):
+    (egress port, neighbour on that port, MAC of the next hop). A hit skips
+    the route lookup, the port and the ARP lookup for the packet. The least
+    recently used destination is evicted once capacity is reached.
+
+    Entries are only valid for the topology_version they were made under
+    (`version`); changes to the routes or ARP entries behind them call
+    clear(). The simulator probes `entries` inline on its forwarding path,
+    so a hit costs one lookup and a move_to_end().
+    """
+    def __init__(self, capacity=FLOW_CACHE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict()  # Least recently used first
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def put(self, address, port, neighbour, mac):
+        entries = self.entries
+        entries[address] = (port, neighbour, mac)
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,1524 @@
+"""Headless simulation engine: devices, events and the forwarding logic.
+
+Nothing in here imports pygame, so the engine can be driven from the GUI in
+very_abstract_network_PDU_journey_simulator.py or from headless_runner.py.
+"""
+import heapq
+import bisect
+import ipaddress
+
+from addressing import BROADCAST_MAC, ip_to_int, mac_to_int, int_to_mac, random_mac
+from routing import RoutingTable, FlowCache
+from pdu import Frame, PathNode
+from event_log import EventLog, DEBUG, INFO, WARNING, OFF
+from metrics import MetricsRegistry, FRAMES_IN, FRAMES_OUT, ARP_REQUESTS, FLOODS, FLOW_CACHE_HITS, FLOW_CACHE_MISSES
+from event_trace import TraceWriter
+
+DEVICE_SIZE = 80
+DEFAULT_LINK_DELAY = 0.001  # Seconds of simulated propagation delay per wire
+DEFAULT_PORT_COUNT = 4  # Ports on a router or switch unless told otherwise
+
+########################################################################
+# Event Scheduler
+########################################################################
+class EventScheduler:
+    """
+    Heap-backed discrete-event queue keyed by simulated time (in seconds).
+
+    Events with equal timestamps are ordered by where they came from rather
+    than by when they were pushed, so that a queue holding only part of the
+    network's events (see partitioned.py) runs them in the same order as one
+    holding all of them. Heap entries are (when, depth, origin, seq, event):
+    depth is one more than that of the event that queued it if both happen
+    at the same time (0 otherwise), so an event always sorts after its cause;
+    origin is the uid of the device whose event queued it (the event's own
+    device for events queued between runs); seq only breaks ties between
+    events from the same origin, which every queue sees in the same order.
+
+    Undoing a push (see EventJournal) leaves the entry in the heap as a
+    tombstone that pop() and peek_time() skip, so it costs O(1) however long
+    the queue is.
+    """
+    def __init__(self):
+        self._heap = []
+        self._dead = {}  # id(entry) -> entry for undone pushes still in the heap
+        self._seq = 0
+        self.now = 0.0
+        self.current = None  # Entry of the event being processed
+        self.journal = None  # EventJournal recording pushes/pops, if history is enabled
+
+    def __len__(self):
+        return len(self._heap) - len(self._dead)
+
+    def __bool__(self):
+        return len(self._heap) > len(self._dead)
+
+    def entry(self, when, event):
+        """The heap entry for an event queued now to run at when."""
+        current = self.current
+        if current is None:
+            depth = 0
+            origin = event[1].uid
+        else:
+            depth = current[1] + 1 if when == current[0] else 0
+            origin = current[4][1].uid
+        entry = (when, depth, origin, self._seq, event)
+        self._seq += 1
+        return entry
+
+    def push(self, when, event):
+        entry = self.entry(when, event)
+        heapq.heappush(self._heap, entry)
+        if self.journal is not None:
+            self.journal.record(('push', entry))
+
+    def pop(self):
+        """Remove the earliest event, advance the clock to it and return it."""
+        if self._dead:
+            self._skip_dead()
+        entry = heapq.heappop(self._heap)
+        if self.journal is not None:
+            self.journal.record(('pop', entry, self.now))
+        self.now = entry[0]
+        self.current = entry
+        return entry[4]
+
+    def peek_time(self):
+        if self._dead:
+            self._skip_dead()
+        return self._heap[0][0] if self._heap else None
+
+    def entries(self):
+        """The queued heap entries, in no particular order."""
+        if self._dead:
+            self.compact()
+        return list(self._heap)
+
+    def clear(self):
+        if self.journal is not None:
+            self.journal.record(('clear', self.entries()))
+        self._heap.clear()
+        self._dead.clear()
+
+    def compact(self):
+        """Drop every tombstone from the heap (O(queue))."""
+        dead = self._dead
+        self._heap = [entry for entry in self._heap if id(entry) not in dead]
+        heapq.heapify(self._heap)
+        dead.clear()
+
+    def _skip_dead(self):
+        heap, dead = self._heap, self._dead
+        while heap and id(heap[0]) in dead:
+            del dead[id(heapq.heappop(heap))]
+
+    def _remove_entry(self, entry):
+        """Remove a specific entry (used when undoing a push)."""
+        self._dead[id(entry)] = entry
+
+    def _restore_entry(self, entry):
+        """Queue an entry again (used when redoing a push), reviving its tombstone if it has one."""
+        if self._dead.pop(id(entry), None) is None:
+            heapq.heappush(self._heap, entry)
+
+    def _set_entries(self, entries):
+        self._heap[:] = entries
+        heapq.heapify(self._heap)
+        self._dead.clear()
+
+    def reset(self):
+        """Drop all events and rewind the clock to zero."""
+        self._heap.clear()
+        self._dead.clear()
+        self._seq = 0
+        self.now = 0.0
+        self.current = None
+
+########################################################################
+# Event Journal (step-back history)
+########################################################################
+MISSING = object()  # Marks "key absent" in journal records
+
+class EventJournal:
+    """
+    History of processed events stored as per-event deltas instead of copies
+    of the whole network.
+
+    Every state change made while an event runs (table writes, pending-buffer
+    changes, queue pushes and pops, simulator flags) is recorded with its old
+    and new value, so stepping one event back or forward costs only as much as
+    that event changed. Keyframes (shallow copies of the touched tables and the
+    queue) are taken whenever the deltas recorded since the last keyframe
+    outweigh the keyframe itself, which keeps their amortized cost O(change)
+    while bounding how much has to be replayed to seek to any event.
+
+    Topology edits (adding, wiring or deleting devices) are not journaled; the
+    journal is reset when a simulation starts.
+    """
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.events = []      # One list of delta records per processed event
+        self.position = 0     # Number of events currently applied
+        self.keyframe_indices = []
+        self.keyframes = []
+        self._baseline_tables = {}  # id(table) -> (table, contents before first write)
+        self._baseline_attrs = {}   # (id(obj), name) -> (obj, name, value before first write)
+        self._current = None
+        self._deltas_since_keyframe = 0
+        self._keyframe_cost = 0
+
+    def __len__(self):
+        return len(self.events)
+
+    # Recording ---------------------------------------------------------
+    def record(self, delta):
+        if self._current is not None:
+            self._current.append(delta)
+
+    def set_entry(self, table, key, value):
+        """Write table[key] = value (or delete it if value is MISSING), recording the change."""
+        if self._current is not None:
+            if id(table) not in self._baseline_tables:
+                self._baseline_tables[id(table)] = (table, dict(table))
+            self._current.append(('set', table, key, table.get(key, MISSING), value))
+        _write(table, key, value)
+
+    def set_attr(self, obj, name, value):
+        if self._current is not None:
+            if (id(obj), name) not in self._baseline_attrs:
+                self._baseline_attrs[(id(obj), name)] = (obj, name, getattr(obj, name))
+            self._current.append(('attr', obj, name, getattr(obj, name), value))
+        setattr(obj, name, value)
+
+    def amend(self, obj, name, value):
+        """
+        Set an attribute as part of the most recently applied event, e.g. a run
+        ending between events because its queue drained, so that stepping back
+        over that event undoes it too.
+        """
+        if self._current is None and self.events and self.position == len(self.events):
+            if (id(obj), name) not in self._baseline_attrs:
+                self._baseline_attrs[(id(obj), name)] = (obj, name, getattr(obj, name))
+            self.events[-1].append(('attr', obj, name, getattr(obj, name), value))
+            setattr(obj, name, value)
+        else:
+            self.set_attr(obj, name, value)
+
+    def begin_event(self):
+        if self.position < len(self.events):
+            self.truncate()
+        if not self.keyframes or self._deltas_since_keyframe >= self._keyframe_cost:
+            self._take_keyframe()
+        self._current = []
+
+    def end_event(self):
+        self._deltas_since_keyframe += len(self._current)
+        self.events.append(self._current)
+        self.position += 1
+        self._current = None
+
+    def truncate(self):
+        """Forget every event after the current position (e.g. after stepping back)."""
+        del self.events[self.position:]
+        cut = bisect.bisect_right(self.keyframe_indices, self.position)
+        del self.keyframe_indices[cut:]
+        del self.keyframes[cut:]
+        self._deltas_since_keyframe = sum(len(deltas) for deltas in self.events[self.keyframe_indices[-1]:]) if self.keyframes else 0
+
+    # Keyframes ---------------------------------------------------------
+    def _take_keyframe(self):
+        tables = {key: dict(table) for key, (table, _) in self._baseline_tables.items()}
+        attrs = {key: getattr(obj, name) for key, (obj, name, _) in self._baseline_attrs.items()}
+        sched = self.scheduler
+        self.keyframe_indices.append(len(self.events))
+        self.keyframes.append((tables, attrs, sched.entries(), sched._seq, sched.now))
+        self._keyframe_cost = len(sched._heap) + sum(len(t) for t in tables.values()) + len(attrs) + 1
+        self._deltas_since_keyframe = 0
+
+    def _restore_keyframe(self, i):
+        tables, attrs, heap, seq, now = self.keyframes[i]
+        for key, (table, baseline) in self._baseline_tables.items():
+            table.clear()
+            table.update(tables.get(key, baseline))
+        for key, (obj, name, baseline) in self._baseline_attrs.items():
+            setattr(obj, name, attrs.get(key, baseline))
+        sched = self.scheduler
+        sched._set_entries(heap)
+        sched._seq = seq
+        sched.now = now
+        self.position = self.keyframe_indices[i]
+
+    # Navigation --------------------------------------------------------
+    def undo(self):
+        """Revert the most recently applied event. Returns False if there is none."""
+        if self.position == 0:
+            return False
+        self.position -= 1
+        sched = self.scheduler
+        for delta in reversed(self.events[self.position]):
+            kind = delta[0]
+            if kind == 'set':
+                _write(delta[1], delta[2], delta[3])
+            elif kind == 'attr':
+                setattr(delta[1], delta[2], delta[3])
+            elif kind == 'push':
+                sched._remove_entry(delta[1])
+                sched._seq = delta[1][3]
+            elif kind == 'pop':
+                heapq.heappush(sched._heap, delta[1])
+                sched.now = delta[2]
+            elif kind == 'clear':
+                sched._set_entries(delta[1])
+        return True
+
+    def redo(self):
+        """Re-apply the next recorded event. Returns False if there is none."""
+        if self.position >= len(self.events):
+            return False
+        sched = self.scheduler
+        for delta in self.events[self.position]:
+            kind = delta[0]
+            if kind == 'set':
+                _write(delta[1], delta[2], delta[4])
+            elif kind == 'attr':
+                setattr(delta[1], delta[2], delta[4])
+            elif kind == 'push':
+                sched._restore_entry(delta[1])
+                sched._seq = delta[1][3] + 1
+            elif kind == 'pop':
+                if sched._dead:
+                    sched._skip_dead()
+                heapq.heappop(sched._heap)
+                sched.now = delta[1][0]
+            elif kind == 'clear':
+                sched._set_entries(())
+        self.position += 1
+        return True
+
+    def seek(self, index):
+        """Move to the state after `index` events, via the nearest keyframe if that is cheaper."""
+        index = max(0, min(index, len(self.events)))
+        k = bisect.bisect_right(self.keyframe_indices, index) - 1
+        if k >= 0 and index - self.keyframe_indices[k] < abs(index - self.position):
+            self._restore_keyframe(k)
+        while self.position < index:
+            self.redo()
+        while self.position > index:
+            self.undo()
+
+
+def _write(table, key, value):
+    if value is MISSING:
+        table.pop(key, None)
+    else:
+        table[key] = value
+
+########################################################################
+# Link Class
+########################################################################
+class Link:
+    """A wire between two devices, with the port it uses on each end (-1 for none)."""
+    __slots__ = ('id', 'device1', 'device2', 'port1', 'port2', 'delay')
+
+    def __init__(self, link_id, device1, device2, port1, port2, delay=DEFAULT_LINK_DELAY):
+        self.id = link_id
+        self.device1 = device1
+        self.device2 = device2
+        self.port1 = port1
+        self.port2 = port2
+        self.delay = delay  # Propagation delay in simulated seconds
+
+    def other(self, device):
+        return self.device2 if device is self.device1 else self.device1
+
+    def port_of(self, device):
+        return self.port1 if device is self.device1 else self.port2
+
+########################################################################
+# Flow Class
+########################################################################
+class Flow:
+    """One request/response exchange: source sends payload at start, destination ACKs it."""
+    __slots__ = ('id', 'source', 'destination', 'start', 'payload', 'completed_at')
+
+    def __init__(self, flow_id, source, destination, start=0.0, payload='Hello'):
+        self.id = flow_id
+        self.source = source
+        self.destination = destination
+        self.start = start            # Simulated seconds after start_simulation
+        self.payload = payload
+        self.completed_at = None      # Simulated time the source got its ACK
+
+    @property
+    def completed(self):
+        return self.completed_at is not None
+
+########################################################################
+# Device Class
+########################################################################
+class Device:
+    def __init__(self, x, y, device_type, port_count=DEFAULT_PORT_COUNT, mac_int=None):
+        self.x = x
+        self.y = y
+        self.type = device_type  # 'host', 'router', 'switch', etc.
+        self.connections = {}    # {connected device: Link}, in the order they were wired
+        self.ports = []          # For routers/switches.
+        self.uid = None          # Assigned when the device is added to a simulator
+        self.owner = None        # The NetworkSimulator it is registered with, told about address changes
+        self.mac_int = random_mac() if mac_int is None else mac_int
+        # No addresses yet; set directly rather than through the properties below,
+        # which would parse the empty strings again for every device built.
+        self._ip = self._subnet_mask = self._gateway = ""
+        self.ip_int = self.mask_int = self.gateway_int = self.network_int = None
+        self.arp_table = {}      # {ip_int: mac_int}
+        self.mac_table = {}      # {mac_int: neighbouring device}
+        self._routing_table = []  # List of dicts with 'network' and 'interface' and/or 'next_hop'
+        self._interfaces = {}     # For routers: {port: {'ip': '', 'mask': ''}}
+        self._routes = None
+        self._interface_ips = None
+        self.selected = False
+        self.pending_packets = {}  # {destination ip_int: [packets]} (like a router buffer)
+
+        if self.type in ['router', 'switch']:
+            self.ports = [None] * port_count
+        # Routers remember where they last forwarded each destination
+        self.flow_cache = FlowCache() if self.type == 'router' else None
+
+    # Addresses are kept as ints (ip_int, mask_int, gateway_int, network_int,
+    # mac_int) for the forwarding code; the string properties below parse once
+    # when assigned and are what the GUI and the logs show.
+    @property
+    def ip(self):
+        return self._ip
+
+    @ip.setter
+    def ip(self, value):
+        self._ip = value
+        self.ip_int = ip_to_int(value)
+        self._update_network()
+        self._addresses_changed()
+
+    @property
+    def subnet_mask(self):
+        return self._subnet_mask
+
+    @subnet_mask.setter
+    def subnet_mask(self, value):
+        self._subnet_mask = value
+        self.mask_int = ip_to_int(value)
+        self._update_network()
+
+    @property
+    def gateway(self):
+        return self._gateway
+
+    @gateway.setter
+    def gateway(self, value):
+        self._gateway = value
+        self.gateway_int = ip_to_int(value)
+
+    @property
+    def mac(self):
+        return int_to_mac(self.mac_int)
+
+    @mac.setter
+    def mac(self, value):
+        parsed = mac_to_int(value)
+        if parsed is None:
+            raise ValueError(f"Invalid MAC address: {value!r}")
+        self.mac_int = parsed
+        self._addresses_changed()
+
+    def restore_addresses(self, ip, ip_int, subnet_mask, mask_int, gateway, gateway_int):
+        """Set the address strings together with their already parsed ints (ip_to_int of each)."""
+        self._ip = ip
+        self.ip_int = ip_int
+        self._subnet_mask = subnet_mask
+        self.mask_int = mask_int
+        self._gateway = gateway
+        self.gateway_int = gateway_int
+        self._update_network()
+        self._addresses_changed()
+
+    def _update_network(self):
+        ip_int = getattr(self, 'ip_int', None)
+        mask_int = getattr(self, 'mask_int', None)
+        self.network_int = ip_int & mask_int if ip_int is not None and mask_int is not None else None
+
+    def _addresses_changed(self):
+        # Assigning mac_int directly skips this; use the mac property on registered devices.
+        if self.owner is not None:
+            self.owner.addresses_changed(self)
+
+    # The routing table is compiled into a RoutingTable on first use and only
+    # recompiled after it (or the interfaces) are replaced through these
+    # properties or the route/interface helpers below. Editing the lists or
+    # dicts in place needs a call to invalidate_routes().
+    @property
+    def routing_table(self):
+        return self._routing_table
+
+    @routing_table.setter
+    def routing_table(self, routes):
+        self._routing_table = routes
+        self.invalidate_routes()
+
+    @property
+    def interfaces(self):
+        return self._interfaces
+
+    @interfaces.setter
+    def interfaces(self, interfaces):
+        self._interfaces = interfaces
+        self.invalidate_routes()
+        self._addresses_changed()
+
+    @property
+    def routes(self):
+        """The compiled RoutingTable for longest-prefix-match lookups."""
+        if self._routes is None:
+            self._routes = RoutingTable(self._routing_table, self._interfaces)
+        return self._routes
+
+    @property
+    def interface_ips(self):
+        """{port: ip_int} for the interfaces that have a valid IP."""
+        if self._interface_ips is None:
+            if self._interfaces:
+                parsed = ((port, ip_to_int(intf.get('ip', ''))) for port, intf in self._interfaces.items())
+                self._interface_ips = {port: ip for port, ip in parsed if ip is not None}
+                self._own_ips = frozenset(self._interface_ips.values())
+            else:
+                self._interface_ips = {}
+                self._own_ips = frozenset()
+        return self._interface_ips
+
+    @property
+    def own_ips(self):
+        """Set of this router's interface IPs as ints."""
+        if self._interface_ips is None:
+            self.interface_ips
+        return self._own_ips
+
+    def invalidate_routes(self):
+        self._routes = None
+        self._interface_ips = None
+        if self.flow_cache is not None:
+            self.flow_cache.clear()
+
+    def add_route(self, network, interface=None, next_hop=None):
+        route = {'network': network}
+        if interface is not None:
+            route['interface'] = interface
+        if next_hop:
+            route['next_hop'] = next_hop
+        self._routing_table.append(route)
+        self.invalidate_routes()
+
+    def remove_route(self, network):
+        self._routing_table = [r for r in self._routing_table if r.get('network') != network]
+        self.invalidate_routes()
+
+    def set_interface(self, port, ip, mask):
+        self._interfaces[port] = {'ip': ip, 'mask': mask}
+        self.invalidate_routes()
+        self._addresses_changed()
+
+    def get_available_port(self):
+        for i, port in enumerate(self.ports):
+            if port is None:
+                return i
+        return -1
+
+    def connect_port(self, port_num, device):
+        if 0 <= port_num < len(self.ports):
+            self.ports[port_num] = device
+
+    def port_to(self, device):
+        """The port number wired to a neighbouring device, or None."""
+        link = self.connections.get(device)
+        return link.port_of(self) if link is not None else None
+
+    def first_connection(self):
+        """The first device this one was wired to (a host's uplink), or None."""
+        return next(iter(self.connections), None)
+
+########################################################################
+# Spatial Index (hit-testing and culling)
+########################################################################
+class SpatialGrid:
+    """
+    Uniform grid over device bounding boxes. A device is stored in every cell
+    its box overlaps, so point and rectangle queries only look at the devices
+    in the cells they touch. Inserted devices are only filed into their cells
+    when the grid is next used, so a headless bulk load never pays for it.
+    """
+    def __init__(self, cell_size=128):
+        self.cell_size = cell_size
+        self._cells = {}   # (cx, cy) -> set of devices
+        self._where = {}   # device -> tuple of cells it is stored in
+        self._pending = []  # Inserted devices not filed yet
+
+    def _cells_for(self, x0, y0, x1, y1):
+        size = self.cell_size
+        return tuple([(cx, cy)
+                      for cx in range(int(x0 // size), int(x1 // size) + 1)
+                      for cy in range(int(y0 // size), int(y1 // size) + 1)])
+
+    def insert(self, device):
+        self._pending.append(device)
+
+    def _file_pending(self):
+        pending = self._pending
+        if pending:
+            self._pending = []
+            for device in pending:
+                self._file(device)
+
+    def _file(self, device):
+        x, y = device.x, device.y
+        cells = self._cells_for(x, y, x + DEVICE_SIZE, y + DEVICE_SIZE)
+        self._where[device] = cells
+        grid = self._cells
+        for cell in cells:
+            bucket = grid.get(cell)
+            if bucket is None:
+                grid[cell] = {device}
+            else:
+                bucket.add(device)
+
+    def remove(self, device):
+        self._file_pending()
+        for cell in self._where.pop(device, ()):
+            bucket = self._cells[cell]
+            bucket.discard(device)
+            if not bucket:
+                del self._cells[cell]
+
+    def move(self, device):
+        """Re-file a device after its position changed."""
+        self.remove(device)
+        self.insert(device)
+
+    def clear(self):
+        self._cells.clear()
+        self._where.clear()
+        self._pending.clear()
+
+    def query_point(self, x, y):
+        self._file_pending()
+        size = self.cell_size
+        for device in self._cells.get((int(x // size), int(y // size)), ()):
+            if device.x <= x < device.x + DEVICE_SIZE and device.y <= y < device.y + DEVICE_SIZE:
+                yield device
+
+    def query_rect(self, x0, y0, x1, y1):
+        """Devices whose boxes overlap the rectangle (x0, y0)-(x1, y1)."""
+        self._file_pending()
+        found = set()
+        cells = self._cells
+        size = self.cell_size
+        cx0, cy0, cx1, cy1 = int(x0 // size), int(y0 // size), int(x1 // size), int(y1 // size)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(cells):
+            # A huge area (a zoomed-out view) is cheaper to answer from the occupied cells
+            for (cx, cy), bucket in cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    found.update(bucket)
+        else:
+            for cell in self._cells_for(x0, y0, x1, y1):
+                bucket = cells.get(cell)
+                if bucket:
+                    found.update(bucket)
+        return [d for d in found
+                if d.x < x1 and d.x + DEVICE_SIZE > x0 and d.y < y1 and d.y + DEVICE_SIZE > y0]
+
+
+def _index_add(index, key, device):
+    """Add device to index[key], keeping the devices there in uid (registration) order."""
+    devices = index.get(key)
+    if devices is None:
+        index[key] = [device]
+        return
+    i = len(devices)
+    while i and devices[i - 1].uid > device.uid:
+        i -= 1
+    devices.insert(i, device)
+
+
+def _index_remove(index, key, device):
+    devices = index.get(key)
+    if devices is not None and device in devices:
+        devices.remove(device)
+        if not devices:
+            del index[key]
+
+########################################################################
+# Network Simulator Class
+########################################################################
+class NetworkSimulator:
+    # Subclasses (e.g. the pygame front-end) swap in their own Device type.
+    device_class = Device
+
+    def __init__(self):
+        self.devices = []
+        self.links = {}  # {link id: Link}; each device also maps its neighbours to their Link
+        self._next_link_id = 0
+        # Lookup indexes kept in step with the topology by the methods below.
+        # Addresses can be shared, so each maps to its devices in uid order.
+        self.devices_by_mac = {}   # {mac_int: [devices]}
+        self.devices_by_ip = {}    # {ip_int: [devices]}, host IPs and router interface IPs
+        self._stale_addresses = {}  # Devices whose addresses changed since they were indexed
+        self.spatial_index = SpatialGrid()
+        self._next_uid = 0
+        # Bumped whenever devices, links or addresses change (not on moves), so
+        # views can tell when something they cached is stale.
+        self.topology_version = 0
+        self.event_queue = EventScheduler()
+        self.task = None  # A tuple: (source_device, destination_device)
+        self.simulation_running = False
+        self.task_completed = False  # Set once the task's source receives its ACK
+        # Traffic: the task runs as one flow alongside any added with add_flow().
+        # The simulation stops once every flow has completed or the queue drains.
+        self.flows = {}  # {flow id: Flow}
+        self._next_flow_id = 0
+        self.task_flow = None
+        self.completed_flows = 0
+        self.active_device = None
+
+        self.journal = None  # EventJournal of per-event deltas, see enable_history()
+        self.metrics = None  # MetricsRegistry, see enable_metrics()
+        self.trace = None    # TraceWriter streaming processed events to a file, see enable_trace()
+        self.event_log = EventLog(level=OFF)  # Front ends that show the log raise the level
+
+    def enable_history(self):
+        """Start journaling events so they can be stepped back and forth."""
+        self.journal = EventJournal(self.event_queue)
+        self.event_queue.journal = self.journal
+
+    def enable_metrics(self):
+        """Start counting frames, drops and flow results; returns the MetricsRegistry."""
+        self.metrics = MetricsRegistry()
+        return self.metrics
+
+    def enable_trace(self, path):
+        """
+        Start streaming every processed and queued event, after the current
+        topology, to a binary trace file; returns the TraceWriter, which must be
+        closed when the run is over.
+        """
+        if self.trace is not None:
+            self.trace.close()
+        self.trace = TraceWriter(path, self)
+        return self.trace
+
+    def _count(self, device, name):
+        if self.metrics is not None:
+            self.metrics.count(device, name)
+
+    def _drop(self, device, reason):
+        if self.metrics is not None:
+            self.metrics.drop(device, reason)
+
+    def _set_entry(self, table, key, value):
+        """table[key] = value (MISSING deletes), recorded in the journal if enabled."""
+        if self.journal is not None:
+            self.journal.set_entry(table, key, value)
+        else:
+            _write(table, key, value)
+
+    def _set_attr(self, obj, name, value):
+        if self.journal is not None:
+            self.journal.set_attr(obj, name, value)
+        else:
+            setattr(obj, name, value)
+
+    def log(self, level, category, template, device=None, **fields):
+        """
+        Record a log message for the current event. template is only formatted
+        with fields when the record is read. The call itself still collects
+        fields into a dict, so per-frame code checks event_log.enabled() first.
+        """
+        log = self.event_log
+        if level < log.level:
+            return
+        log.add(self.now, level, category, template, device, fields)
+
+    def log_event(self, message):
+        """Log a preformatted message for the current event."""
+        self.event_log.add(self.now, INFO, 'ui', message)
+
+    @property
+    def simulation_event_logs(self):
+        """Messages logged for the most recently processed event."""
+        return self.event_log.messages(self.event_log.current_event())
+
+    def handle_next_event(self):
+        """Step forward one event, replaying it from the journal if it was already run."""
+        if self.journal is None:
+            self.enable_history()
+        if self.journal.redo():
+            self.clear_flow_caches()
+            self.log(INFO, 'history', "Replayed event {position} from history.", position=self.journal.position)
+        elif self.event_queue:
+            self.event_log.begin_event()  # Show only the logs of the new event
+            self.process_next_event()
+        else:
+            self.log(INFO, 'history', "No more events in the queue.")
+
+    def handle_previous_event(self):
+        """Revert the network state to before the most recent event."""
+        if self.journal is not None and self.journal.undo():
+            self.clear_flow_caches()
+            self.on_rewind()
+            self.log(INFO, 'history', "Reverted to previous event snapshot.")
+        else:
+            self.log(INFO, 'history', "No previous event to revert to.")
+
+    def seek_event(self, index):
+        """Jump to the state right after `index` events of the current run."""
+        if self.journal is not None:
+            position = self.journal.position
+            self.journal.seek(index)
+            if self.journal.position != position:
+                self.clear_flow_caches()
+                self.on_rewind()
+
+    def clear_flow_caches(self):
+        """Forget every router's cached forwarding decisions, e.g. after ARP tables were rewritten wholesale."""
+        for device in self.devices:
+            if device.flow_cache is not None:
+                device.flow_cache.clear()
+
+    @property
+    def now(self):
+        """Current simulated time in seconds."""
+        return self.event_queue.now
+
+    @property
+    def wires(self):
+        """The links as (device1, device2, port1, port2) tuples."""
+        return [(l.device1, l.device2, l.port1, l.port2) for l in self.links.values()]
+
+    def set_link_delay(self, device1, device2, delay):
+        device1.connections[device2].delay = delay
+
+    def link_delay(self, device1, device2):
+        link = device1.connections.get(device2)
+        return link.delay if link is not None else DEFAULT_LINK_DELAY
+
+    def schedule(self, event, delay=0.0):
+        """Queue an event to run delay seconds of simulated time from now."""
+        when = self.now + delay
+        self.event_queue.push(when, event)
+        if self.trace is not None:
+            self.trace.enqueue(when, event)
+
+    def transmit(self, sender, receiver, frame, path):
+        """Put a frame on the wire; it arrives after the link's propagation delay."""
+        link = sender.connections.get(receiver)
+        delay = link.delay if link is not None else DEFAULT_LINK_DELAY
+        if self.metrics is not None:
+            self.metrics.count(sender, FRAMES_OUT)
+        self.schedule(('forward', receiver, frame, path), delay)
+        self.on_transmit(sender, receiver, frame.payload, self.now + delay)
+
+    def on_transmit(self, sender, receiver, payload, arrive):
+        """Called for each frame put on a wire, live or replayed from a trace; views override it."""
+
+    def on_rewind(self):
+        """Called when history or a replay jumps to another point in time; views drop the frames they show."""
+
+    def set_active_device(self, device):
+        self._set_attr(self, 'active_device', device)
+
+    def finish_simulation(self):
+        """End the run once its queue has drained; stepping back over the last event resumes it."""
+        if self.journal is not None:
+            self.journal.amend(self, 'simulation_running', False)
+        else:
+            self.simulation_running = False
+        self.log(INFO, 'flow', "=== Simulation completed ===")
+
+    def register_device(self, device):
+        """Add an already constructed device to the network and its indexes."""
+        device.owner = self
+        device.uid = self._next_uid
+        self._next_uid += 1
+        self.topology_version += 1
+        self.devices.append(device)
+        self.spatial_index.insert(device)
+        self._index_addresses(device)
+        return device
+
+    def _index_addresses(self, device):
+        device._indexed_mac = device.mac_int
+        _index_add(self.devices_by_mac, device.mac_int, device)
+        ips = set(device.interface_ips.values())
+        if device.ip_int is not None:
+            ips.add(device.ip_int)
+        device._indexed_ips = ips
+        for ip in ips:
+            _index_add(self.devices_by_ip, ip, device)
+
+    def _unindex_addresses(self, device):
+        _index_remove(self.devices_by_mac, device._indexed_mac, device)
+        for ip in device._indexed_ips:
+            _index_remove(self.devices_by_ip, ip, device)
+
+    def addresses_changed(self, device):
+        """
+        Called by a registered device when its IP, MAC or interfaces change.
+        The indexes catch up on the next lookup, so building a router's
+        interfaces one at a time stays O(1) per change.
+        """
+        self._stale_addresses[device] = None
+        self.topology_version += 1
+
+    def _refresh_addresses(self):
+        for device in self._stale_addresses:
+            if device.owner is self:
+                self._unindex_addresses(device)
+                self._index_addresses(device)
+        self._stale_addresses.clear()
+
+    def reindex_device(self, device):
+        """Refresh the MAC/IP indexes after a device's addresses were changed."""
+        self._stale_addresses.pop(device, None)
+        self._unindex_addresses(device)
+        self._index_addresses(device)
+        self.topology_version += 1
+
+    def move_device(self, device, dx, dy):
+        device.x += dx
+        device.y += dy
+        self.spatial_index.move(device)
+
+    def device_at(self, x, y):
+        """The topmost (most recently added) device under the point, or None."""
+        hits = list(self.spatial_index.query_point(x, y))
+        return max(hits, key=lambda d: d.uid) if hits else None
+
+    def clear_network(self):
+        self.topology_version += 1
+        self.devices.clear()
+        self.links.clear()
+        for device in self.devices:
+            device.owner = None
+        self.devices_by_mac.clear()
+        self.devices_by_ip.clear()
+        self._stale_addresses.clear()
+        self.spatial_index.clear()
+        self.clear_flows()
+
+    def add_device(self, device_type, pos):
+        x, y = pos
+        new_device = self.device_class(x - DEVICE_SIZE // 2, y - DEVICE_SIZE // 2, device_type)
+        self.register_device(new_device)
+        print(f"Added {device_type} at ({x}, {y})")
+        return new_device
+
+    def delete_device(self, device):
+        for conn in list(device.connections):
+            self.disconnect_devices(device, conn)
+        if device in self.devices:
+            self.topology_version += 1
+            self.devices.remove(device)
+            self.spatial_index.remove(device)
+            self._unindex_addresses(device)
+            self._stale_addresses.pop(device, None)
+            device.owner = None
+        for flow in list(self.flows.values()):
+            if device in (flow.source, flow.destination):
+                del self.flows[flow.id]
+        print(f"Removed {device.type}")
+
+    def disconnect_devices(self, device1, device2):
+        link = device1.connections.pop(device2, None)
+        device2.connections.pop(device1, None)
+        if link is None:
+            return
+        self.topology_version += 1
+        for device, port in ((link.device1, link.port1), (link.device2, link.port2)):
+            if port != -1:
+                device.ports[port] = None
+        del self.links[link.id]
+
+    def connect_devices(self, device1, device2):
+        if device2 in device1.connections:
+            print(f"{device1.type} and {device2.type} are already connected")
+            return device1.connections[device2]
+        link = self.link_devices(device1, device2)
+        print(f"Connected {device1.type} to {device2.type}")
+        return link
+
+    def link_devices(self, device1, device2, port1=None, port2=None, delay=DEFAULT_LINK_DELAY):
+        """
+        Wire two devices together and return the Link. Ports default to the
+        first free port on routers and switches (-1 for none).
+        """
+        if port1 is None:
+            port1 = device1.get_available_port() if device1.type in ['router', 'switch'] else -1
+        if port2 is None:
+            port2 = device2.get_available_port() if device2.type in ['router', 'switch'] else -1
+        if port1 != -1:
+            device1.connect_port(port1, device2)
+        if port2 != -1:
+            device2.connect_port(port2, device1)
+        link = Link(self._next_link_id, device1, device2, port1, port2, delay)
+        self._next_link_id += 1
+        self.topology_version += 1
+        self.links[link.id] = link
+        device1.connections[device2] = link
+        device2.connections[device1] = link
+        return link
+
+    def set_task(self, source, destination):
+        self.task = (source, destination)
+        print(f"Task set: {source.ip} -> {destination.ip}")
+
+    def add_flow(self, source, destination, start=0.0, payload='Hello'):
+        """Add a flow that sends payload start seconds into the next simulation run."""
+        flow = Flow(self._next_flow_id, source, destination, start, payload)
+        self._next_flow_id += 1
+        self.flows[flow.id] = flow
+        return flow
+
+    def clear_flows(self):
+        self.flows.clear()
+        self.task_flow = None
+
+    def start_simulation(self):
+        if self.task_flow is not None:
+            self.flows.pop(self.task_flow.id, None)
+            self.task_flow = None
+        if self.task:
+            src, dst = self.task
+            self.task_flow = self.add_flow(src, dst)
+            print(f"=== Starting simulation from {src.ip} to {dst.ip} ===")
+        elif self.flows:
+            print(f"=== Starting simulation with {len(self.flows)} flows ===")
+        else:
+            print("No task set!")
+            return
+        self.task_completed = False
+        self.completed_flows = 0
+        self.event_queue.reset()
+        if self.journal is not None:
+            self.enable_history()
+        if self.metrics is not None:
+            self.metrics.reset()
+        for flow in self.flows.values():
+            flow.completed_at = None
+            self.schedule(('send', flow.source, flow.destination, flow.payload,
+                           PathNode(flow.source), flow.id), flow.start)
+        self.simulation_running = True
+
+    def run(self, max_events=None, until=None):
+        """
+        Process events back to back until the queue drains, every flow completes,
+        max_events have been handled or the next event is later than the
+        simulated time until. Returns the number of events processed.
+        """
+        processed = 0
+        while self.simulation_running and (max_events is None or processed < max_events):
+            if until is not None and self.event_queue and self.event_queue.peek_time() > until:
+                break
+            if not self.process_next_event():
+                break
+            processed += 1
+        self.simulation_running = False
+        return processed
+
+    def process_next_event(self):
+        if not self.event_queue:
+            return False
+
+        if self.journal is not None:
+            self.journal.begin_event()
+        self.log(DEBUG, 'event', "↓↓↓↓↓EVENT↓↓↓↓↓")
+        event = self.event_queue.pop()
+        if self.trace is not None:
+            self.trace.event(self.now, event)
+        event_type = event[0]
+        if event_type == 'send':
+            self.handle_send(*event[1:])
+        elif event_type == 'forward':
+            self.handle_forward(*event[1:])
+        elif event_type == 'arp_request':
+            self.handle_arp_request(*event[1:])
+        elif event_type == 'arp_response':
+            self.handle_arp_response(*event[1:])
+        self.log(DEBUG, 'event', "↑↑↑↑↑END OF EVENT↑↑↑↑↑\n")
+        if self.journal is not None:
+            self.journal.end_event()
+        return True
+
+    def ip_in_cidr(self,ip, cidr):
+        """
+        Return True if the given IP (a string) is within the CIDR network.
+        For example, ip_in_cidr("10.0.0.5", "10.0.0.0/24") returns True.
+        """
+        try:
+            return ipaddress.ip_address(ip) in ipaddress.ip_network(cidr, strict=False)
+        except ValueError:
+            return False
+
+    def get_source_ip(self, device, dst_ip):
+        """
+        For devices that have a routing table and multiple interfaces,
+        return the IP address (as an int) of the interface that is appropriate for
+        reaching dst_ip. If no matching route is found, fall back to the first
+        available interface, or, if none, simply return device.ip_int.
+        """
+        if device.routing_table and device.interface_ips:
+            route = device.routes.lookup(dst_ip)
+            if route is not None and route['interface'] in device.interface_ips:
+                return device.interface_ips[route['interface']]
+            # Fallback: return the IP of the first interface (if any)
+            return next(iter(device.interface_ips.values()))
+        return device.ip_int
+
+
+    def handle_send(self, src, dst, payload, path, flow_id=None):
+        self.set_active_device(src)
+
+        # Only proceed if host has connections
+        if not src.connections:
+            self.log(WARNING, 'host', "[HOST {ip}] Cannot send - no network connection!", src, ip=src.ip)
+            self._drop(src, 'no_connection')
+            return
+
+        self.log(INFO, 'host', "\n[HOST {ip}] Initiating send to {dst}", src, ip=src.ip, dst=dst.ip)
+
+        # Validate destination network
+        if not self.ip_in_network(dst.ip_int, src.mask_int, src.ip_int):
+            self.log(INFO, 'host', "[HOST {ip}] Destination not local, using gateway {gateway}", src, ip=src.ip, gateway=src.gateway)
+            if src.gateway_int is None:
+                self.log(WARNING, 'host', "[HOST] No gateway configured!", src)
+                self._drop(src, 'no_gateway')
+                return
+            dst_ip = src.gateway_int
+        else:
+            dst_ip = dst.ip_int
+
+        # ARP resolution
+        if dst_ip not in src.arp_table:
+            self.log(INFO, 'arp', "[HOST {ip}] ARP lookup failed for {target_ip}", src, ip=src.ip, target_ip=dst_ip)
+
+            self.log(INFO, 'host', "[{ip}] Buffering packet while ARP resolves", src, ip=src.ip)
+            # Pending lists are replaced rather than appended to so the journal can restore them
+            pending = src.pending_packets.get(dst_ip, [])
+            self._set_entry(src.pending_packets, dst_ip, pending + [{
+                'dst': dst,
+                'payload': payload,
+                'path': path,
+                'flow_id': flow_id
+            }])
+
+            # Send ARP request through first connected interface
+            arp_frame = Frame(src.mac_int, BROADCAST_MAC, self.get_source_ip(src, dst_ip), dst_ip, 'ARP_REQUEST')
+            self._count(src, ARP_REQUESTS)
+            next_hop = src.first_connection()
+            new_path = path.extend(next_hop)
+            self.transmit(src, next_hop, arp_frame, new_path)
+            return
+
+        # Create frame and send through connected interface
+        frame = Frame(src.mac_int, src.arp_table[dst_ip], src.ip_int, dst.ip_int, payload, flow_id=flow_id)
+        next_hop = src.first_connection()
+        self.log(INFO, 'host', "[HOST {ip}] Sending frame via {via}", src, ip=src.ip, via=next_hop.type)
+        new_path = path.extend(next_hop)
+        self.transmit(src, next_hop, frame, new_path)
+
+
+    def handle_forward(self, current_device, frame, path):
+        self.set_active_device(current_device)
+        if self.metrics is not None:
+            self.metrics.count(current_device, FRAMES_IN)
+
+        # Queued frames may be shared (e.g. by a flood), so decrement on a copy
+        frame = frame.with_ttl(frame.ttl - 1)
+        if frame.ttl <= 0:
+            self.log(WARNING, 'frame', "Packet TTL expired!", current_device)
+            self._drop(current_device, 'ttl_expired')
+            return
+
+        log = self.event_log
+        if log.enabled(DEBUG, 'frame'):
+            log.add(self.now, DEBUG, 'frame', "\n[{kind}] {device_mac} processing frame:", current_device,
+                    {'kind': current_device.type.upper(), 'device_mac': current_device.mac_int})
+            log.add(self.now, DEBUG, 'frame', "From: {src_mac} ({src_ip})", current_device,
+                    {'src_mac': frame.src_mac, 'src_ip': frame.src_ip})
+            log.add(self.now, DEBUG, 'frame', "To: {dst_mac} ({dst_ip})", current_device,
+                    {'dst_mac': frame.dst_mac, 'dst_ip': frame.dst_ip})
+
+        if current_device.type == 'host':
+            self.host_logic(current_device, frame, path)
+        elif current_device.type == 'switch':
+            self.switch_logic(current_device, frame, path)
+        elif current_device.type == 'router':
+            self.router_logic(current_device, frame, path)
+
+    def host_logic(self, host, frame, path):
+        # Only process frames addressed to this host's MAC or broadcast
+        if frame.dst_mac != host.mac_int and frame.dst_mac != BROADCAST_MAC:
+            self.log(DEBUG, 'host', "[HOST {ip}] Ignoring frame not addressed to us", host, ip=host.ip)
+            self._drop(host, 'not_addressed')
+            return
+
+        # Handle ARP responses first
+        if frame.payload == 'ARP_RESPONSE':
+            self.log(INFO, 'arp', "[HOST {ip}] Received ARP response for {src_ip}", host, ip=host.ip, src_ip=frame.src_ip)
+            self._set_entry(host.arp_table, frame.src_ip, frame.src_mac)
+
+            # Resend pending packets for this IP
+            if frame.src_ip in host.pending_packets:
+                for pkt in host.pending_packets[frame.src_ip]:
+                    self.schedule(('send', host, pkt['dst'], pkt['payload'], pkt['path'], pkt['flow_id']))
+                self._set_entry(host.pending_packets, frame.src_ip, MISSING)
+            return
+
+        # Handle ARP requests
+        if frame.payload == 'ARP_REQUEST':
+            # Learn requester's IP/MAC even if not for us
+            self._set_entry(host.arp_table, frame.src_ip, frame.src_mac)
+
+            if frame.dst_ip == host.ip_int:
+                self.log(INFO, 'arp', "[HOST {ip}] Responding to ARP", host, ip=host.ip)
+                self.handle_arp_response(
+                    target=host,
+                    requester_ip=frame.src_ip,
+                    requester_mac=frame.src_mac,
+                    path=path
+                )
+            else:
+                self.log(DEBUG, 'arp', "[HOST {ip}] Ignoring ARP frame not addressed to us", host, ip=host.ip)
+            return
+
+        # Handle normal IP packets
+        if frame.dst_ip == host.ip_int:
+            log = self.event_log
+            if log.enabled(INFO, 'host'):
+                log.add(self.now, INFO, 'host', "[HOST {ip}] Received payload: {payload}", host,
+                        {'ip': host.ip, 'payload': frame.payload})
+
+            if frame.payload == 'ACK':
+                self.complete_flow(host, frame)
+                return
+            if self.metrics is not None and frame.flow_id is not None:
+                self.metrics.record_flow(frame.flow_id, hops=len(path) - 1)
+
+            # Only send ACK if this isn't already an ACK
+            if host.connections:
+                response_frame = Frame(host.mac_int, frame.src_mac,
+                                       self.get_source_ip(host, frame.src_ip), frame.src_ip, 'ACK',
+                                       flow_id=frame.flow_id)
+                next_hop = host.first_connection()
+                new_path = PathNode(host).extend(next_hop)
+                self.transmit(host, next_hop, response_frame, new_path)
+        else:
+            self.log(DEBUG, 'host', "[HOST {ip}] Ignoring packet not meant for us", host, ip=host.ip)
+            self._drop(host, 'not_addressed')
+
+    def complete_flow(self, host, frame):
+        """Record an ACK reaching the source of its flow; other flows keep running."""
+        flow = self.flows.get(frame.flow_id)
+        if flow is None or flow.source is not host or flow.completed:
+            return
+        self._set_attr(flow, 'completed_at', self.now)
+        if self.metrics is not None:
+            self.metrics.record_flow(flow.id, latency=self.now - flow.start)
+        self._set_attr(self, 'completed_flows', self.completed_flows + 1)
+        if flow is self.task_flow:
+            self.log(INFO, 'flow', "\n=== SIMULATION BEHAVED AS EXPECTED | SUCCESS ===", host)
+            self.log(INFO, 'flow', "Original sender {ip} received ACK from {src_ip}", host, ip=host.ip, src_ip=frame.src_ip)
+            self._set_attr(self, 'task_completed', True)
+        else:
+            self.log(INFO, 'flow', "[FLOW {flow}] {ip} received ACK from {src_ip}", host,
+                     flow=flow.id, ip=host.ip, src_ip=frame.src_ip)
+        if self.completed_flows == len(self.flows):
+            self._set_attr(self, 'simulation_running', False)
+
+    def switch_logic(self, switch, frame, path):
+        log = self.event_log
+        # Learn MAC address from incoming port
+        incoming_device = path.previous_device
+        if incoming_device:
+            # Only learn if MAC isn't known or port changed
+            if (frame.src_mac not in switch.mac_table or
+                    switch.mac_table[frame.src_mac] != incoming_device):
+                self._set_entry(switch.mac_table, frame.src_mac, incoming_device)
+                if log.enabled(INFO, 'switch'):
+                    log.add(self.now, INFO, 'switch', "[SWITCH] Learned {src_mac} on port {port}", switch,
+                            {'src_mac': frame.src_mac, 'port': switch.port_to(incoming_device)})
+
+        # Forwarding logic
+        if frame.dst_mac in switch.mac_table:
+            target = switch.mac_table[frame.dst_mac]
+            if target in switch.connections:
+                if log.enabled(INFO, 'switch'):
+                    log.add(self.now, INFO, 'switch', "[SWITCH] Forwarding to port {port}", switch,
+                            {'port': switch.port_to(target)})
+                new_path = path.extend(target)
+                self.transmit(switch, target, frame, new_path)
+            else:
+                self.log(WARNING, 'switch', "[SWITCH] Known MAC but no connection, dropping", switch)
+                self._drop(switch, 'no_link')
+        else:
+            if log.enabled(INFO, 'switch'):
+                log.add(self.now, INFO, 'switch', "[SWITCH] Flooding to all connected ports", switch)
+            self._count(switch, FLOODS)
+            for conn in switch.connections:
+                if conn != incoming_device and not path.contains(conn):
+                    new_path = path.extend(conn)
+                    self.transmit(switch, conn, frame, new_path)
+
+    def router_logic(self, router, frame, path):
+        # Handle ARP responses first
+        if frame.payload == 'ARP_RESPONSE':
+            self.log(INFO, 'arp', "[ROUTER] Received ARP response for {src_ip}", router, src_ip=frame.src_ip)
+            self._learn_arp(router, frame.src_ip, frame.src_mac)
+
+            # Resend pending packets for this IP
+            if frame.src_ip in router.pending_packets:
+                for pkt in router.pending_packets[frame.src_ip]:
+                    self.schedule(('forward', router, pkt['frame'], pkt['path']))
+                self._set_entry(router.pending_packets, frame.src_ip, MISSING)
+            return
+
+        # First check for ARP requests
+        if frame.payload == 'ARP_REQUEST' and frame.dst_mac == BROADCAST_MAC:
+            # Learn requester's IP/MAC even if not for us
+            self._learn_arp(router, frame.src_ip, frame.src_mac)
+
+            if frame.dst_ip in router.own_ips:
+                self.log(INFO, 'arp', "[ROUTER] {dst_ip} responding to ARP", router, dst_ip=frame.dst_ip)
+                self.handle_arp_response(
+                    target=router,
+                    requester_ip=frame.src_ip,
+                    requester_mac=frame.src_mac,
+                    path=path
+                )
+            return
+
+        if frame.dst_mac != router.mac_int:
+            self.log(DEBUG, 'router', "[ROUTER] Frame not addressed to us, dropping", router)
+            self._drop(router, 'not_addressed')
+            return
+
+        log = self.event_log
+        logging = log.enabled(INFO, 'router')
+        if logging:
+            log.add(self.now, INFO, 'router', "[ROUTER] Processing IP packet", router)
+        cache = router.flow_cache
+        if cache.version != self.topology_version:
+            cache.clear()
+            cache.version = self.topology_version
+        hop = cache.entries.get(frame.dst_ip)
+        if hop is not None:
+            cache.entries.move_to_end(frame.dst_ip)
+            cache.hits += 1
+            if self.metrics is not None:
+                self.metrics.count(router, FLOW_CACHE_HITS)
+            interface, interface_device, dst_mac = hop
+            if logging:
+                log.add(self.now, INFO, 'router', "[ROUTER] Routing to interface {interface}", router,
+                        {'interface': interface})
+            new_frame = frame.readdress(router.mac_int, dst_mac, frame.ttl - 1)
+            self.transmit(router, interface_device, new_frame, path.extend(interface_device))
+            return
+        cache.misses += 1
+        if self.metrics is not None:
+            self.metrics.count(router, FLOW_CACHE_MISSES)
+        best_route = router.routes.lookup(frame.dst_ip)
+
+        if not best_route:
+            self.log(WARNING, 'router', "[ROUTER] No route found, dropping packet", router)
+            self._drop(router, 'no_route')
+            return
+
+        if logging:
+            log.add(self.now, INFO, 'router', "[ROUTER] Routing to interface {interface}", router,
+                    {'interface': best_route['interface']})
+        # Directly connected networks ARP for the destination itself
+        next_hop_ip = best_route['next_hop'] or frame.dst_ip
+
+        # Find actual connected interface
+        interface_device = None
+        if 0 <= best_route['interface'] < len(router.ports):
+            interface_device = router.ports[best_route['interface']]
+
+        if not interface_device:
+            self.log(WARNING, 'router', "[ROUTER] Interface not connected, dropping", router)
+            self._drop(router, 'interface_down')
+            return
+
+        # ARP resolution for next hop
+        if next_hop_ip not in router.arp_table:
+            self.log(INFO, 'arp', "[ROUTER] ARP lookup needed for {next_hop_ip}", router, next_hop_ip=next_hop_ip)
+            self.log(INFO, 'router', "[ROUTER] Buffering packet and sending ARP", router)
+            pending = router.pending_packets.get(next_hop_ip, [])
+            self._set_entry(router.pending_packets, next_hop_ip, pending + [{
+                'frame': frame,
+                'path': path
+            }])
+            self.schedule(('arp_request', router, next_hop_ip, path))
+            return
+
+        # Create new frame for next hop
+        dst_mac = router.arp_table[next_hop_ip]
+        cache.put(frame.dst_ip, best_route['interface'], interface_device, dst_mac)
+        new_frame = frame.readdress(router.mac_int, dst_mac, frame.ttl - 1)
+
+        # Forward to connected interface
+        new_path = path.extend(interface_device)
+        self.transmit(router, interface_device, new_frame, new_path)
+
+    def _learn_arp(self, router, ip, mac):
+        """Record ip -> mac in a router's ARP table; changing an entry empties its flow cache."""
+        if router.arp_table.get(ip, mac) != mac:
+            router.flow_cache.clear()
+        self._set_entry(router.arp_table, ip, mac)
+
+    def handle_arp_request(self, requester, target_ip, path):
+        self.set_active_device(requester)
+
+        self.log(INFO, 'arp', "\n[ARP] Request from {ip} for {target_ip}", requester, ip=requester.ip, target_ip=target_ip)
+
+        if requester.type == 'router':
+            # Router-specific ARP handling
+            interface_num = None
+            source_ip = None
+
+            # Find which interface should handle this ARP request
+            route = requester.routes.lookup(target_ip)
+            if route is not None:
+                interface_num = route['interface']
+                source_ip = requester.interface_ips.get(interface_num)
+
+            if interface_num is None or source_ip is None:
+                self.log(WARNING, 'arp', "[ARP] No route to {target_ip}, dropping request", requester, target_ip=target_ip)
+                self._drop(requester, 'no_route')
+                return
+
+            # Get connected device for this interface
+            if interface_num >= len(requester.ports) or not requester.ports[interface_num]:
+                self.log(WARNING, 'arp', "[ARP] Interface {interface} not connected", requester, interface=interface_num)
+                self._drop(requester, 'interface_down')
+                return
+
+            connected_device = requester.ports[interface_num]
+
+            arp_frame = Frame(requester.mac_int, BROADCAST_MAC, source_ip, target_ip, 'ARP_REQUEST')
+            self._count(requester, ARP_REQUESTS)
+
+            # Send only through the target interface
+            new_path = path.extend(connected_device)
+            self.transmit(requester, connected_device, arp_frame, new_path)
+        else:
+            # Host/bridge/switch ARP handling
+            arp_frame = Frame(requester.mac_int, BROADCAST_MAC, requester.ip_int, target_ip, 'ARP_REQUEST')
+            self._count(requester, ARP_REQUESTS)
+
+            # Broadcast to all connections
+            self.log(INFO, 'arp', "[ARP] Broadcasting request through connected devices", requester)
+            for connected_device in requester.connections:
+                new_path = path.extend(connected_device)
+                self.transmit(requester, connected_device, arp_frame, new_path)
+
+
+    def find_device_by_mac(self, mac):
+        """Find a device by MAC, given as a string or an int."""
+        mac_int = mac_to_int(mac) if isinstance(mac, str) else mac
+        if self._stale_addresses:
+            self._refresh_addresses()
+        devices = self.devices_by_mac.get(mac_int)
+        return devices[0] if devices else None
+
+    def handle_arp_response(self, target, requester_ip, requester_mac, path):
+        self.set_active_device(target)
+
+        self.log(INFO, 'arp', "[ARP] {ip} responding to {requester_ip}", target, ip=target.ip, requester_ip=requester_ip)
+
+        # Get the last hop from the path (device that delivered the request to us)
+        last_hop = path.previous_device  # Last device that delivered the ARP request to us
+        if last_hop is None:
+            self.log(WARNING, 'arp', "[ARP] Invalid path for response", target)
+            return
+
+
+        # Verify this last_hop is actually connected to us
+        if last_hop not in target.connections:
+            self.log(WARNING, 'arp', "[ARP] {ip} has no connection to {neighbor}, dropping response", target,
+                     ip=target.ip, neighbor=last_hop.type)
+            self._drop(target, 'no_link')
+            return
+
+        # Create response frame
+        response_frame = Frame(target.mac_int,
+                               requester_mac,  # Direct unicast to requester
+                               self.get_source_ip(target, requester_ip),
+                               requester_ip,
+                               'ARP_RESPONSE')
+
+        # Always send back through the same interface that received the request
+        self.log(INFO, 'arp', "[ARP] Sending response through {neighbor}", target, neighbor=last_hop.type)
+        new_path = PathNode(target).extend(last_hop)  # Start reverse path
+        self.transmit(target, last_hop, response_frame, new_path)
+
+    def ip_in_network(self, ip, subnet_mask, source_ip):
+        """True if the integer addresses ip and source_ip share the subnet_mask network."""
+        if not subnet_mask or ip is None or source_ip is None:
+            return False
+        return (ip ^ source_ip) & subnet_mask == 0
+
+    def find_device_by_ip(self, ip):
+        """Find a device by its IP or one of its interface IPs, given as a string or an int."""
+        ip_int = ip_to_int(ip) if isinstance(ip, str) else ip
+        if self._stale_addresses:
+            self._refresh_addresses()
+        devices = self.devices_by_ip.get(ip_int)
+        return devices[0] if devices else None
+
+    def create_random_network(self, origin=(800, 400)):
+        # Clear existing network
+        self.clear_network()
+        self.task = None
+        cx, cy = origin
+
+        # Create router with 2 interfaces
+        router = self.device_class(cx, cy, 'router')
+        router.interfaces = {
+            0: {'ip': '192.168.1.1', 'mask': '255.255.255.0'},
+            1: {'ip': '10.0.0.1', 'mask': '255.255.255.0'}
+        }
+        router.routing_table = [
+            {'network': '192.168.1.0/24', 'interface': 0},
+            {'network': '10.0.0.0/24', 'interface': 1}
+        ]
+        self.register_device(router)
+
+        # Create switches either side of the router
+        switch1 = self.register_device(self.device_class(cx - 200, cy, 'switch'))
+        switch2 = self.register_device(self.device_class(cx + 200, cy, 'switch'))
+
+        # Connect switches to router
+        self.connect_devices(router, switch1)
+        self.connect_devices(router, switch2)
+
+        # Create hosts for network 192.168.1.0/24
+        for i in range(2):
+            host = self.device_class(switch1.x - 150, switch1.y + i * 150, 'host')
+            host.ip = f'192.168.1.{10 + i}'
+            host.subnet_mask = '255.255.255.0'
+            host.gateway = '192.168.1.1'
+            self.connect_devices(switch1, host)
+            self.register_device(host)
+
+        # Create host for network 10.0.0.0/24
+        host = self.device_class(switch2.x + 150, switch2.y, 'host')
+        host.ip = '10.0.0.10'
+        host.subnet_mask = '255.255.255.0'
+        host.gateway = '10.0.0.1'
+        self.connect_devices(switch2, host)
+        self.register_device(host)
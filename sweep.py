@@ -0,0 +1,204 @@
+"""Run many variants of one topology in parallel and collect their results.
+
+The base topology is serialized once with topology_io and placed in shared
+memory; each worker process copies it out when it starts, so tasks only
+carry their (small) variant. Every variant runs on a fresh network rebuilt
+from those bytes, with its changes applied, and produces one row of the
+results table.
+
+A variant is a dict; every key is optional:
+
+    name        label for the row (default: 'variant-<n>')
+    fail_links  [[device, device], ...] wires to cut
+    routes      {device: [route, ...]} routing tables to replace
+    add_routes  {device: [route, ...]} routes to append
+    link_delay  propagation delay for every wire, in seconds
+    task        [source, destination] hosts for a single request/response
+    flows       number of flows between random hosts (used when there is no task)
+    arrival     'constant', 'poisson' or 'burst' (default: poisson)
+    rate        flow arrivals per simulated second (default: 1000)
+    seed        seed for the traffic (default: 0)
+    max_events  stop after this many events
+
+Devices are given by IP (host or router interface) or by their index in the
+saved topology. Routes are dicts like those in Device.routing_table.
+
+Example:
+    python sweep.py --topology lab.topo --variants variants.json --csv results.csv
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import headless_runner
+import simulator_core
+import topology_generator
+import topology_io
+import traffic
+
+# Columns shown by print_table(), in order
+SUMMARY_COLUMNS = ('name', 'success', 'completed', 'flows', 'events', 'sim_time', 'mean_latency', 'drops', 'error')
+
+_topology = None  # Serialized base topology, set in each worker by _init_worker()
+
+
+def _init_worker(name, size):
+    global _topology
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        _topology = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+
+
+def _resolve(sim, devices, ref):
+    device = devices[ref] if isinstance(ref, int) else sim.find_device_by_ip(ref)
+    if device is None:
+        raise ValueError(f"No device {ref!r} in the topology")
+    return device
+
+
+def apply_variant(sim, devices, variant):
+    """Make a variant's changes to a freshly loaded network."""
+    for first, second in variant.get('fail_links', ()):
+        sim.disconnect_devices(_resolve(sim, devices, first), _resolve(sim, devices, second))
+    for ref, routes in variant.get('routes', {}).items():
+        _resolve(sim, devices, _key(ref)).routing_table = [dict(route) for route in routes]
+    for ref, routes in variant.get('add_routes', {}).items():
+        device = _resolve(sim, devices, _key(ref))
+        device.routing_table = device.routing_table + [dict(route) for route in routes]
+    if 'link_delay' in variant:
+        for link in sim.links.values():
+            link.delay = variant['link_delay']
+
+
+def _key(ref):
+    """JSON object keys are strings; a key of digits means a device index."""
+    return int(ref) if isinstance(ref, str) and ref.isdigit() else ref
+
+
+def run_variant(topology, variant, number=0):
+    """Load topology (topology_io bytes), apply the variant, run it and return its result row."""
+    row = {'name': variant.get('name', f"variant-{number}")}
+    try:
+        sim = simulator_core.NetworkSimulator()
+        devices = topology_io.from_bytes(sim, topology)
+        apply_variant(sim, devices, variant)
+        sim.enable_metrics()
+        max_events = variant.get('max_events')
+        with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(quiet):
+            if 'task' in variant:
+                src, dst = (_resolve(sim, devices, ref) for ref in variant['task'])
+                result = headless_runner.run_task(sim, src, dst, max_events=max_events)
+                result.update(flows=1, completed=int(result['success']))
+            else:
+                generator = traffic.TrafficGenerator(sim, variant.get('arrival', 'poisson'),
+                                                     variant.get('rate', 1000.0), seed=variant.get('seed', 0))
+                generator.generate(variant.get('flows', 100))
+                result = headless_runner.run_flows(sim, max_events=max_events)
+        row.update(result)
+        drops = sim.metrics.drops_by_reason()
+        row['drops'] = sum(drops.values())
+        row.update(sim.metrics.totals())
+    except Exception as e:  # One broken variant should not sink the sweep
+        row['success'] = False
+        row['error'] = f"{type(e).__name__}: {e}"
+    return row
+
+
+def _run_in_worker(args):
+    number, variant = args
+    return run_variant(_topology, variant, number)
+
+
+def run_sweep(sim, variants, workers=None):
+    """
+    Run every variant of sim's current topology across a process pool and
+    return their result rows, in the order of variants.
+    """
+    topology = topology_io.to_bytes(sim)
+    variants = list(variants)
+    if workers == 1:
+        return [run_variant(topology, variant, i) for i, variant in enumerate(variants)]
+    shm = shared_memory.SharedMemory(create=True, size=max(len(topology), 1))
+    try:
+        shm.buf[:len(topology)] = topology
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shm.name, len(topology))) as pool:
+            return list(pool.map(_run_in_worker, enumerate(variants)))
+    finally:
+        shm.close()
+        shm.unlink()
+
+########################################################################
+# Results
+########################################################################
+def write_csv(rows, path):
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_json(rows, path):
+    with open(path, 'w') as f:
+        json.dump(rows, f, indent=2)
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+def print_table(rows, columns=SUMMARY_COLUMNS):
+    columns = [column for column in columns if any(column in row for row in rows)]
+    table = [columns] + [[_cell(row.get(column)) for column in columns] for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    for line in table:
+        print("  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run variants of a topology in parallel.")
+    parser.add_argument('--topology', default='demo',
+                        help="'demo', 'generate', a saved topology file or 'module:function' (default: demo)")
+    parser.add_argument('--variants', required=True, metavar='PATH', help="JSON file with a list of variants")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument('--csv', metavar='PATH', help="Write the results table as CSV")
+    parser.add_argument('--json', metavar='PATH', help="Write the results as JSON")
+    generated = parser.add_argument_group("generated topologies (--topology generate)")
+    generated.add_argument('--subnets', type=int, default=4)
+    generated.add_argument('--hosts-per-switch', type=int, default=4)
+    generated.add_argument('--core', choices=topology_generator.CORES, default='tree')
+    generated.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with open(args.variants) as f:
+        variants = json.load(f)
+    sim = simulator_core.NetworkSimulator()
+    headless_runner.load_topology(sim, args.topology, subnets=args.subnets,
+                                  hosts_per_switch=args.hosts_per_switch, core=args.core, seed=args.seed)
+    started = time.perf_counter()
+    rows = run_sweep(sim, variants, workers=args.workers)
+    elapsed = time.perf_counter() - started
+    print_table(rows)
+    print(f"=== {len(rows)} variants of {len(sim.devices)} devices in {elapsed:.2f} s ===")
+    if args.csv:
+        write_csv(rows, args.csv)
+    if args.json:
+        write_json(rows, args.json)
+    return 0 if all(row.get('success') for row in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""The MAC and IP indexes follow address changes and shared addresses."""
+import simulator_core
+import topology_generator
+
+
+def test_addresses_set_after_registration_are_found():
+    sim = simulator_core.NetworkSimulator()
+    host = sim.add_device('host', (100, 100))
+    router = sim.add_device('router', (300, 100))
+    host.ip = '10.0.0.1'
+    host.mac = '02:00:00:00:00:01'
+    router.set_interface(0, '10.0.0.254', '255.255.255.0')
+    assert sim.find_device_by_ip('10.0.0.1') is host
+    assert sim.find_device_by_mac('02:00:00:00:00:01') is host
+    assert sim.find_device_by_ip('10.0.0.254') is router
+
+    host.ip = '10.0.0.2'
+    router.interfaces = {1: {'ip': '10.0.1.254', 'mask': '255.255.255.0'}}
+    assert sim.find_device_by_ip('10.0.0.1') is None
+    assert sim.find_device_by_ip('10.0.0.2') is host
+    assert sim.find_device_by_ip('10.0.0.254') is None
+    assert sim.find_device_by_ip('10.0.1.254') is router
+
+
+def test_shared_addresses_survive_removal_of_one_holder():
+    sim = simulator_core.NetworkSimulator()
+    first = sim.add_device('host', (100, 100))
+    second = sim.add_device('host', (300, 100))
+    third = sim.add_device('host', (500, 100))
+    for host in (first, second, third):
+        host.ip = '10.0.0.7'
+    second.mac = third.mac = '02:00:00:00:00:07'
+
+    # Like the linear scan it replaced, the earliest registered device wins
+    assert sim.find_device_by_ip('10.0.0.7') is first
+    first.ip = '10.0.0.8'
+    assert sim.find_device_by_ip('10.0.0.7') is second
+    sim.delete_device(second)
+    assert sim.find_device_by_ip('10.0.0.7') is third
+    assert sim.find_device_by_mac('02:00:00:00:00:07') is third
+    second.ip = '10.0.0.9'  # No longer registered: must not come back
+    assert sim.find_device_by_ip('10.0.0.9') is None
+
+
+def test_generated_router_interfaces_are_indexed():
+    sim = simulator_core.NetworkSimulator()
+    topology_generator.generate_network(sim, 9, 2, 'fat-tree', seed=0)
+    for device in sim.devices:
+        assert sim.find_device_by_mac(device.mac_int) is device
+        for ip in device.interface_ips.values():
+            assert sim.find_device_by_ip(ip) is device
+        if device.ip_int is not None:
+            assert sim.find_device_by_ip(device.ip_int) is device
@@ -0,0 +1,77 @@
+"""Stepping and seeking through the event journal restores the exact state."""
+import random
+
+import simulator_core
+import topology_generator
+import traffic
+
+
+def snapshot(sim):
+    queue = sim.event_queue
+    devices = [(dict(device.arp_table), {mac: neighbour.uid for mac, neighbour in device.mac_table.items()},
+                {ip: len(pending) for ip, pending in device.pending_packets.items()}) for device in sim.devices]
+    entries = sorted((e[0], e[1], e[2], e[3], e[4][0], e[4][1].uid) for e in queue.entries())
+    flows = sorted((flow.id, flow.completed_at) for flow in sim.flows.values())
+    return devices, entries, len(queue), queue._seq, queue.now, sim.completed_flows, sim.simulation_running, flows
+
+
+def recorded_run(flows=40):
+    sim = simulator_core.NetworkSimulator()
+    topology_generator.generate_network(sim, 6, 3, 'ring', seed=1)
+    traffic.TrafficGenerator(sim, 'poisson', 5000, seed=2).generate(flows)
+    sim.start_simulation()
+    sim.enable_history()
+    states = [snapshot(sim)]
+    while sim.process_next_event():
+        states.append(snapshot(sim))
+    return sim, states
+
+
+def test_step_back_and_forth_matches_recorded_states():
+    sim, states = recorded_run()
+    for position in range(len(states) - 2, -1, -1):
+        sim.handle_previous_event()
+        assert snapshot(sim) == states[position]
+    for position in range(1, len(states)):
+        sim.handle_next_event()
+        assert snapshot(sim) == states[position]
+
+
+def test_seek_matches_recorded_states():
+    sim, states = recorded_run()
+    assert len(sim.journal.keyframes) > 1
+    rng = random.Random(0)
+    for _ in range(200):
+        position = rng.randrange(len(states))
+        sim.seek_event(position)
+        assert snapshot(sim) == states[position]
+
+
+def test_running_on_after_stepping_back_replaces_the_future():
+    sim, states = recorded_run()
+    sim.seek_event(10)
+    sim.simulation_running = True
+    while sim.process_next_event():
+        pass
+    assert len(sim.journal) == len(states) - 1
+    assert snapshot(sim) == states[-1]
+
+
+def test_undone_pushes_are_skipped_by_the_queue():
+    queue = simulator_core.EventScheduler()
+    journal = simulator_core.EventJournal(queue)
+    queue.journal = journal
+    device = simulator_core.Device(0, 0, 'host')
+    journal.begin_event()
+    queue.push(1.0, ('send', device))
+    queue.push(2.0, ('send', device))
+    journal.end_event()
+    journal.begin_event()
+    queue.push(0.5, ('send', device))
+    journal.end_event()
+    journal.undo()
+    assert len(queue) == 2
+    assert queue.peek_time() == 1.0
+    journal.redo()
+    assert len(queue) == 3
+    assert queue.pop() == ('send', device) and queue.now == 0.5
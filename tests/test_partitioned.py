@@ -0,0 +1,61 @@
+"""A partitioned run produces exactly what the sequential engine does."""
+import multiprocessing
+
+import pytest
+
+import partitioned
+import simulator_core
+import topology_generator
+import topology_io
+import traffic
+
+pytestmark = pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(),
+                                reason="partitioned runs fork their workers")
+
+
+def outcome(topology, arrival, flows, partitions=None):
+    sim = simulator_core.NetworkSimulator()
+    topology_io.from_bytes(sim, topology)
+    sim.enable_metrics()
+    traffic.TrafficGenerator(sim, arrival, 20000.0, seed=1).generate(flows)
+    sim.start_simulation()
+    stats = {}
+    events = sim.run() if partitions is None else partitioned.run(sim, partitions, stats)
+    arp = [sorted(device.arp_table.items()) for device in sim.devices]
+    return partitioned._outcome(sim, events), arp, stats
+
+
+@pytest.mark.parametrize('core, arrival', [('tree', 'poisson'), ('ring', 'burst'),
+                                           ('mesh', 'constant'), ('fat-tree', 'poisson')])
+def test_partitioned_matches_sequential(core, arrival):
+    sim = simulator_core.NetworkSimulator()
+    topology_generator.generate_network(sim, 12, 3, core, seed=2)
+    topology = topology_io.to_bytes(sim)
+    expected, expected_arp, _ = outcome(topology, arrival, 150)
+    for partitions in (2, 3):
+        result, arp, stats = outcome(topology, arrival, 150, partitions)
+        assert stats['regions'] > 1
+        assert result == expected
+        assert arp == expected_arp
+
+
+def test_single_task_matches_sequential():
+    results = []
+    for partitions in (None, 2):
+        sim = simulator_core.NetworkSimulator()
+        topology_generator.generate_network(sim, 6, 2, 'tree', seed=3)
+        hosts = [device for device in sim.devices if device.type == 'host']
+        sim.set_task(hosts[0], hosts[-1])
+        sim.start_simulation()
+        events = sim.run() if partitions is None else partitioned.run(sim, partitions)
+        results.append((events, sim.now, sim.task_completed))
+    assert results[0] == results[1] and results[0][2]
+
+
+def test_regions_cover_the_network_once():
+    sim = simulator_core.NetworkSimulator()
+    topology_generator.generate_network(sim, 16, 2, 'ring', seed=0)
+    regions, lookahead = partitioned.partition_network(sim, 4)
+    assert len(regions) == 4
+    assert sorted(device.uid for region in regions for device in region) == [d.uid for d in sim.devices]
+    assert lookahead == min(link.delay for link in sim.links.values())
@@ -0,0 +1,84 @@
+"""Longest-prefix matching in RoutingTable, alone and on generated networks."""
+import ipaddress
+import random
+
+import pytest
+
+import simulator_core
+import topology_generator
+from addressing import ip_to_int
+from routing import RoutingTable
+
+INTERFACES = {0: {'ip': '10.0.0.1', 'mask': '255.255.255.0'},
+              1: {'ip': '10.0.1.1', 'mask': '255.255.255.0'},
+              2: {'ip': '10.0.2.1', 'mask': '255.255.255.0'}}
+
+
+def lookup(table, ip):
+    route = table.lookup(ip_to_int(ip))
+    return None if route is None else route['network']
+
+
+def test_most_specific_route_wins_in_any_order():
+    routes = [{'network': '0.0.0.0/0', 'interface': 0},
+              {'network': '172.16.0.0/12', 'interface': 1},
+              {'network': '172.16.4.0/24', 'interface': 2},
+              {'network': '172.16.4.128/25', 'interface': 0}]
+    for order in (routes, routes[::-1]):
+        table = RoutingTable(order, INTERFACES)
+        assert lookup(table, '172.16.4.200') == '172.16.4.128/25'
+        assert lookup(table, '172.16.4.7') == '172.16.4.0/24'
+        assert lookup(table, '172.31.0.1') == '172.16.0.0/12'
+        assert lookup(table, '8.8.8.8') == '0.0.0.0/0'
+
+
+def test_no_default_route_means_no_match():
+    table = RoutingTable([{'network': '192.168.0.0/16', 'interface': 0}], INTERFACES)
+    assert lookup(table, '192.168.3.4') == '192.168.0.0/16'
+    assert lookup(table, '192.169.0.1') is None
+
+
+def test_first_route_for_a_prefix_wins():
+    table = RoutingTable([{'network': '10.9.0.0/16', 'interface': 1},
+                          {'network': '10.9.0.0/16', 'interface': 2}], INTERFACES)
+    assert table.lookup(ip_to_int('10.9.1.1'))['interface'] == 1
+    assert len(table) == 1
+
+
+def test_interface_and_next_hop_are_resolved():
+    table = RoutingTable([{'network': '10.5.0.0/16', 'next_hop': '10.0.2.9'},
+                          {'network': '10.6.0.0/16', 'interface': 1, 'next_hop': '10.0.1.1'}], INTERFACES)
+    via_neighbour = table.lookup(ip_to_int('10.5.0.1'))
+    assert via_neighbour['interface'] == 2 and via_neighbour['next_hop'] == ip_to_int('10.0.2.9')
+    # A next hop that is one of our own addresses means directly connected
+    direct = table.lookup(ip_to_int('10.6.0.1'))
+    assert direct['interface'] == 1 and direct['next_hop'] is None
+
+
+def test_unusable_routes_are_rejected():
+    bad = [{'network': 'not-a-network', 'interface': 0},
+           {'network': '10.7.0.0/16', 'next_hop': '192.0.2.1'}]  # No interface reaches the next hop
+    table = RoutingTable(bad, INTERFACES)
+    assert table.rejected == bad
+    assert len(table) == 0
+
+
+def brute_force(routes, address):
+    best = None
+    for route in routes:
+        network = ipaddress.ip_network(route['network'])
+        if ipaddress.ip_address(address) in network and (best is None or network.prefixlen > best[0]):
+            best = (network.prefixlen, route['network'])
+    return None if best is None else best[1]
+
+
+@pytest.mark.parametrize('core', topology_generator.CORES)
+def test_generated_tables_match_a_brute_force_search(core):
+    sim = simulator_core.NetworkSimulator()
+    topology_generator.generate_network(sim, 24, 2, core, seed=3)
+    hosts = [device.ip for device in sim.devices if device.type == 'host']
+    rng = random.Random(0)
+    for router in (device for device in sim.devices if device.type == 'router'):
+        assert not router.routes.rejected
+        for ip in rng.sample(hosts, 10):
+            assert lookup(router.routes, ip) == brute_force(router.routing_table, ip)
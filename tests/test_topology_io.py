@@ -0,0 +1,70 @@
+"""Topologies survive a round trip through both file formats."""
+import pytest
+
+import simulator_core
+import topology_generator
+import topology_io
+
+
+def describe(sim):
+    devices = [(d.type, d.x, d.y, len(d.ports), d.mac_int, d.ip, d.ip_int, d.subnet_mask, d.mask_int,
+                d.gateway, d.gateway_int, sorted(d.interfaces.items()), d.routing_table)
+               for d in sim.devices]
+    index = {device: i for i, device in enumerate(sim.devices)}
+    links = sorted((index[link.device1], link.port1, index[link.device2], link.port2, link.delay)
+                   for link in sim.links.values())
+    return devices, links
+
+
+def edited_demo():
+    sim = simulator_core.NetworkSimulator()
+    sim.create_random_network()
+    host = next(device for device in sim.devices if device.type == 'host')
+    host.ip = ''            # Unconfigured addresses round trip too
+    host.gateway = 'bogus'  # and so do invalid ones, as typed
+    router = next(device for device in sim.devices if device.type == 'router')
+    router.add_route('172.16.0.0/12', next_hop='10.0.0.99')
+    next(iter(sim.links.values())).delay = 0.0025
+    return sim
+
+
+def generated(core):
+    sim = simulator_core.NetworkSimulator()
+    topology_generator.generate_network(sim, 12, 3, core, seed=7)
+    return sim
+
+
+@pytest.mark.parametrize('build', [edited_demo] + [lambda core=core: generated(core)
+                                                   for core in topology_generator.CORES])
+@pytest.mark.parametrize('suffix', ['.json', '.topo'])
+def test_round_trip(tmp_path, build, suffix):
+    sim = build()
+    path = str(tmp_path / ('network' + suffix))
+    topology_io.save(sim, path)
+    loaded = simulator_core.NetworkSimulator()
+    topology_io.load(loaded, path)
+    assert describe(loaded) == describe(sim)
+    for device in loaded.devices:
+        assert loaded.find_device_by_mac(device.mac_int) is device
+
+
+def test_bytes_and_dict_forms_agree():
+    sim = generated('fat-tree')
+    from_bytes = simulator_core.NetworkSimulator()
+    topology_io.from_bytes(from_bytes, topology_io.to_bytes(sim))
+    from_dict = simulator_core.NetworkSimulator()
+    topology_io.from_dict(from_dict, topology_io.to_dict(sim))
+    assert describe(from_bytes) == describe(from_dict) == describe(sim)
+
+
+def test_loaded_network_runs_like_the_original():
+    sim = generated('ring')
+    copy = simulator_core.NetworkSimulator()
+    topology_io.from_bytes(copy, topology_io.to_bytes(sim))
+    results = []
+    for network in (sim, copy):
+        hosts = [device for device in network.devices if device.type == 'host']
+        network.set_task(hosts[0], hosts[-1])
+        network.start_simulation()
+        results.append((network.run(), network.now, network.task_completed))
+    assert results[0] == results[1] and results[0][2]
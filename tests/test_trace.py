@@ -0,0 +1,115 @@
+"""Trace indexes, their rebuild, and seeking a replay through them."""
+import os
+
+import pytest
+
+import event_trace
+import simulator_core
+import topology_generator
+import traffic
+
+
+class RecordingSimulator(simulator_core.NetworkSimulator):
+    """Keeps the frames a replay reports as in flight, like the GUI's markers."""
+
+    def __init__(self):
+        super().__init__()
+        self.in_flight = []
+        self.rewinds = 0
+
+    def on_transmit(self, sender, receiver, payload, arrive):
+        self.in_flight.append((sender.uid, receiver.uid, payload, arrive))
+
+    def on_rewind(self):
+        self.rewinds += 1
+        self.in_flight = []
+
+    def frames_in_flight(self):
+        return sorted(frame for frame in self.in_flight if frame[3] > self.now)
+
+
+@pytest.fixture(scope='module')
+def trace(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('trace') / 'run.trace')
+    sim = simulator_core.NetworkSimulator()
+    topology_generator.generate_network(sim, 8, 3, 'tree', seed=4)
+    traffic.TrafficGenerator(sim, 'poisson', 4000, seed=5).generate(60)
+    sim.enable_trace(path)
+    sim.start_simulation()
+    events = sim.run()
+    sim.trace.close()
+    return path, events
+
+
+def test_index_has_one_entry_per_event(trace):
+    path, events = trace
+    index = event_trace.TraceIndex(path)
+    reader = event_trace.TraceReader(path)
+    try:
+        assert len(index) == events
+        assert [index.entry(i) for i in range(len(index))] == list(reader.event_offsets())
+        for number in (0, events // 2, events - 1):
+            record, _ = next(reader.events(index.offset(number)))
+            assert record.time == index.time(number)
+    finally:
+        index.close()
+        reader.close()
+
+
+def test_missing_or_stale_index_is_rebuilt(trace):
+    path, _ = trace
+    idx = event_trace.index_path(path)
+    with open(idx, 'rb') as f:
+        written = f.read()
+    os.remove(idx)
+    event_trace.TraceIndex(path).close()
+    with open(idx, 'rb') as f:
+        assert f.read() == written
+
+    with open(idx, 'wb') as f:
+        f.write(written[:len(written) // 2])
+    stale = os.path.getmtime(path) - 10
+    os.utime(idx, (stale, stale))
+    index = event_trace.TraceIndex(path)
+    try:
+        assert len(index) == (len(written) - event_trace.INDEX_HEADER.size) // event_trace.INDEX_ENTRY.size
+    finally:
+        index.close()
+
+
+def test_seek_matches_playing_from_the_start(trace):
+    path, events = trace
+    played = RecordingSimulator()
+    replay = event_trace.TraceReplay(path, played)
+    expected = {}
+    targets = {events // 5, events // 2, events - 3}
+    while replay.process_next_event():
+        if replay.position in targets:
+            expected[replay.position] = (played.now, played.frames_in_flight())
+
+    sim = RecordingSimulator()
+    replay = event_trace.TraceReplay(path, sim)
+    for number in sorted(targets, reverse=True):
+        replay.seek(number)
+        assert replay.position == number
+        assert (sim.now, sim.frames_in_flight()) == expected[number]
+    replay.seek_time(expected[events // 2][0])
+    assert replay.position >= events // 2
+    assert sim.now == expected[events // 2][0]
+
+
+def test_stepping_back_live_drops_frames_in_flight():
+    sim = RecordingSimulator()
+    sim.create_random_network()
+    hosts = [device for device in sim.devices if device.type == 'host']
+    sim.set_task(hosts[0], hosts[-1])
+    sim.start_simulation()
+    for _ in range(4):
+        sim.handle_next_event()
+    assert sim.in_flight
+    sim.handle_previous_event()
+    assert sim.rewinds == 1 and not sim.in_flight
+    sim.seek_event(sim.journal.position)  # Not moving is not a rewind
+    assert sim.rewinds == 1
+    sim.seek_event(0)
+    assert sim.rewinds == 2
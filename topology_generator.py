@@ -0,0 +1,310 @@
+"""Seeded generator for large, fully configured benchmark topologies.
+
+Each subnet is an edge router with one switch and its hosts. The edge routers
+are joined by a core:
+
+    tree      random tree, each router has at most `fanout` children
+    ring      routers in a ring, traffic takes the shorter way round
+    mesh      every router wired to every other router
+    fat-tree  two tiers: every edge router wired to each of `spines` spine routers
+
+Subnet i is 10.(i >> 8).(i & 255).0/24 with the router on .1 and hosts from .2,
+and router-to-router links get /30s out of 172.16.0.0/12. Routing tables are
+filled in and summarized where the core allows it (tree subtrees and ring
+halves are contiguous subnet ranges, so they collapse into a few CIDRs).
+
+Example:
+    python topology_generator.py --subnets 2000 --hosts-per-switch 48 --core tree
+"""
+import argparse
+import random
+import sys
+import time
+
+import simulator_core
+import topology_io
+from addressing import int_to_ip
+
+SUBNET_BASE = 10 << 24             # 10.0.0.0, one /24 per subnet
+LINK_BASE = (172 << 24) | (16 << 16)  # 172.16.0.0/12, one /30 per router link
+MAX_SUBNETS = 1 << 16
+MAX_HOSTS_PER_SWITCH = 253
+MAX_ROUTER_LINKS = 1 << 18
+LOCAL_MAC_PREFIX = 0x02 << 40      # Locally administered MACs, numbered per device
+
+CORES = ('tree', 'ring', 'mesh', 'fat-tree')
+
+# Layout of one subnet block in world coordinates
+BLOCK_WIDTH = 160
+HOST_SPACING = 100
+ROW_HEIGHT = 140
+
+
+def subnet_cidr(index):
+    return f"{int_to_ip(SUBNET_BASE | index << 8)}/24"
+
+
+def range_to_cidrs(lo, hi):
+    """Smallest list of CIDRs covering the subnets lo..hi (inclusive)."""
+    cidrs = []
+    while lo <= hi:
+        size = lo & -lo if lo else MAX_SUBNETS
+        while size > hi - lo + 1:
+            size >>= 1
+        bits = size.bit_length() - 1
+        cidrs.append(f"{int_to_ip(SUBNET_BASE | lo << 8)}/{24 - bits}")
+        lo += size
+    return cidrs
+
+
+def _tree_children(count, fanout, rng):
+    """A random tree over `count` routers where nobody has more than fanout children."""
+    children = [[] for _ in range(count)]
+    open_nodes = [0]
+    for node in range(1, count):
+        slot = rng.randrange(len(open_nodes))
+        parent = open_nodes[slot]
+        children[parent].append(node)
+        if len(children[parent]) == fanout:
+            open_nodes[slot] = open_nodes[-1]
+            open_nodes.pop()
+        open_nodes.append(node)
+    return children
+
+
+def _preorder(children):
+    """Nodes in depth-first preorder, so every subtree is a contiguous run."""
+    order = []
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        stack.extend(reversed(children[node]))
+    return order
+
+
+class _Builder:
+    def __init__(self, sim, hosts_per_switch, router_ports, switch_ports, rng):
+        self.sim = sim
+        self.hosts_per_switch = hosts_per_switch
+        self.router_ports = router_ports
+        self.switch_ports = switch_ports
+        self.rng = rng
+        self.link_count = 0
+        self.mac_serial = 0
+
+    def device(self, x, y, device_type, port_count=simulator_core.DEFAULT_PORT_COUNT):
+        device = self.sim.device_class(x, y, device_type, port_count, mac_int=LOCAL_MAC_PREFIX | self.mac_serial)
+        self.mac_serial += 1
+        return device
+
+    def subnet(self, index, x, y):
+        """Build router + switch + hosts for one subnet and return the router."""
+        sim = self.sim
+        router = sim.register_device(self.device(x, y, 'router', self.router_ports))
+        switch = sim.register_device(self.device(x, y + ROW_HEIGHT, 'switch', self.switch_ports))
+        base = SUBNET_BASE | index << 8
+        gateway = int_to_ip(base | 1)
+        link = sim.link_devices(router, switch)
+        router.set_interface(link.port1, gateway, '255.255.255.0')
+        router.add_route(subnet_cidr(index), interface=link.port1)
+        for h in range(self.hosts_per_switch):
+            host = self.device(x + (h - self.hosts_per_switch / 2) * HOST_SPACING,
+                               y + 2 * ROW_HEIGHT, 'host')
+            host.ip = int_to_ip(base | (h + 2))
+            host.subnet_mask = '255.255.255.0'
+            host.gateway = gateway
+            sim.register_device(host)
+            sim.link_devices(switch, host)
+        return router
+
+    def router_link(self, router1, router2):
+        """Wire two routers with a /30 and return (port1, ip1, port2, ip2)."""
+        if self.link_count >= MAX_ROUTER_LINKS:
+            raise ValueError("Too many router links for 172.16.0.0/12")
+        link = self.sim.link_devices(router1, router2)
+        if link.port1 == -1 or link.port2 == -1:
+            raise ValueError("Router ran out of ports; raise router_ports")
+        base = LINK_BASE + 4 * self.link_count
+        self.link_count += 1
+        ip1, ip2 = int_to_ip(base + 1), int_to_ip(base + 2)
+        cidr = f"{int_to_ip(base)}/30"
+        router1.set_interface(link.port1, ip1, '255.255.255.252')
+        router2.set_interface(link.port2, ip2, '255.255.255.252')
+        router1.add_route(cidr, interface=link.port1)
+        router2.add_route(cidr, interface=link.port2)
+        return link.port1, ip1, link.port2, ip2
+
+
+def generate_network(sim, subnets=4, hosts_per_switch=4, core='tree', fanout=4, spines=2,
+                     router_ports=None, switch_ports=None, seed=0):
+    """
+    Replace sim's network with a generated one and return a summary dict.
+
+    router_ports and switch_ports default to just enough ports for the chosen
+    core; passing smaller values raises ValueError.
+    """
+    if core not in CORES:
+        raise ValueError(f"core must be one of {CORES}, got {core!r}")
+    if not 1 <= subnets <= MAX_SUBNETS:
+        raise ValueError(f"subnets must be between 1 and {MAX_SUBNETS}")
+    if not 0 <= hosts_per_switch <= MAX_HOSTS_PER_SWITCH:
+        raise ValueError(f"hosts_per_switch must be between 0 and {MAX_HOSTS_PER_SWITCH}")
+
+    needed_router_ports = {
+        'tree': fanout + 2,         # switch, parent, children
+        'ring': 3,                  # switch, two neighbours
+        'mesh': subnets,            # switch, every other router
+        'fat-tree': spines + 1,     # switch, every spine
+    }[core]
+    router_ports = router_ports or needed_router_ports
+    switch_ports = switch_ports or hosts_per_switch + 1
+    if router_ports < needed_router_ports:
+        raise ValueError(f"A {core} core needs {needed_router_ports} router ports")
+    if switch_ports < hosts_per_switch + 1:
+        raise ValueError(f"Switches need {hosts_per_switch + 1} ports")
+
+    rng = random.Random(seed)
+    sim.clear_network()
+    sim.task = None
+    builder = _Builder(sim, hosts_per_switch, router_ports, switch_ports, rng)
+
+    columns = max(1, int(subnets ** 0.5))
+    block_width = max(BLOCK_WIDTH, hosts_per_switch * HOST_SPACING)
+    routers = []
+    for index in range(subnets):
+        x = (index % columns) * block_width
+        y = (index // columns) * 4 * ROW_HEIGHT
+        routers.append(builder.subnet(index, x, y))
+
+    spine_routers = []
+    if core == 'tree':
+        _build_tree(builder, routers, fanout, rng)
+    elif core == 'ring':
+        _build_ring(builder, routers)
+    elif core == 'mesh':
+        _build_mesh(builder, routers)
+    else:
+        spine_routers = _build_fat_tree(builder, routers, spines, columns, block_width)
+
+    return {
+        'routers': len(routers) + len(spine_routers),
+        'switches': subnets,
+        'hosts': subnets * hosts_per_switch,
+        'devices': len(sim.devices),
+        'links': len(sim.links),
+    }
+
+
+def _build_tree(builder, routers, fanout, rng):
+    # Shape the tree first, then hand out subnets in preorder so each subtree
+    # owns a contiguous range of subnet indexes that summarizes into few routes.
+    children = _tree_children(len(routers), fanout, rng)
+    order = _preorder(children)
+    node_router = [None] * len(routers)
+    for position, node in enumerate(order):
+        node_router[node] = routers[position]
+    subtree_end = [0] * len(routers)  # Last preorder position in each node's subtree
+    position_of = {node: position for position, node in enumerate(order)}
+    for node in reversed(order):
+        subtree_end[node] = max([position_of[node]] + [subtree_end[c] for c in children[node]])
+
+    for node in order:
+        router = node_router[node]
+        for child in children[node]:
+            child_router = node_router[child]
+            port, ip, child_port, child_ip = builder.router_link(router, child_router)
+            for cidr in range_to_cidrs(position_of[child], subtree_end[child]):
+                router.add_route(cidr, interface=port, next_hop=child_ip)
+            child_router.add_route('0.0.0.0/0', interface=child_port, next_hop=ip)
+
+
+def _build_ring(builder, routers):
+    count = len(routers)
+    if count < 2:
+        return
+    if count == 2:
+        port0, ip0, port1, ip1 = builder.router_link(routers[0], routers[1])
+        routers[0].add_route(subnet_cidr(1), interface=port0, next_hop=ip1)
+        routers[1].add_route(subnet_cidr(0), interface=port1, next_hop=ip0)
+        return
+    # clockwise[i] = (port on router i towards i+1, IP of i+1 on that link); counter likewise
+    clockwise = [None] * count
+    counter = [None] * count
+    for i in range(count):
+        j = (i + 1) % count
+        port_i, ip_i, port_j, ip_j = builder.router_link(routers[i], routers[j])
+        clockwise[i] = (port_i, ip_j)
+        counter[j] = (port_j, ip_i)
+    half = (count - 1) // 2
+    for i, router in enumerate(routers):
+        # Clockwise covers the next `half` subnets, counter-clockwise the rest.
+        for (port, next_hop), first, length in ((clockwise[i], i + 1, half),
+                                                (counter[i], i + 1 + half, count - 1 - half)):
+            for lo, hi in _wrapped_ranges(first, length, count):
+                for cidr in range_to_cidrs(lo, hi):
+                    router.add_route(cidr, interface=port, next_hop=next_hop)
+
+
+def _wrapped_ranges(first, length, count):
+    """Split `length` indexes starting at first (mod count) into contiguous ranges."""
+    if length <= 0:
+        return []
+    first %= count
+    last = first + length - 1
+    if last < count:
+        return [(first, last)]
+    return [(first, count - 1), (0, last - count)]
+
+
+def _build_mesh(builder, routers):
+    for i, router in enumerate(routers):
+        for j in range(i + 1, len(routers)):
+            port_i, ip_i, port_j, ip_j = builder.router_link(router, routers[j])
+            router.add_route(subnet_cidr(j), interface=port_i, next_hop=ip_j)
+            routers[j].add_route(subnet_cidr(i), interface=port_j, next_hop=ip_i)
+
+
+def _build_fat_tree(builder, routers, spines, columns, block_width):
+    width = columns * block_width
+    spine_routers = [builder.sim.register_device(
+                         builder.device(width * (s + 1) / (spines + 1), -3 * ROW_HEIGHT, 'router', len(routers)))
+                     for s in range(spines)]
+    for index, router in enumerate(routers):
+        for s, spine in enumerate(spine_routers):
+            port, ip, spine_port, spine_ip = builder.router_link(router, spine)
+            spine.add_route(subnet_cidr(index), interface=spine_port, next_hop=ip)
+            # Edge routers spread their default routes over the spines
+            if s == index % spines:
+                router.add_route('0.0.0.0/0', interface=port, next_hop=spine_ip)
+    return spine_routers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a benchmark topology and report its size.")
+    parser.add_argument('--subnets', type=int, default=4)
+    parser.add_argument('--hosts-per-switch', type=int, default=4)
+    parser.add_argument('--core', choices=CORES, default='tree')
+    parser.add_argument('--fanout', type=int, default=4, help="Children per router in a tree core")
+    parser.add_argument('--spines', type=int, default=2, help="Spine routers in a fat-tree core")
+    parser.add_argument('--router-ports', type=int, default=None)
+    parser.add_argument('--switch-ports', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', metavar='PATH', help="Save the topology (.json, or compact binary otherwise)")
+    args = parser.parse_args(argv)
+
+    sim = simulator_core.NetworkSimulator()
+    started = time.perf_counter()
+    summary = generate_network(sim, args.subnets, args.hosts_per_switch, args.core, args.fanout,
+                               args.spines, args.router_ports, args.switch_ports, args.seed)
+    elapsed = time.perf_counter() - started
+    print(f"Built {summary['devices']} devices ({summary['routers']} routers, {summary['switches']} switches, "
+          f"{summary['hosts']} hosts) and {summary['links']} links in {elapsed:.2f} s")
+    if args.save:
+        topology_io.save(sim, args.save)
+        print(f"Saved to {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""Save and load simulator topologies.
+
+Two versioned formats hold the same things: devices (type, position, port
+count, MAC, IP, mask, gateway, router interfaces, routing table) and the
+wires between them (ports on each end, delay).
+
+    .json   human readable; one object per device and per link
+    other   compact binary, column by column: each numeric field of every
+            device or link is one packed array, and each text field one
+            NUL-separated blob, so loading is a few bulk reads and splits
+
+The binary format also stores every address already parsed, so loading a
+100k-device network does not parse a single IP. Neither format needs pygame;
+load() builds devices of whatever sim.device_class is.
+
+Example:
+    topology_io.save(sim, 'lab.json')
+    topology_io.load(other_sim, 'lab.json')
+"""
+import gc
+import json
+import struct
+import sys
+from array import array
+
+FORMAT = 'pdu-topology'
+VERSION = 1
+MAGIC = b'PDUTOPO\x00'
+
+HEADER = struct.Struct('<8sH')
+COUNTS = struct.Struct('<IIII')  # devices, interfaces, routes, links
+LENGTH = struct.Struct('<I')
+
+DEVICE_TYPES = ('host', 'router', 'switch', 'hub', 'bridge')
+NO_INT = -1  # Stands for None in the integer columns
+
+_DEVICE_CODES = {name: code for code, name in enumerate(DEVICE_TYPES)}
+
+
+def _is_json(path):
+    return str(path).lower().endswith('.json')
+
+
+def save(sim, path):
+    """Write sim's topology to path; JSON for .json files, binary otherwise."""
+    if _is_json(path):
+        with open(path, 'w') as f:
+            json.dump(to_dict(sim), f, indent=1)
+    else:
+        with open(path, 'wb') as f:
+            f.write(to_bytes(sim))
+
+
+def load(sim, path):
+    """Replace sim's network with the topology in path (either format); returns the devices in saved order."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    # Building many objects that are all kept alive sets off one cyclic
+    # collection after another; hold them off until the network is built.
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        if data.startswith(MAGIC):
+            return from_bytes(sim, data)
+        return from_dict(sim, json.loads(data))
+    finally:
+        if collecting:
+            gc.enable()
+
+########################################################################
+# JSON
+########################################################################
+def to_dict(sim):
+    index = {device: i for i, device in enumerate(sim.devices)}
+    devices = []
+    for device in sim.devices:
+        entry = {'type': device.type, 'x': device.x, 'y': device.y, 'ports': len(device.ports),
+                 'mac': device.mac, 'ip': device.ip, 'subnet_mask': device.subnet_mask,
+                 'gateway': device.gateway}
+        if device.interfaces:
+            entry['interfaces'] = {str(port): dict(interface) for port, interface in device.interfaces.items()}
+        if device.routing_table:
+            entry['routing_table'] = [dict(route) for route in device.routing_table]
+        devices.append(entry)
+    links = [{'devices': [index[link.device1], index[link.device2]],
+              'ports': [link.port1, link.port2], 'delay': link.delay}
+             for link in sorted(sim.links.values(), key=lambda link: link.id)]
+    return {'format': FORMAT, 'version': VERSION, 'devices': devices, 'links': links}
+
+
+def from_dict(sim, data):
+    if data.get('format') != FORMAT:
+        raise ValueError("Not a saved topology")
+    if data.get('version') != VERSION:
+        raise ValueError(f"Topology version {data.get('version')} is not supported (expected {VERSION})")
+    sim.clear_network()
+    sim.task = None
+    device_class = sim.device_class
+    devices = []
+    for entry in data['devices']:
+        device = device_class(entry['x'], entry['y'], entry['type'], entry['ports'])
+        device.mac = entry['mac']
+        device.ip = entry['ip']
+        device.subnet_mask = entry['subnet_mask']
+        device.gateway = entry['gateway']
+        if 'interfaces' in entry:
+            device.interfaces = {int(port): interface for port, interface in entry['interfaces'].items()}
+        if 'routing_table' in entry:
+            device.routing_table = entry['routing_table']
+        devices.append(sim.register_device(device))
+    for link in data['links']:
+        first, second = link['devices']
+        sim.link_devices(devices[first], devices[second], *link['ports'], link['delay'])
+    return devices
+
+########################################################################
+# Binary
+########################################################################
+def _column(typecode, values):
+    column = array(typecode, values)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+
+def _text(values):
+    joined = '\x00'.join(values)
+    if joined.count('\x00') != max(len(values) - 1, 0):
+        raise ValueError("Text fields cannot contain NUL characters")
+    data = joined.encode('utf-8')
+    return LENGTH.pack(len(data)) + data
+
+
+def _int_or_none(value):
+    return NO_INT if value is None else value
+
+
+def to_bytes(sim):
+    devices = sim.devices
+    index = {device: i for i, device in enumerate(devices)}
+    interfaces = [(port, interface) for device in devices for port, interface in device.interfaces.items()]
+    routes = [route for device in devices for route in device.routing_table]
+    links = sorted(sim.links.values(), key=lambda link: link.id)
+    parts = [
+        HEADER.pack(MAGIC, VERSION),
+        COUNTS.pack(len(devices), len(interfaces), len(routes), len(links)),
+        # Devices
+        _column('B', [_DEVICE_CODES[device.type] for device in devices]),
+        _column('d', [device.x for device in devices]),
+        _column('d', [device.y for device in devices]),
+        _column('H', [len(device.ports) for device in devices]),
+        _column('Q', [device.mac_int for device in devices]),
+        _column('q', [_int_or_none(device.ip_int) for device in devices]),
+        _column('q', [_int_or_none(device.mask_int) for device in devices]),
+        _column('q', [_int_or_none(device.gateway_int) for device in devices]),
+        _text([device.ip for device in devices]),
+        _text([device.subnet_mask for device in devices]),
+        _text([device.gateway for device in devices]),
+        # Router interfaces, in device order
+        _column('H', [len(device.interfaces) for device in devices]),
+        _column('H', [port for port, _ in interfaces]),
+        _text([interface.get('ip', '') for _, interface in interfaces]),
+        _text([interface.get('mask', '') for _, interface in interfaces]),
+        # Routing tables, in device order
+        _column('I', [len(device.routing_table) for device in devices]),
+        _text([route.get('network', '') for route in routes]),
+        _column('q', [_int_or_none(route.get('interface')) for route in routes]),
+        _text([route.get('next_hop') or '' for route in routes]),
+        # Links
+        _column('I', [index[link.device1] for link in links]),
+        _column('I', [index[link.device2] for link in links]),
+        _column('i', [link.port1 for link in links]),
+        _column('i', [link.port2 for link in links]),
+        _column('d', [link.delay for link in links]),
+    ]
+    return b''.join(parts)
+
+
+class _Columns:
+    """Reads the columns of a binary topology in order."""
+
+    def __init__(self, data, offset):
+        self.data = memoryview(data)
+        self.offset = offset
+
+    def column(self, typecode, count):
+        values = array(typecode)
+        end = self.offset + values.itemsize * count
+        if end > len(self.data):
+            raise ValueError("Truncated topology file")
+        values.frombytes(self.data[self.offset:end])
+        if sys.byteorder != 'little':
+            values.byteswap()
+        self.offset = end
+        return values
+
+    def text(self, count):
+        length, = LENGTH.unpack_from(self.data, self.offset)
+        start = self.offset + LENGTH.size
+        self.offset = start + length
+        if self.offset > len(self.data):
+            raise ValueError("Truncated topology file")
+        values = str(self.data[start:self.offset], 'utf-8').split('\x00') if count else []
+        if len(values) != count:
+            raise ValueError("Corrupt topology file")
+        return values
+
+
+def from_bytes(sim, data):
+    magic, version = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a saved topology")
+    if version != VERSION:
+        raise ValueError(f"Topology version {version} is not supported (expected {VERSION})")
+    device_count, interface_count, route_count, link_count = COUNTS.unpack_from(data, HEADER.size)
+    read = _Columns(data, HEADER.size + COUNTS.size)
+    types = [DEVICE_TYPES[code] for code in read.column('B', device_count)]
+    xs = read.column('d', device_count).tolist()
+    ys = read.column('d', device_count).tolist()
+    port_counts = read.column('H', device_count).tolist()
+    macs = read.column('Q', device_count).tolist()
+    ip_ints = read.column('q', device_count).tolist()
+    mask_ints = read.column('q', device_count).tolist()
+    gateway_ints = read.column('q', device_count).tolist()
+    ips = read.text(device_count)
+    masks = read.text(device_count)
+    gateways = read.text(device_count)
+    interface_counts = read.column('H', device_count).tolist()
+    interface_ports = read.column('H', interface_count).tolist()
+    interface_ips = read.text(interface_count)
+    interface_masks = read.text(interface_count)
+    route_counts = read.column('I', device_count).tolist()
+    route_networks = read.text(route_count)
+    route_interfaces = read.column('q', route_count).tolist()
+    route_next_hops = read.text(route_count)
+    link_first = read.column('I', link_count).tolist()
+    link_second = read.column('I', link_count).tolist()
+    link_port1 = read.column('i', link_count).tolist()
+    link_port2 = read.column('i', link_count).tolist()
+    link_delays = read.column('d', link_count).tolist()
+
+    sim.clear_network()
+    sim.task = None
+    device_class = sim.device_class
+    register = sim.register_device
+    devices = []
+    next_interface = next_route = 0
+    for i in range(device_count):
+        x, y = xs[i], ys[i]
+        device = device_class(int(x) if x.is_integer() else x, int(y) if y.is_integer() else y,
+                              types[i], port_counts[i], macs[i])
+        ip_int, mask_int, gateway_int = ip_ints[i], mask_ints[i], gateway_ints[i]
+        device.restore_addresses(ips[i], None if ip_int == NO_INT else ip_int,
+                                 masks[i], None if mask_int == NO_INT else mask_int,
+                                 gateways[i], None if gateway_int == NO_INT else gateway_int)
+        count = interface_counts[i]
+        if count:
+            end = next_interface + count
+            device.interfaces = {interface_ports[j]: {'ip': interface_ips[j], 'mask': interface_masks[j]}
+                                 for j in range(next_interface, end)}
+            next_interface = end
+        count = route_counts[i]
+        if count:
+            table = []
+            for j in range(next_route, next_route + count):
+                route = {'network': route_networks[j]}
+                if route_interfaces[j] != NO_INT:
+                    route['interface'] = route_interfaces[j]
+                if route_next_hops[j]:
+                    route['next_hop'] = route_next_hops[j]
+                table.append(route)
+            device.routing_table = table
+            next_route += count
+        devices.append(register(device))
+    link = sim.link_devices
+    for i in range(link_count):
+        link(devices[link_first[i]], devices[link_second[i]], link_port1[i], link_port2[i], link_delays[i])
+    return devices
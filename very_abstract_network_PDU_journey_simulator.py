@@ -1,25 +1,64 @@
+import argparse
+from collections import OrderedDict
+
 import pygame
-import random
-import time
-from collections import deque
-import ipaddress
-import copy
-
-# Initialize Pygame
-pygame.init()
+import simulator_core
+from event_log import EventLog, DEBUG
+from playback import Playback
+from event_trace import TraceReplay
+import topology_io
+
 WIDTH, HEIGHT = 1600, 800
 
 LOG_ENTRY_HEIGHT = 12
+LOG_LINE_CACHE_SIZE = 512  # Rendered log lines kept between frames
+TEXT_CACHE_SIZE = 2048     # Rendered labels, field values and button captions
 SCROLL_SPEED = 20
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-clock = pygame.time.Clock()
-pygame.font.init()
-font = pygame.font.SysFont('Arial', 18)
-small_font = pygame.font.SysFont('Arial', 16)
-very_small_font = pygame.font.SysFont('Arial', 10)
+PLAYBACK_STATUS_RECT = pygame.Rect(10, 550, 370, 22)  # Playback state, above the log box
+TIMELINE_RECT = pygame.Rect(410, HEIGHT - 34, 780, 24)  # Replay scrub bar along the bottom of the canvas
+SEEK_STEP = 0.01  # Fraction of a trace's events PageUp/PageDown jump
+DEFAULT_TOPOLOGY_PATH = 'network.json'  # Where Ctrl+S saves when no topology was opened
+
+# Canvas camera
+MIN_ZOOM = 0.02
+MAX_ZOOM = 4.0
+ZOOM_STEP = 1.15        # Zoom factor per mouse wheel notch
+PAN_STEP = 60           # Screen pixels per arrow key press
+LABEL_MIN_ZOOM = 0.6    # Below this, address labels are not drawn
+PORT_MIN_ZOOM = 0.35    # Below this, port dots are not drawn
+SHAPE_MIN_ZOOM = 0.15   # Below this, devices are plain squares
+LABEL_MARGIN = 160      # Screen pixels a label can stick out of its device
+WIRE_CELL_SIZE = 512    # World units per cell of the wire culling grid
+
+# In-flight packet markers
+PACKET_RADIUS = 5          # Screen pixels
+PACKET_POOL_SIZE = 256     # Marker slots allocated up front; the pool doubles when full
+PACKET_POOL_LIMIT = 65536  # Frames beyond this many in flight are not animated
+PACKET_RECT_LIMIT = 32     # Up to this many visible markers get a dirty rect each, beyond it one covers them all
+
+# Display, clock and fonts are created by init_display() so that importing this
+# module does not open a window.
+screen = None
+clock = None
+font = None
+small_font = None
+very_small_font = None
+
+def init_display():
+    """Initialize Pygame, open the window and load the fonts."""
+    global screen, clock, font, small_font, very_small_font
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    clock = pygame.time.Clock()
+    pygame.font.init()
+    font = pygame.font.SysFont('Arial', 18)
+    small_font = pygame.font.SysFont('Arial', 16)
+    very_small_font = pygame.font.SysFont('Arial', 10)
+    text_cache.clear()  # Surfaces rendered with the old fonts are useless now
 
 # constants
 SCROLL_BUTTON_SIZE = 12
+PANEL_INTERFACE_SLOTS = 4  # Router interfaces shown in the config panel
 SCROLL_BUTTON_COLOR = (200, 200, 200)
 
 # Colors and other constants
@@ -39,8 +78,95 @@ COLORS = {
     'input_text': (200, 200, 200),
     'example_text': (150, 150, 150),
     'log_box_background':(50, 50, 50),
+    'packet': (255, 255, 255),
+    'packet_arp': (255, 200, 0),
+    'packet_ack': (0, 200, 255),
 }
 
+########################################################################
+# Text Cache
+########################################################################
+class TextCache:
+    """
+    Bounded LRU of rendered text surfaces keyed by (font, text, colour).
+    A value that changes simply renders under a new key and the stale
+    surface ages out, so callers never need to invalidate by hand.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._surfaces = OrderedDict()
+
+    def __len__(self):
+        return len(self._surfaces)
+
+    def render(self, text_font, text, color):
+        key = (text_font, text, color)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            return surface
+        surface = text_font.render(text, True, color)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.size:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self._surfaces.clear()
+
+text_cache = TextCache(TEXT_CACHE_SIZE)
+
+def render_text(text_font, text, color=COLORS['text']):
+    """Render text through the shared cache."""
+    return text_cache.render(text_font, text, color)
+
+########################################################################
+# Camera
+########################################################################
+class Camera:
+    """
+    World <-> screen transform for the canvas. Devices keep world coordinates
+    in their rects; (x, y) is the world point shown at the window's top-left.
+    """
+    def __init__(self, x=0.0, y=0.0, zoom=1.0):
+        self.x = x
+        self.y = y
+        self.zoom = zoom
+
+    def state(self):
+        return (self.x, self.y, self.zoom)
+
+    def to_screen(self, x, y):
+        return round((x - self.x) * self.zoom), round((y - self.y) * self.zoom)
+
+    def to_world(self, x, y):
+        return x / self.zoom + self.x, y / self.zoom + self.y
+
+    def rect_to_screen(self, rect):
+        left, top = self.to_screen(rect.x, rect.y)
+        return pygame.Rect(left, top, max(1, round(rect.width * self.zoom)), max(1, round(rect.height * self.zoom)))
+
+    def rect_to_world(self, rect, margin=0):
+        """World (x0, y0, x1, y1) covered by a screen rect grown by margin screen pixels."""
+        x0, y0 = self.to_world(rect.left - margin, rect.top - margin)
+        x1, y1 = self.to_world(rect.right + margin, rect.bottom + margin)
+        return x0, y0, x1, y1
+
+    def pan(self, dx, dy):
+        """Move the view by a screen-space offset, as when dragging the canvas."""
+        self.x -= dx / self.zoom
+        self.y -= dy / self.zoom
+
+    def zoom_at(self, factor, pos):
+        """Zoom by factor keeping the world point under screen position pos in place."""
+        world_x, world_y = self.to_world(*pos)
+        self.zoom = max(MIN_ZOOM, min(MAX_ZOOM, self.zoom * factor))
+        self.x = world_x - pos[0] / self.zoom
+        self.y = world_y - pos[1] / self.zoom
+
+    def reset(self):
+        self.x, self.y, self.zoom = 0.0, 0.0, 1.0
+
 ########################################################################
 # Right Panel: Device Configuration Panel
 ########################################################################
@@ -85,8 +211,8 @@ class DeviceConfigPanel:
             self.add_field('gateway', 'Default Gateway:', device.gateway, y)
             y += 50
         elif device.type == 'router':
-            # For routers, show interface configuration for each port.
-            for i in range(4):
+            # For routers, show interface configuration for the first ports.
+            for i in range(min(len(device.ports), PANEL_INTERFACE_SLOTS)):
                 intf = device.interfaces.get(i, {'ip': '', 'mask': ''})
                 self.add_field(f'interface_ip_{i}', f'Interface {i+1} IP:', intf.get('ip', ''), y)
                 y += 40
@@ -118,6 +244,21 @@ class DeviceConfigPanel:
             'active': False
         }
 
+    def update_cursor(self, elapsed_ms):
+        """Toggle the cursor blink every 500 ms."""
+        self.cursor_timer += elapsed_ms
+        if self.cursor_timer > 500:
+            self.cursor_visible = not self.cursor_visible
+            self.cursor_timer = 0
+
+    def state_key(self):
+        """Everything the panel's pixels depend on, or None when it is hidden."""
+        if not self.current_device:
+            return None
+        return (self.current_device.uid, self.current_device.type,
+                tuple((name, field['value'], field['active']) for name, field in self.fields.items()),
+                self.cursor_visible and self.active_field is not None)
+
     def draw(self, surface):
         # Only draw if a device is selected.
         if not self.current_device:
@@ -125,15 +266,9 @@ class DeviceConfigPanel:
 
         # Draw panel background.
         pygame.draw.rect(surface, COLORS['panel'], self.rect)
-        title = font.render(f"{self.current_device.type.upper()} Configuration", True, COLORS['text'])
+        title = render_text(font, f"{self.current_device.type.upper()} Configuration")
         surface.blit(title, (WIDTH - 380, 10))
 
-        # Update cursor blinking (toggle every 500 ms)
-        self.cursor_timer += clock.get_time()
-        if self.cursor_timer > 500:
-            self.cursor_visible = not self.cursor_visible
-            self.cursor_timer = 0
-
         # Draw each field.
         for name, field in self.fields.items():
             # Draw the field background.
@@ -152,8 +287,8 @@ class DeviceConfigPanel:
                 else:
                     text = field['value']
                     text_color = COLORS['input_text']
-            label_surf = font.render(field['label'], True, COLORS['text'])
-            text_surf = font.render(text, True, text_color)
+            label_surf = render_text(font, field['label'])
+            text_surf = render_text(font, text, text_color)
             surface.blit(label_surf, (field['rect'].x, field['rect'].y - 20))
             surface.blit(text_surf, (field['rect'].x + 5, field['rect'].y + 5))
             # If active, draw a border.
@@ -162,67 +297,89 @@ class DeviceConfigPanel:
 
         # Draw save button.
         pygame.draw.rect(surface, COLORS['button'], self.save_button, border_radius=5)
-        save_text = font.render("SAVE", True, COLORS['text'])
+        save_text = render_text(font, "SAVE")
         surface.blit(save_text, (self.save_button.x + 30, self.save_button.y + 10))
 
 ########################################################################
 # Device Class
 ########################################################################
-class Device:
-    def __init__(self, x, y, device_type):
-        self.rect = pygame.Rect(x, y, 80, 80)
-        self.type = device_type  # 'host', 'router', 'switch', etc.
-        self.connections = []    # Devices connected by wires.
-        self.ports = []          # For routers/switches.
-        self.mac = ":".join(f"{random.randint(0,255):02x}" for _ in range(6))
-        self.ip = ""
-        self.subnet_mask = ""
-        self.gateway = ""
-        self.arp_table = {}
-        self.mac_table = {}
-        self.routing_table = []  # List of dicts, each with keys 'network' and 'next_hop'
-        self.interfaces = {}     # For routers: {port: {'ip': '', 'mask': ''}}
-        self.selected = False
-        self.pending_packets = {}  # {destination_ip: [packets]} (like a router buffer)
-
-        if self.type in ['router', 'switch']:
-            self.ports = [None] * 4
-
-    def get_available_port(self):
-        for i, port in enumerate(self.ports):
-            if port is None:
-                return i
-        return -1
-
-    def connect_port(self, port_num, device):
-        if 0 <= port_num < len(self.ports):
-            self.ports[port_num] = device
-
-    def draw(self, surface, sim):
-        color = COLORS[self.type]
-        pygame.draw.rect(surface, color, self.rect, border_radius=8)
-
-        # Draw highlight if active
-        if self == sim.active_device and pygame.time.get_ticks() < sim.highlight_end_time:
-            pygame.draw.rect(surface, (255, 255, 255), self.rect, 4, border_radius=8)
-
+class Device(simulator_core.Device):
+    """A simulator_core.Device that also knows how to draw itself."""
+    def __init__(self, x, y, device_type, port_count=simulator_core.DEFAULT_PORT_COUNT, mac_int=None):
+        # The rect must exist before the core sets x/y through the properties below.
+        self.rect = pygame.Rect(x, y, simulator_core.DEVICE_SIZE, simulator_core.DEVICE_SIZE)
+        super().__init__(x, y, device_type, port_count, mac_int)
+
+    @property
+    def x(self):
+        return self.rect.x
+
+    @x.setter
+    def x(self, value):
+        self.rect.x = value
+
+    @property
+    def y(self):
+        return self.rect.y
+
+    @y.setter
+    def y(self, value):
+        self.rect.y = value
+
+    def draw(self, surface, sim, camera=None):
+        camera = camera or Camera()
+        self.draw_body(surface, camera)
+        if sim.is_highlighted(self):
+            self.draw_highlight(surface, camera)
         if self.selected:
-            pygame.draw.rect(surface, COLORS['selected'], self.rect, 3, border_radius=8)
-        if self.type in ['router', 'switch']:
-            for i in range(4):
-                port_color = (0, 255, 0) if self.ports[i] else (255, 0, 0)
-                pygame.draw.circle(surface, port_color, (self.rect.right - 15, self.rect.top + 15 + i*15), 3)
+            pygame.draw.rect(surface, COLORS['selected'], camera.rect_to_screen(self.rect), 3,
+                             border_radius=round(8 * camera.zoom))
+
+    def draw_highlight(self, surface, camera):
+        pygame.draw.rect(surface, (255, 255, 255), camera.rect_to_screen(self.rect), 4,
+                         border_radius=round(8 * camera.zoom))
 
-        # random simple network:
+    def _labels(self, screen_rect, camera):
+        """(text, position) for the address labels drawn next to the device."""
+        if camera.zoom < LABEL_MIN_ZOOM:
+            return []
         if self.type == 'host':
-            # Draw IP text
-            text = font.render(self.ip, True, COLORS['text'])
-            surface.blit(text, (self.rect.centerx - 40, self.rect.bottom + 5))
-        elif self.type == 'router':
-            # Draw interface IPs
-            for i, intf in self.interfaces.items():
-                text = font.render(intf['ip'], True, COLORS['text'])
-                surface.blit(text, (self.rect.right + 5, self.rect.top + 15 + i * 20))
+            return [(self.ip, (screen_rect.centerx - 40, screen_rect.bottom + 5))]
+        if self.type == 'router':
+            top = screen_rect.top + round(15 * camera.zoom)
+            return [(intf['ip'], (screen_rect.right + 5, top + i * 20))
+                    for i, intf in self.interfaces.items()]
+        return []
+
+    def draw_bounds(self, camera):
+        """Screen area covered by draw_body(), labels included."""
+        screen_rect = camera.rect_to_screen(self.rect)
+        bounds = screen_rect.copy()
+        for text, position in self._labels(screen_rect, camera):
+            bounds.union_ip(pygame.Rect(position, render_text(font, text).get_size()))
+        return bounds
+
+    def draw_body(self, surface, camera):
+        """The device, its ports and labels, without highlight or selection."""
+        zoom = camera.zoom
+        screen_rect = camera.rect_to_screen(self.rect)
+        color = COLORS[self.type]
+        if zoom < SHAPE_MIN_ZOOM:
+            surface.fill(color, screen_rect)
+            return
+        pygame.draw.rect(surface, color, screen_rect, border_radius=round(8 * zoom))
+        if self.type in ['router', 'switch'] and zoom >= PORT_MIN_ZOOM:
+            # Squeeze the port dots together on devices with many ports
+            spacing = min(15, 60 / max(len(self.ports), 1))
+            dot_x = screen_rect.right - round(15 * zoom)
+            for i, port in enumerate(self.ports):
+                port_color = (0, 255, 0) if port else (255, 0, 0)
+                dot_y = screen_rect.top + round((15 + int(i * spacing)) * zoom)
+                pygame.draw.circle(surface, port_color, (dot_x, dot_y), max(1, round(3 * zoom)))
+
+        # Host IP or router interface IPs, left out when zoomed out
+        for text, position in self._labels(screen_rect, camera):
+            surface.blit(render_text(font, text), position)
 
 ########################################################################
 # Left Panel: Simple Panel for Adding/Connecting/Deleting/Setting Task
@@ -239,6 +396,10 @@ class LeftPanel:
             'set_task': {'rect': pygame.Rect(10, 400, 180, 40), 'label': "Set Task (T)"},
             'run': {'rect': pygame.Rect(10, 450, 180, 40), 'label': "Run Simulation"},
             'create_random': {'rect': pygame.Rect(10, 500, 220, 40), 'label': "Create Demo Network"},
+            'pause': {'rect': pygame.Rect(240, 400, 140, 40), 'label': "Pause/Play"},
+            'slower': {'rect': pygame.Rect(240, 450, 65, 40), 'label': "<<"},
+            'faster': {'rect': pygame.Rect(315, 450, 65, 40), 'label': ">>"},
+            'finish': {'rect': pygame.Rect(240, 500, 140, 40), 'label': "Run to End"},
             # 'prev_event': {'rect': pygame.Rect(10, 550, 180, 40),'label': "Previous Event"},
             # 'next_event':{'rect': pygame.Rect(10, 600, 180, 40),'label': "Next Event"}
         }
@@ -249,553 +410,69 @@ class LeftPanel:
 
         for btn in self.buttons.values():
             pygame.draw.rect(surface, COLORS['button'], btn['rect'], border_radius=5)
-            text = font.render(btn['label'], True, COLORS['text'])
+            text = render_text(font, btn['label'])
             surface.blit(text, (btn['rect'].x + 10, btn['rect'].y + 10))
 
 ########################################################################
 # Network Simulator Class
 ########################################################################
-class NetworkSimulator:
+class NetworkSimulator(simulator_core.NetworkSimulator):
+    """The core simulator plus the GUI panels and highlight timing."""
+    device_class = Device
+
     def __init__(self):
-        self.devices = []
-        self.wires = []  # Each wire is a tuple: (device1, device2, port1, port2)
+        super().__init__()
         self.selected_device = None
+        self.selected_devices = set()  # Devices drawn selected (dragged or picked to connect)
         self.left_panel = LeftPanel()
         self.panel = DeviceConfigPanel()  # Right configuration panel
-        self.event_queue = deque()
-        self.simulation_speed = 0.5  # Seconds between simulation steps
-        self.task = None  # A tuple: (source_device, destination_device)
-        self.simulation_running = False
-        self.active_device = None
+        self.simulation_speed = 0.5  # Wall-clock seconds per simulated hop at 1x playback
         self.highlight_end_time = 0  # Timestamp when highlight should end
-
-        self.event_snapshots = []  # List to hold snapshots (deep copies) of the network state
-        self.current_event_index = -1  # Pointer to the current event snapshot (-1 means none have run yet)
-        self.simulation_event_logs = []  # Holds the logs for the most recently processed event
-
-    def take_snapshot(self):
-        """Take a deep copy snapshot of the current network state."""
-        return {
-            'devices': copy.deepcopy(self.devices),
-            'wires': copy.deepcopy(self.wires),
-            'event_queue': copy.deepcopy(self.event_queue)
-        }
-
-    def restore_snapshot(self, snapshot):
-        """Restore the network state from a snapshot."""
-        self.devices = copy.deepcopy(snapshot['devices'])
-        self.wires = copy.deepcopy(snapshot['wires'])
-        self.event_queue = copy.deepcopy(snapshot['event_queue'])
-
-    def log_event(self, message):
-        """Log a message for the current event and print it."""
-        print(message, end="\n")
-        self.simulation_event_logs.append(message)
-
-    def handle_next_event(self):
-        """Process one event from the queue after recording a snapshot."""
-        if self.event_queue:
-            self.simulation_event_logs = []  # Clear logs for the new event
-            snapshot = self.take_snapshot()
-            self.event_snapshots.append(snapshot)
-            self.current_event_index += 1
-
-            event = self.event_queue.popleft()
-            self.process_next_event()
-        else:
-            self.log_event("No more events in the queue.")
-
-    def handle_previous_event(self):
-        """Revert the network state to the previous snapshot."""
-        if self.current_event_index > 0:
-            self.current_event_index -= 1
-            snapshot = self.event_snapshots[self.current_event_index]
-            self.restore_snapshot(snapshot)
-            self.log_event("Reverted to previous event snapshot.")
-        else:
-            self.log_event("No previous event to revert to.")
+        self.enable_history()  # Keep a step-back journal of processed events
+        self.event_log = EventLog(level=DEBUG, echo=True)  # Show every step in the log box and console
+        self.packets = PacketSprites()  # Frames on the wire, animated between send and arrival
 
     def set_active_device(self, device):
-        self.active_device = device
+        super().set_active_device(device)
         self.highlight_end_time = pygame.time.get_ticks() + 1000  # 1 second duration
 
-    def add_device(self, device_type, pos):
-        x, y = pos
-        new_device = Device(x - 40, y - 40, device_type)
-        self.devices.append(new_device)
-        print(f"Added {device_type} at ({x}, {y})")
-
-    def delete_device(self, device):
-        for conn in device.connections[:]:
-            self.disconnect_devices(device, conn)
-        if device in self.devices:
-            self.devices.remove(device)
-        print(f"Removed {device.type}")
-
-    def disconnect_devices(self, device1, device2):
-        if device2 in device1.connections:
-            device1.connections.remove(device2)
-        if device1 in device2.connections:
-            device2.connections.remove(device1)
-        self.wires = [w for w in self.wires if not ((w[0] == device1 and w[1] == device2) or (w[0] == device2 and w[1] == device1))]
-
-    def connect_devices(self, device1, device2):
-        port1 = device1.get_available_port() if device1.type in ['router', 'switch'] else -1
-        port2 = device2.get_available_port() if device2.type in ['router', 'switch'] else -1
-        if port1 != -1:
-            device1.connect_port(port1, device2)
-        if port2 != -1:
-            device2.connect_port(port2, device1)
-        device1.connections.append(device2)
-        device2.connections.append(device1)
-        self.wires.append((device1, device2, port1, port2))
-        print(f"Connected {device1.type} to {device2.type}")
-
-    def set_task(self, source, destination):
-        self.task = (source, destination)
-        print(f"Task set: {source.ip} -> {destination.ip}")
-
-    def start_simulation(self):
-        if not self.task:
-            print("No task set!")
-            return
-        src, dst = self.task
-        print(f"=== Starting simulation from {src.ip} to {dst.ip} ===")
-        self.event_queue.append(('send', src, dst, 'Hello', [src]))
-        self.simulation_running = True
-
-    def process_next_event(self):
-        if not self.event_queue:
-            return False
-
-        self.log_event("↓↓↓↓↓EVENT↓↓↓↓↓")
-        event = self.event_queue.popleft()
-        event_type = event[0]
-        if event_type == 'send':
-            self.handle_send(*event[1:])
-        elif event_type == 'forward':
-            self.handle_forward(*event[1:])
-        elif event_type == 'arp_request':
-            self.handle_arp_request(*event[1:])
-        elif event_type == 'arp_response':
-            self.handle_arp_response(*event[1:])
-        self.log_event("↑↑↑↑↑END OF EVENT↑↑↑↑↑\n")
-        return True
-
-    def ip_in_cidr(self,ip, cidr):
-        """
-        Return True if the given IP (a string) is within the CIDR network.
-        For example, ip_in_cidr("10.0.0.5", "10.0.0.0/24") returns True.
-        """
-        try:
-            return ipaddress.ip_address(ip) in ipaddress.ip_network(cidr, strict=False)
-        except ValueError:
-            return False
-
-    def get_source_ip(self, device, dst_ip):
-        """
-        For devices that have a routing table and multiple interfaces,
-        return the IP address of the interface that is appropriate for reaching dst_ip.
-        If no matching route is found, fall back to the first available interface,
-        or, if none, simply return device.ip.
-        """
-        if hasattr(device, 'routing_table') and device.routing_table and device.interfaces:
-            for route in device.routing_table:
-                if self.ip_in_cidr(dst_ip, route['network']):
-                    # route['interface'] is assumed to be the index of the interface.
-                    if route['interface'] in device.interfaces:
-                        return device.interfaces[route['interface']]['ip']
-            # Fallback: return the IP of the first interface (if any)
-            first_interface = list(device.interfaces.values())[0]
-            return first_interface['ip']
-        return device.ip
-
-
-    def handle_send(self, src, dst, payload, path):
-        self.set_active_device(src)
-
-        # Only proceed if host has connections
-        if not src.connections:
-            self.log_event(f"[HOST {src.ip}] Cannot send - no network connection!")
-            return
-
-        self.log_event(f"\n[HOST {src.ip}] Initiating send to {dst.ip}")
-
-        # Validate destination network
-        if not self.ip_in_network(dst.ip, src.subnet_mask, src.ip):
-            self.log_event(f"[HOST {src.ip}] Destination not local, using gateway {src.gateway}")
-            if not src.gateway:
-                self.log_event("[HOST] No gateway configured!")
-                return
-            dst_ip = src.gateway
-        else:
-            dst_ip = dst.ip
-
-        # ARP resolution
-        if dst_ip not in src.arp_table:
-            self.log_event(f"[HOST {src.ip}] ARP lookup failed for {dst_ip}")
-
-            self.log_event(f"[{src.ip}] Buffering packet while ARP resolves")
-            if dst_ip not in src.pending_packets:
-                src.pending_packets[dst_ip] = []
-            src.pending_packets[dst_ip].append({
-                'dst': dst,
-                'payload': payload,
-                'path': path
-            })
-
-            # Send ARP request through first connected interface
-            arp_frame = {
-                'src_mac': src.mac,
-                'dst_mac': "ff:ff:ff:ff:ff:ff",
-                'src_ip': self.get_source_ip(src, dst_ip),
-                'dst_ip': dst_ip,
-                'payload': 'ARP_REQUEST',
-                'ttl': 64
-            }
-            next_hop = src.connections[0]
-            new_path = path.copy()
-            new_path.append(next_hop)
-            self.event_queue.append(('forward', next_hop, arp_frame, new_path))
-            return
-
-        # Create frame and send through connected interface
-        frame = {
-            'src_mac': src.mac,
-            'dst_mac': src.arp_table[dst_ip],
-            'src_ip': src.ip,
-            'dst_ip': dst.ip,
-            'payload': payload,
-            'ttl': 64
-        }
-        self.log_event(f"[HOST {src.ip}] Sending frame via {src.connections[0].type}")
-        next_hop = src.connections[0]
-        new_path = path.copy()
-        new_path.append(next_hop)
-        self.event_queue.append(('forward', next_hop, frame, new_path))
-
-
-    def handle_forward(self, current_device, frame, path):
-        self.set_active_device(current_device)
-
-        frame['ttl'] -= 1
-        if frame['ttl'] <= 0:
-            self.log_event("Packet TTL expired!")
-            return
-
-        self.log_event(f"\n[{current_device.type.upper()}] {current_device.mac} processing frame:")
-        self.log_event(f"From: {frame['src_mac']} ({frame['src_ip']})")
-        self.log_event(f"To: {frame['dst_mac']} ({frame['dst_ip']})")
-
-        if current_device.type == 'host':
-            self.host_logic(current_device, frame, path)
-        elif current_device.type == 'switch':
-            self.switch_logic(current_device, frame, path)
-        elif current_device.type == 'router':
-            self.router_logic(current_device, frame, path)
-
-    def host_logic(self, host, frame, path):
-        # Only process frames addressed to this host's MAC or broadcast
-        if frame['dst_mac'] not in [host.mac, "ff:ff:ff:ff:ff:ff"]:
-            self.log_event(f"[HOST {host.ip}] Ignoring frame not addressed to us")
-            return
-
-        # Handle ARP responses first
-        if frame['payload'] == 'ARP_RESPONSE':
-            self.log_event(f"[HOST {host.ip}] Received ARP response for {frame['src_ip']}")
-            host.arp_table[frame['src_ip']] = frame['src_mac']
-
-            # Resend pending packets for this IP
-            if frame['src_ip'] in host.pending_packets:
-                for pkt in host.pending_packets[frame['src_ip']]:
-                    self.event_queue.appendleft(('send', host, pkt['dst'], pkt['payload'], pkt['path']))
-                del host.pending_packets[frame['src_ip']]
-            return
-
-        # Handle ARP requests
-        if frame['payload'] == 'ARP_REQUEST':
-            # Learn requester's IP/MAC even if not for us
-            host.arp_table[frame['src_ip']] = frame['src_mac']
-
-            if frame['dst_ip'] == host.ip:
-                self.log_event(f"[HOST {host.ip}] Responding to ARP")
-                self.handle_arp_response(
-                    target=host,
-                    requester_ip=frame['src_ip'],
-                    requester_mac=frame['src_mac'],
-                    path=path
-                )
-            else:
-                self.log_event(f"[HOST {host.ip}] Ignoring ARP frame not addressed to us")
-            return
-
-        # Handle normal IP packets
-        if frame['dst_ip'] == host.ip:
-            self.log_event(f"[HOST {host.ip}] Received payload: {frame['payload']}")
-
-            # Check if this is the final ACK for the original task
-            if frame['payload'] == 'ACK' and self.task and host == self.task[0]:
-                print("\n=== SIMULATION BEHAVED AS EXPECTED | SUCCESS ===")
-                self.log_event(f"Original sender {host.ip} received ACK from {frame['src_ip']}")
-                self.simulation_running = False
-                self.event_queue.clear()
-                return
-
-            # Only send ACK if this isn't already an ACK
-            if frame['payload'] != 'ACK' and host.connections:
-                response_frame = {
-                    'src_mac': host.mac,
-                    'dst_mac': frame['src_mac'],
-                    'src_ip': self.get_source_ip(host, frame['src_ip']),
-                    'dst_ip': frame['src_ip'],
-                    'payload': 'ACK',
-                    'ttl': 64
-                }
-                next_hop = host.connections[0]
-                new_path = [host]
-                self.event_queue.append(('forward', next_hop, response_frame, new_path))
-        else:
-            self.log_event(f"[HOST {host.ip}] Ignoring packet not meant for us")
-
-    def switch_logic(self, switch, frame, path):
-        # Learn MAC address from incoming port
-        incoming_device = path[-2] if len(path) > 1 else None
-        if incoming_device:
-            # Only learn if MAC isn't known or port changed
-            if (frame['src_mac'] not in switch.mac_table or
-                    switch.mac_table[frame['src_mac']] != incoming_device):
-                switch.mac_table[frame['src_mac']] = incoming_device
-                port = switch.ports.index(incoming_device)
-                self.log_event(f"[SWITCH] Learned {frame['src_mac']} on port {port}")
-
-        # Forwarding logic
-        if frame['dst_mac'] in switch.mac_table:
-            target = switch.mac_table[frame['dst_mac']]
-            if target in switch.connections:
-                self.log_event(f"[SWITCH] Forwarding to port {switch.ports.index(target)}")
-                new_path = path.copy()
-                new_path.append(target)
-                self.event_queue.append(('forward', target, frame, new_path))
-            else:
-                self.log_event("[SWITCH] Known MAC but no connection, dropping")
-        else:
-            self.log_event("[SWITCH] Flooding to all connected ports")
-            for conn in switch.connections:
-                if conn != incoming_device and conn not in path:
-                    new_path = path.copy()
-                    new_path.append(conn)
-                    self.event_queue.append(('forward', conn, frame, new_path))
-
-    def router_logic(self, router, frame, path):
-        # Handle ARP responses first
-        if frame['payload'] == 'ARP_RESPONSE':
-            self.log_event(f"[ROUTER] Received ARP response for {frame['src_ip']}")
-            router.arp_table[frame['src_ip']] = frame['src_mac']
-
-            # Resend pending packets for this IP
-            if frame['src_ip'] in router.pending_packets:
-                for pkt in router.pending_packets[frame['src_ip']]:
-                    self.event_queue.appendleft(('forward', router, pkt['frame'], pkt['path']))
-                del router.pending_packets[frame['src_ip']]
-            return
-
-        # First check for ARP requests
-        if frame['payload'] == 'ARP_REQUEST' and frame['dst_mac'] == "ff:ff:ff:ff:ff:ff":
-            # Learn requester's IP/MAC even if not for us
-            router.arp_table[frame['src_ip']] = frame['src_mac']
-
-            for intf in router.interfaces.values():
-                if intf['ip'] == frame['dst_ip']:
-                    self.log_event(f"[ROUTER] {intf['ip']} responding to ARP")
-                    self.handle_arp_response(
-                        target=router,
-                        requester_ip=frame['src_ip'],
-                        requester_mac=frame['src_mac'],
-                        path=path
-                    )
-                    return
-            return
-
-        if frame['dst_mac'] != router.mac:
-            self.log_event("[ROUTER] Frame not addressed to us, dropping")
-            return
-
-        self.log_event("[ROUTER] Processing IP packet")
-        best_route = None
-        for route in router.routing_table:
-            if self.ip_in_cidr(frame['dst_ip'], route['network']):
-                best_route = route
-                break
-
-        if not best_route:
-            self.log_event("[ROUTER] No route found, dropping packet")
-            return
-
-        self.log_event(f"[ROUTER] Routing to interface {best_route['interface']}")
-        # next_hop_ip = best_route['gateway'] or frame['dst_ip']
-        next_hop_ip = frame['dst_ip']
+    def is_highlighted(self, device):
+        return device is self.active_device and pygame.time.get_ticks() < self.highlight_end_time
 
-        # Find actual connected interface
-        interface_device = None
-        for port, conn in enumerate(router.ports):
-            if port == best_route['interface'] and conn is not None:
-                interface_device = conn
-                break
+    def select(self, device):
+        device.selected = True
+        self.selected_devices.add(device)
 
-        if not interface_device:
-            self.log_event("[ROUTER] Interface not connected, dropping")
-            return
-
-        # ARP resolution for next hop
-        if next_hop_ip not in router.arp_table:
-            self.log_event(f"[ROUTER] ARP lookup needed for {next_hop_ip}")
-            self.log_event(f"[ROUTER] Buffering packet and sending ARP")
-            if next_hop_ip not in router.pending_packets:
-                router.pending_packets[next_hop_ip] = []
-            router.pending_packets[next_hop_ip].append({
-                'frame': frame,
-                'path': path
-            })
-            self.event_queue.append(('arp_request', router, next_hop_ip, path))
-            return
+    def deselect(self, device):
+        device.selected = False
+        self.selected_devices.discard(device)
 
-        # Create new frame for next hop
-        new_frame = {
-            'src_mac': router.mac,
-            'dst_mac': router.arp_table[next_hop_ip],
-            'src_ip': frame['src_ip'],
-            'dst_ip': frame['dst_ip'],
-            'payload': frame['payload'],
-            'ttl': frame['ttl'] - 1
-        }
-
-        # Forward to connected interface
-        new_path = path.copy()
-        new_path.append(interface_device)
-        self.event_queue.append(('forward', interface_device, new_frame, new_path))
-
-    def handle_arp_request(self, requester, target_ip, path):
-        self.set_active_device(requester)
-
-        self.log_event(f"\n[ARP] Request from {requester.ip} for {target_ip}")
-
-        # Common frame setup
-        arp_frame = {
-            'dst_mac': "ff:ff:ff:ff:ff:ff",
-            'payload': 'ARP_REQUEST',
-            'ttl': 64
-        }
-
-        if requester.type == 'router':
-            # Router-specific ARP handling
-            interface_num = None
-            source_ip = None
-
-            # Find which interface should handle this ARP request
-            for route in requester.routing_table:
-                if self.ip_in_cidr(target_ip, route['network']):
-                    interface_num = route['interface']
-                    source_ip = requester.interfaces.get(interface_num, {}).get('ip')
-                    break
-
-            if interface_num is None or not source_ip:
-                self.log_event(f"[ARP] No route to {target_ip}, dropping request")
-                return
-
-            # Get connected device for this interface
-            if interface_num >= len(requester.ports) or not requester.ports[interface_num]:
-                self.log_event(f"[ARP] Interface {interface_num} not connected")
-                return
-
-            connected_device = requester.ports[interface_num]
-
-            # Complete frame for router
-            arp_frame.update({
-                'src_mac': requester.mac,
-                'src_ip': source_ip,
-                'dst_ip': target_ip
-            })
-
-            # Send only through the target interface
-            new_path = path.copy()
-            new_path.append(connected_device)
-            self.event_queue.append(('forward', connected_device, arp_frame, new_path))
-        else:
-            # Host/bridge/switch ARP handling
-            arp_frame.update({
-                'src_mac': requester.mac,
-                'src_ip': requester.ip,
-                'dst_ip': target_ip
-            })
-
-            # Broadcast to all connections
-            self.log_event(f"[ARP] Broadcasting request through connected devices")
-            for connected_device in requester.connections:
-                new_path = path.copy()
-                new_path.append(connected_device)
-                self.event_queue.append(('forward', connected_device, arp_frame, new_path))
-
-
-    def find_device_by_mac(self, mac):
-        for device in self.devices:
-            if device.mac == mac:
-                return device
-        return None
-
-    def handle_arp_response(self, target, requester_ip, requester_mac, path):
-        self.set_active_device(target)
-
-        self.log_event(f"[ARP] {target.ip} responding to {requester_ip}")
-
-        # Get the last hop from the path (device that delivered the request to us)
-        if len(path) < 1:
-            self.log_event("[ARP] Invalid path for response")
-            return
+    def delete_device(self, device):
+        self.deselect(device)
+        self.packets.discard_device(device)
+        super().delete_device(device)
 
-        last_hop = path[-2]  # Last device that delivered the ARP request to us
+    def clear_network(self):
+        for device in list(self.selected_devices):
+            self.deselect(device)
+        self.packets.clear()
+        super().clear_network()
 
-        # Verify this last_hop is actually connected to us
-        if last_hop not in target.connections:
-            self.log_event(f"[ARP] {target.ip} has no connection to {last_hop.type}, dropping response")
-            return
+    def start_simulation(self):
+        self.packets.clear()
+        super().start_simulation()
 
-        # Create response frame
-        response_frame = {
-            'src_mac': target.mac,
-            'dst_mac': requester_mac,  # Direct unicast to requester
-            'src_ip': self.get_source_ip(target, requester_ip),
-            'dst_ip': requester_ip,
-            'payload': 'ARP_RESPONSE',
-            'ttl': 64
-        }
+    def on_transmit(self, sender, receiver, payload, arrive):
+        self.packets.launch(sender, receiver, self.now, arrive, packet_kind(payload))
 
-        # Always send back through the same interface that received the request
-        self.log_event(f"[ARP] Sending response through {last_hop.type}")
-        new_path = [target, last_hop]  # Start reverse path
-        self.event_queue.append(('forward', last_hop, response_frame, new_path))
-
-    def ip_in_network(self, ip, subnet_mask, source_ip):
-        if not subnet_mask:
-            return False
-        ip_parts = list(map(int, ip.split('.')))
-        src_parts = list(map(int, source_ip.split('.')))
-        mask_parts = list(map(int, subnet_mask.split('.')))
-        for i in range(4):
-            if ip_parts[i] & mask_parts[i] != src_parts[i] & mask_parts[i]:
-                return False
-        return True
-
-    def find_device_by_ip(self, ip):
-        for device in self.devices:
-            if device.ip == ip:
-                return device
-        return None
+    def on_rewind(self):
+        self.packets.clear()
 
     def draw(self, surface):
-        for device1, device2, _, _ in self.wires:
-            pygame.draw.line(surface, COLORS['wire'], device1.rect.center, device2.rect.center, 2)
+        for link in self.links.values():
+            pygame.draw.line(surface, COLORS['wire'], link.device1.rect.center, link.device2.rect.center, 2)
         for device in self.devices:
-            device.draw(surface)
+            device.draw(surface, self)
         pygame.draw.rect(surface, COLORS['panel'], self.left_panel.rect)
         self.left_panel.draw(surface)
         self.panel.draw(surface)
@@ -809,104 +486,574 @@ class NetworkSimulator:
         if device.type == 'host':
             device.gateway = self.panel.fields['gateway']['value']
         elif device.type == 'router':
-            for i in range(4):
+            for i in range(min(len(device.ports), PANEL_INTERFACE_SLOTS)):
                 ip_field = self.panel.fields.get(f'interface_ip_{i}', {})
                 mask_field = self.panel.fields.get(f'interface_mask_{i}', {})
                 ip_val = ip_field.get('value', '')
                 mask_val = mask_field.get('value', '')
                 if ip_val and mask_val:
-                    device.interfaces[i] = {'ip': ip_val, 'mask': mask_val}
+                    device.set_interface(i, ip_val, mask_val)
             new_routes = []
             for key in self.panel.fields:
                 if key.startswith('route_net_'):
                     index = key.split('_')[-1]
                     net = self.panel.fields.get(f'route_net_{index}', {}).get('value', '')
                     next_hop = self.panel.fields.get(f'route_next_{index}', {}).get('value', '')
-                    if net and next_hop:
-                        new_routes.append({'network': net, 'next_hop': next_hop})
+                    # Keep the interface of routes that were not entered through the panel
+                    route = dict(device.routing_table[int(index)])
+                    if net and (next_hop or 'interface' in route):
+                        route['network'] = net
+                        if next_hop:
+                            route['next_hop'] = next_hop
+                        else:
+                            route.pop('next_hop', None)
+                        new_routes.append(route)
             new_net = self.panel.fields.get('new_route_net', {}).get('value', '')
             new_next = self.panel.fields.get('new_route_next', {}).get('value', '')
             if new_net and new_next:
                 new_routes.append({'network': new_net, 'next_hop': new_next})
             device.routing_table = new_routes
+        self.reindex_device(device)
         self.log_event(f"Saved configuration for {device.type} with IP {device.ip}")
 
     def create_random_network(self):
-        # Clear existing network
-        self.devices.clear()
-        self.wires.clear()
-        self.task = None
-
-        # Create router with 2 interfaces
-        router = Device(WIDTH // 2, HEIGHT // 2, 'router')
-        router.interfaces = {
-            0: {'ip': '192.168.1.1', 'mask': '255.255.255.0'},
-            1: {'ip': '10.0.0.1', 'mask': '255.255.255.0'}
-        }
-        router.routing_table = [
-            {'network': '192.168.1.0/24', 'interface': 0},
-            {'network': '10.0.0.0/24', 'interface': 1}
-        ]
-        self.devices.append(router)
-
-        # Create switches
-        switch1 = Device(WIDTH // 2 - 200, HEIGHT // 2, 'switch')
-        switch2 = Device(WIDTH // 2 + 200, HEIGHT // 2, 'switch')
-        self.devices.extend([switch1, switch2])
-
-        # Connect switches to router
-        self.connect_devices(router, switch1)
-        self.connect_devices(router, switch2)
-
-        # Create hosts for network 192.168.1.0/24
-        for i in range(2):
-            host = Device(switch1.rect.x - 150, switch1.rect.y + i * 150, 'host')
-            host.ip = f'192.168.1.{10 + i}'
-            host.subnet_mask = '255.255.255.0'
-            host.gateway = '192.168.1.1'
-            self.connect_devices(switch1, host)
-            self.devices.append(host)
-
-        # Create host for network 10.0.0.0/24
-        host = Device(switch2.rect.x + 150, switch2.rect.y, 'host')
-        host.ip = '10.0.0.10'
-        host.subnet_mask = '255.255.255.0'
-        host.gateway = '10.0.0.1'
-        self.connect_devices(switch2, host)
-        self.devices.append(host)
-
-        # Position devices
-        for i, dev in enumerate(self.devices):
-            if dev.type == 'switch':
-                dev.rect.center = (router.rect.centerx + (-200 if i == 1 else 200), router.rect.centery)
-            elif dev.type == 'host':
-                dev.rect.center = (dev.rect.centerx, dev.rect.centery)
+        super().create_random_network(origin=(WIDTH // 2, HEIGHT // 2))
+
+########################################################################
+# Log Box
+########################################################################
+class LogView:
+    """
+    Scrollable view of the current event's log records. Only the lines inside
+    the box are looked up and drawn each frame, and rendered lines are reused
+    from a TextCache, so the cost per frame does not grow with the log.
+    """
+    def __init__(self, rect):
+        self.rect = rect
+        self.scroll_offset = 0  # Pixels scrolled from the first line
+        self.up_button_rect = pygame.Rect(rect.right - SCROLL_BUTTON_SIZE + 10, rect.top + 25,
+                                          SCROLL_BUTTON_SIZE, SCROLL_BUTTON_SIZE)
+        self.down_button_rect = pygame.Rect(rect.right - SCROLL_BUTTON_SIZE + 10,
+                                            rect.bottom - SCROLL_BUTTON_SIZE - 5,
+                                            SCROLL_BUTTON_SIZE, SCROLL_BUTTON_SIZE)
+        self._lines = TextCache(LOG_LINE_CACHE_SIZE)  # Separate so scrolling cannot evict labels
+
+    @property
+    def visible_height(self):
+        return self.rect.height - 30
+
+    def max_scroll(self, event_log):
+        return max(0, event_log.current_event_count() * LOG_ENTRY_HEIGHT - self.visible_height)
+
+    def scroll(self, dy, event_log):
+        self.scroll_offset = max(0, min(self.scroll_offset + dy, self.max_scroll(event_log)))
+
+    def handle_click(self, pos, event_log):
+        if self.up_button_rect.collidepoint(pos):
+            self.scroll(-LOG_ENTRY_HEIGHT, event_log)
+        elif self.down_button_rect.collidepoint(pos):
+            self.scroll(LOG_ENTRY_HEIGHT, event_log)
+
+    def draw(self, surface, event_log):
+        rect = self.rect
+        pygame.draw.rect(surface, COLORS['log_box_background'], rect)
+        header_text = render_text(small_font, "Logs:")
+        surface.blit(header_text, (rect.x + 5, rect.y + 5))
+
+        entries = event_log.current_event_count()
+        content_height = entries * LOG_ENTRY_HEIGHT
+        visible_height = self.visible_height
+        self.scroll_offset = max(0, min(self.scroll_offset, self.max_scroll(event_log)))
+
+        # Only the records that intersect the box are fetched and drawn
+        first = self.scroll_offset // LOG_ENTRY_HEIGHT
+        last = (self.scroll_offset + visible_height) // LOG_ENTRY_HEIGHT + 1
+        content_top = rect.y + 25
+        previous_clip = surface.get_clip()
+        surface.set_clip(pygame.Rect(rect.x + 5, content_top, rect.width - 20, visible_height))
+        for i, record in enumerate(event_log.current_event_slice(first, last), first):
+            surface.blit(self._lines.render(very_small_font, record.message, COLORS['text']),
+                         (rect.x + 10, content_top + i * LOG_ENTRY_HEIGHT - self.scroll_offset))
+        surface.set_clip(previous_clip)
+
+        # Draw scroll bar only if needed
+        if content_height > visible_height:
+            scrollbar_height = (visible_height ** 2) / content_height
+            scrollbar_pos = (self.scroll_offset / content_height) * (visible_height - scrollbar_height)
+            # Keep the thumb grabbable when the log is very long
+            scrollbar_height = max(scrollbar_height, 4)
+
+            pygame.draw.rect(surface, COLORS['text'],
+                             (rect.right - 8, content_top + scrollbar_pos, 6, scrollbar_height))
+
+            pygame.draw.rect(surface, SCROLL_BUTTON_COLOR, self.up_button_rect)
+            pygame.draw.polygon(surface, (0, 0, 0), [
+                (self.up_button_rect.centerx, self.up_button_rect.top + 3),
+                (self.up_button_rect.left + 3, self.up_button_rect.bottom - 3),
+                (self.up_button_rect.right - 3, self.up_button_rect.bottom - 3)
+            ])
+
+            # Draw down button
+            pygame.draw.rect(surface, SCROLL_BUTTON_COLOR, self.down_button_rect)
+            pygame.draw.polygon(surface, (0, 0, 0), [
+                (self.down_button_rect.centerx, self.down_button_rect.bottom - 3),
+                (self.down_button_rect.left + 3, self.down_button_rect.top + 3),
+                (self.down_button_rect.right - 3, self.down_button_rect.top + 3)
+            ])
+
+########################################################################
+# Replay Timeline
+########################################################################
+class Timeline:
+    """Scrub bar for a trace replay: shows how far it has played and seeks to where it is clicked."""
+    def __init__(self, rect, replay):
+        self.rect = rect
+        self.replay = replay
+        self.dragging = False
+
+    def time_at(self, x):
+        fraction = min(max((x - self.rect.x) / self.rect.width, 0.0), 1.0)
+        return fraction * self.replay.duration
+
+    def state_key(self):
+        return (self.replay.position, self.replay.now)
+
+    def draw(self, surface):
+        replay = self.replay
+        duration = replay.duration
+        pygame.draw.rect(surface, COLORS['panel'], self.rect, border_radius=4)
+        if duration > 0:
+            played = self.rect.copy()
+            played.width = round(self.rect.width * min(replay.now / duration, 1.0))
+            if played.width:
+                pygame.draw.rect(surface, COLORS['button'], played, border_radius=4)
+        label = render_text(font, f"Event {replay.position:,} / {len(replay):,}   "
+                                  f"{replay.now * 1000:.3f} / {duration * 1000:.3f} ms")
+        surface.blit(label, (self.rect.x + 8, self.rect.centery - label.get_height() // 2))
+
+########################################################################
+# In-flight Packets
+########################################################################
+_packet_markers = {}
+
+def packet_marker(kind):
+    """The marker sprite for a kind of frame ('packet', 'packet_arp' or 'packet_ack')."""
+    marker = _packet_markers.get(kind)
+    if marker is None:
+        marker = pygame.Surface((PACKET_RADIUS * 2, PACKET_RADIUS * 2), pygame.SRCALPHA)
+        pygame.draw.circle(marker, COLORS[kind], (PACKET_RADIUS, PACKET_RADIUS), PACKET_RADIUS)
+        _packet_markers[kind] = marker
+    return marker
+
+def packet_kind(payload):
+    if payload in ('ARP_REQUEST', 'ARP_RESPONSE'):
+        return 'packet_arp'
+    if payload == 'ACK':
+        return 'packet_ack'
+    return 'packet'
+
+class _Packet:
+    __slots__ = ('sender', 'receiver', 'depart', 'arrive', 'sprite')
+
+    def __init__(self):
+        self.sender = None
+        self.receiver = None
+        self.depart = 0.0
+        self.arrive = 0.0
+        self.sprite = [None, [0, 0]]  # (marker, screen position) entry handed to Surface.blits
+
+
+class PacketSprites:
+    """
+    Markers for frames on the wire, placed between sender and receiver by how
+    far the simulated clock is between the send and arrival times. Slots come
+    from a pool and are reused, and `batch` is a list kept trimmed to the
+    visible markers that goes out in a single Surface.blits call, so animating
+    a frame allocates nothing per packet.
+    """
+    def __init__(self, capacity=PACKET_POOL_SIZE):
+        self.pool = []     # Idle slots
+        self.active = []   # Slots of frames in flight
+        self.batch = []    # Sprites of the visible slots
+        self.visible = 0
+        self.capacity = 0
+        self._grow(capacity)
+
+    def __len__(self):
+        return len(self.active)
+
+    def _grow(self, count):
+        self.pool.extend(_Packet() for _ in range(count))
+        self.capacity += count
+
+    def launch(self, sender, receiver, depart, arrive, kind):
+        if not self.pool:
+            if self.capacity >= PACKET_POOL_LIMIT:
+                return
+            self._grow(min(self.capacity, PACKET_POOL_LIMIT - self.capacity))
+        packet = self.pool.pop()
+        packet.sender = sender
+        packet.receiver = receiver
+        packet.depart = depart
+        packet.arrive = arrive
+        packet.sprite[0] = packet_marker(kind)
+        self.active.append(packet)
+
+    def _release(self, packet):
+        packet.sender = packet.receiver = None
+        self.pool.append(packet)
+
+    def clear(self):
+        for packet in self.active:
+            self._release(packet)
+        self.active.clear()
+        self.batch.clear()
+        self.visible = 0
+
+    def discard_device(self, device):
+        """Drop the frames travelling to or from a deleted device."""
+        keep = []
+        for packet in self.active:
+            if packet.sender is device or packet.receiver is device:
+                self._release(packet)
+            else:
+                keep.append(packet)
+        self.active[:] = keep
+
+    def update(self, now, camera, area):
+        """
+        Retire frames that have arrived by simulated time now and position the
+        rest. Returns the screen rect covering the visible markers, or None.
+        """
+        active = self.active
+        batch = self.batch
+        zoom = camera.zoom
+        cam_x = camera.x
+        cam_y = camera.y
+        left = area.left - PACKET_RADIUS
+        top = area.top - PACKET_RADIUS
+        right = area.right - PACKET_RADIUS
+        bottom = area.bottom - PACKET_RADIUS
+        min_x = min_y = float('inf')
+        max_x = max_y = float('-inf')
+        keep = 0
+        visible = 0
+        batch_len = len(batch)
+        for packet in active:
+            if packet.arrive <= now:
+                self._release(packet)
+                continue
+            active[keep] = packet
+            keep += 1
+            progress = (now - packet.depart) / (packet.arrive - packet.depart)
+            if progress < 0.0:
+                progress = 0.0
+            start = packet.sender.rect.center
+            end = packet.receiver.rect.center
+            x = round((start[0] + (end[0] - start[0]) * progress - cam_x) * zoom) - PACKET_RADIUS
+            y = round((start[1] + (end[1] - start[1]) * progress - cam_y) * zoom) - PACKET_RADIUS
+            if x < left or x >= right or y < top or y >= bottom:
+                continue
+            sprite = packet.sprite
+            position = sprite[1]
+            position[0] = x
+            position[1] = y
+            if visible < batch_len:
+                batch[visible] = sprite
+            else:
+                batch.append(sprite)
+                batch_len += 1
+            visible += 1
+            if x < min_x:
+                min_x = x
+            if x > max_x:
+                max_x = x
+            if y < min_y:
+                min_y = y
+            if y > max_y:
+                max_y = y
+        del active[keep:]
+        del batch[visible:]
+        self.visible = visible
+        if not visible:
+            return None
+        return pygame.Rect(min_x, min_y, max_x - min_x + PACKET_RADIUS * 2, max_y - min_y + PACKET_RADIUS * 2)
+
+    def draw(self, surface):
+        surface.blits(self.batch, doreturn=False)
+
+########################################################################
+# Renderer
+########################################################################
+def _line_bounds(start, end, width=2):
+    left, right = sorted((start[0], end[0]))
+    top, bottom = sorted((start[1], end[1]))
+    return pygame.Rect(left, top, right - left + 1, bottom - top + 1).inflate(width * 2, width * 2)
+
+class SegmentGrid:
+    """
+    Links bucketed by every grid cell their wire passes through, so the wires
+    crossing the view can be found without looking at the rest, including
+    long wires whose two ends are both off screen.
+    """
+    def __init__(self, cell_size=WIRE_CELL_SIZE):
+        self.cell_size = cell_size
+        self._cells = {}   # (cx, cy) -> set of links
+        self._where = {}   # link -> cells it is stored in
+
+    def _cells_for(self, start, end):
+        # Walk the cells along the segment (Amanatides & Woo grid traversal)
+        size = self.cell_size
+        (x0, y0), (x1, y1) = start, end
+        cx, cy = int(x0 // size), int(y0 // size)
+        end_cx, end_cy = int(x1 // size), int(y1 // size)
+        dx, dy = x1 - x0, y1 - y0
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        t_max_x = ((cx + (step_x > 0)) * size - x0) / dx if dx else float('inf')
+        t_max_y = ((cy + (step_y > 0)) * size - y0) / dy if dy else float('inf')
+        t_delta_x = size / abs(dx) if dx else float('inf')
+        t_delta_y = size / abs(dy) if dy else float('inf')
+        cells = [(cx, cy)]
+        for _ in range(abs(end_cx - cx) + abs(end_cy - cy)):
+            if t_max_x < t_max_y:
+                cx += step_x
+                t_max_x += t_delta_x
+            else:
+                cy += step_y
+                t_max_y += t_delta_y
+            cells.append((cx, cy))
+        return cells
+
+    def insert(self, link):
+        cells = self._cells_for(link.device1.rect.center, link.device2.rect.center)
+        self._where[link] = cells
+        for cell in cells:
+            self._cells.setdefault(cell, set()).add(link)
+
+    def remove(self, link):
+        for cell in self._where.pop(link, ()):
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.discard(link)
+                if not bucket:
+                    del self._cells[cell]
+
+    def rebuild(self, links):
+        self._cells.clear()
+        self._where.clear()
+        for link in links:
+            self.insert(link)
+
+    def query_rect(self, x0, y0, x1, y1):
+        """Links that pass through a grid cell overlapping the rectangle."""
+        size = self.cell_size
+        found = set()
+        cells = self._cells
+        for cx in range(int(x0 // size), int(x1 // size) + 1):
+            for cy in range(int(y0 // size), int(y1 // size) + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        return found
+
+class Renderer:
+    """
+    Draws the window in two layers and only pushes changed areas to the display.
+
+    The static layer holds the background, the wires and every device that is
+    not selected, as seen through the camera. Only devices and wires inside the
+    view are drawn, found through sim.spatial_index and a SegmentGrid of wires.
+    It is redrawn only when sim.topology_version, the camera or the set of
+    selected devices changes. Everything else is an overlay item with a state
+    key: selected devices and their wires, the highlight, the panels and the
+    log box. Each frame, items whose key or area changed mark their old and new
+    areas dirty; those areas are restored from the static layer, the overlays
+    that touch them are redrawn, and only they are updated on screen. A frame
+    where nothing changed draws nothing.
+    """
+    def __init__(self, surface, camera=None):
+        self.surface = surface
+        self.camera = camera or Camera()
+        self.static = pygame.Surface(surface.get_size())
+        self.wire_index = SegmentGrid()
+        self._static_state = None   # (topology_version, selected devices, camera) the static layer shows
+        self._indexed_version = None
+        self._drawn = {}            # Overlay name -> (key, rect) as last drawn
+
+    def _update_wire_index(self, sim, previous_floating):
+        if sim.topology_version != self._indexed_version:
+            self.wire_index.rebuild(sim.links.values())
+            self._indexed_version = sim.topology_version
+            return
+        # Devices that were being dragged may have moved their wires
+        for device in previous_floating:
+            for link in device.connections.values():
+                self.wire_index.remove(link)
+                self.wire_index.insert(link)
+
+    def visible_devices(self, sim, margin=LABEL_MARGIN):
+        """Devices inside the view (labels included), in drawing order."""
+        area = self.camera.rect_to_world(self.surface.get_rect(), margin)
+        return sorted(sim.spatial_index.query_rect(*area), key=lambda device: device.uid)
+
+    @staticmethod
+    def _neighbors(floating):
+        """Devices wired to the selected ones; they are drawn over the moving wires."""
+        return {neighbor for device in floating for neighbor in device.connections} - floating
+
+    def _rebuild_static(self, sim, floating):
+        static = self.static
+        camera = self.camera
+        static.fill(COLORS['background'])
+        area = camera.rect_to_world(static.get_rect())
+        for link in self.wire_index.query_rect(*area):
+            if link.device1 not in floating and link.device2 not in floating:
+                pygame.draw.line(static, COLORS['wire'], camera.to_screen(*link.device1.rect.center),
+                                 camera.to_screen(*link.device2.rect.center), 2)
+        neighbors = self._neighbors(floating)
+        for device in self.visible_devices(sim):
+            if device not in floating and device not in neighbors:
+                device.draw_body(static, camera)
+
+    def overlay_items(self, sim, log_view, floating, playback, timeline=None):
+        """(name, key, rect, draw) for everything above the static layer, bottom first."""
+        camera = self.camera
+        items = []
+        wires = {}
+        for device in floating:
+            for link in device.connections.values():
+                wires[link.id] = link
+        # Unselected devices under those wires are redrawn so the wires stay beneath them.
+        # The selection's neighbours always are, and are left out of the static layer.
+        covered = self._neighbors(floating)
+        for link in wires.values():
+            start = camera.to_screen(*link.device1.rect.center)
+            end = camera.to_screen(*link.device2.rect.center)
+            bounds = _line_bounds(start, end)
+            items.append((('wire', link.id), (start, end), bounds,
+                          lambda surface, start=start, end=end:
+                          pygame.draw.line(surface, COLORS['wire'], start, end, 2)))
+            for device in sim.spatial_index.query_rect(*camera.rect_to_world(bounds, LABEL_MARGIN)):
+                if device not in floating and device.draw_bounds(camera).colliderect(bounds):
+                    covered.add(device)
+        for device in sorted(covered, key=lambda device: device.uid):
+            items.append((('covered', device.uid), device.rect.topleft, device.draw_bounds(camera),
+                          lambda surface, device=device: device.draw_body(surface, camera)))
+        for device in floating:
+            items.append((('device', device.uid), (device.rect.topleft, device.selected), device.draw_bounds(camera),
+                          lambda surface, device=device: device.draw(surface, sim, camera)))
+        active = sim.active_device
+        if active is not None and active in sim.devices and sim.is_highlighted(active):
+            items.append(('highlight', active.rect.topleft, camera.rect_to_screen(active.rect),
+                          lambda surface: active.draw_highlight(surface, camera)))
+        packets = sim.packets
+        now = playback.time
+        bounds = packets.update(now, camera, self.surface.get_rect())
+        if bounds is not None and packets.visible <= PACKET_RECT_LIMIT:
+            # A few markers spread over the canvas would make their union most of the screen
+            size = PACKET_RADIUS * 2
+            for i, sprite in enumerate(packets.batch):
+                x, y = sprite[1]
+                items.append((('packet', i), (sprite[0], x, y), pygame.Rect(x, y, size, size),
+                              lambda surface, sprite=sprite: surface.blit(*sprite)))
+        elif bounds is not None:
+            items.append(('packets', (now, len(packets)), bounds, packets.draw))
+        if timeline is not None:
+            items.append(('timeline', timeline.state_key(), timeline.rect, timeline.draw))
+        items.append(('left_panel', None, sim.left_panel.rect, sim.left_panel.draw))
+        status = f"{playback.status()}   t = {sim.now * 1000:.3f} ms"
+        items.append(('playback', status, PLAYBACK_STATUS_RECT,
+                      lambda surface: surface.blit(render_text(font, status), PLAYBACK_STATUS_RECT.topleft)))
+        log = sim.event_log
+        items.append(('log', (id(log), log.total, log.current_event_count(), log_view.scroll_offset),
+                      log_view.rect, lambda surface: log_view.draw(surface, log)))
+        panel_key = sim.panel.state_key()
+        if panel_key is not None:
+            items.append(('config_panel', panel_key, sim.panel.rect, sim.panel.draw))
+        return items
+
+    def render(self, sim, log_view, playback, timeline=None):
+        """Draw whatever changed since the last call and return the updated rects."""
+        screen_rect = self.surface.get_rect()
+        floating = frozenset(sim.selected_devices)
+        items = self.overlay_items(sim, log_view, floating, playback, timeline)
+
+        state = (sim.topology_version, floating, self.camera.state())
+        if state != self._static_state:
+            self._update_wire_index(sim, self._static_state[1] if self._static_state else ())
+            self._rebuild_static(sim, floating)
+            self._static_state = state
+            dirty = [screen_rect]
+        else:
+            dirty = []
+            for name, key, rect, _ in items:
+                previous = self._drawn.get(name)
+                if previous is None or previous[0] != key or previous[1] != rect:
+                    dirty.append(rect)
+                    if previous is not None:
+                        dirty.append(previous[1])
+            names = {item[0] for item in items}
+            dirty.extend(rect for name, (key, rect) in self._drawn.items() if name not in names)
+        self._drawn = {name: (key, rect) for name, key, rect, _ in items}
+
+        # Merge overlapping areas so nothing is drawn twice
+        merged = []
+        for rect in dirty:
+            rect = rect.clip(screen_rect)
+            if not rect.width or not rect.height:
+                continue
+            index = rect.collidelist(merged)
+            while index != -1:
+                rect.union_ip(merged.pop(index))
+                index = rect.collidelist(merged)
+            merged.append(rect)
+
+        surface = self.surface
+        for area in merged:
+            surface.set_clip(area)
+            surface.blit(self.static, area, area)
+            for _, _, rect, draw in items:
+                if rect.colliderect(area):
+                    draw(surface)
+        surface.set_clip(None)
+        if merged:
+            pygame.display.update(merged)
+        return merged
 
 ########################################################################
 # Main Program
 ########################################################################
-def main():
+def main(replay=None, topology=None):
+    """
+    Run the editor, or play back the trace file at replay without simulating.
+    topology is a saved network to open; Ctrl+S saves the network back to it
+    (or to DEFAULT_TOPOLOGY_PATH).
+    """
+    init_display()
     sim = NetworkSimulator()
+    if topology:
+        topology_io.load(sim, topology)
+        print(f"Loaded {len(sim.devices)} devices from {topology}")
+    save_path = topology or DEFAULT_TOPOLOGY_PATH
     running = True
     connecting = False
     first_device = None
     task_source = None
-    log_box_rect = pygame.Rect(10, 580, 370, 200)
-
-    up_button_rect = pygame.Rect(
-        log_box_rect.right - SCROLL_BUTTON_SIZE + 10,
-        log_box_rect.top + 25,
-        SCROLL_BUTTON_SIZE,
-        SCROLL_BUTTON_SIZE
-    )
-
-    down_button_rect = pygame.Rect(
-        log_box_rect.right - SCROLL_BUTTON_SIZE +10,
-        log_box_rect.bottom - SCROLL_BUTTON_SIZE - 5,
-        SCROLL_BUTTON_SIZE,
-        SCROLL_BUTTON_SIZE
-    )
-    log_scroll_offset = 0  # Initialize scroll position
+    log_view = LogView(pygame.Rect(10, 580, 370, 200))
+    camera = Camera()
+    renderer = Renderer(screen, camera)
+    timeline = None
+    if replay:
+        replay = TraceReplay(replay, sim)
+        timeline = Timeline(TIMELINE_RECT, replay)
+        playback = Playback(replay, sim.simulation_speed)
+        playback.start()
+    else:
+        playback = Playback(sim, sim.simulation_speed)
+    seek_to = None  # Simulated time the timeline was dragged to this frame
+    panning = False      # Right mouse button drags the view
+    drag_offset = (0, 0)  # World offset from the dragged device's corner to the mouse
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -915,16 +1062,20 @@ def main():
             # Handle mouse button down events.
             if event.type == pygame.MOUSEBUTTONDOWN:
                 x, y = event.pos
+                if event.button in (4, 5):
+                    continue  # Wheel notches arrive as MOUSEWHEEL events
+                if event.button == 3:
+                    panning = True
+                    continue
 
                 mouse_pos = pygame.mouse.get_pos()
 
-                if up_button_rect.collidepoint(mouse_pos):
-                    log_scroll_offset = max(0, log_scroll_offset - LOG_ENTRY_HEIGHT)
+                log_view.handle_click(mouse_pos, sim.event_log)
 
-                elif down_button_rect.collidepoint(mouse_pos):
-                    log_content_height = len(sim.simulation_event_logs) * LOG_ENTRY_HEIGHT
-                    max_scroll = max(0, log_content_height - (log_box_rect.height - 30))
-                    log_scroll_offset = min(log_scroll_offset + LOG_ENTRY_HEIGHT, max_scroll)
+                if timeline is not None and timeline.rect.collidepoint(x, y):
+                    timeline.dragging = True
+                    seek_to = timeline.time_at(x)
+                    continue
 
                 # Check if click is in left panel.
                 if sim.left_panel.rect.collidepoint(x, y):
@@ -934,6 +1085,15 @@ def main():
                             if btn_type == 'run':
                                 if sim.task:
                                     sim.start_simulation()
+                                    playback.start()
+                            elif btn_type == 'pause':
+                                playback.toggle_pause()
+                            elif btn_type == 'slower':
+                                playback.slower()
+                            elif btn_type == 'faster':
+                                playback.faster()
+                            elif btn_type == 'finish':
+                                playback.finish()
                             elif btn_type == 'create_random':
                                 sim.create_random_network()
                             elif btn_type == 'prev_event':
@@ -969,11 +1129,8 @@ def main():
                     continue
 
                 # Check if a device was clicked.
-                clicked_device = None
-                for device in reversed(sim.devices):
-                    if device.rect.collidepoint(x, y):
-                        clicked_device = device
-                        break
+                world_x, world_y = camera.to_world(x, y)
+                clicked_device = sim.device_at(world_x, world_y)
 
                 if clicked_device:
                     if sim.left_panel.current_action == 'delete':
@@ -982,10 +1139,10 @@ def main():
                     elif sim.left_panel.current_action == 'connect':
                         if not first_device:
                             first_device = clicked_device
-                            first_device.selected = True
+                            sim.select(first_device)
                         else:
                             sim.connect_devices(first_device, clicked_device)
-                            first_device.selected = False
+                            sim.deselect(first_device)
                             first_device = None
                             sim.left_panel.current_action = None
                     elif sim.left_panel.current_action == 'set_task':
@@ -999,16 +1156,23 @@ def main():
                                 sim.left_panel.current_action = None
                     else:
                         sim.selected_device = clicked_device
-                        clicked_device.selected = True
+                        sim.select(clicked_device)
+                        drag_offset = (world_x - clicked_device.x, world_y - clicked_device.y)
                         sim.panel.setup_fields(clicked_device)
                 else:
                     if sim.left_panel.current_action in ['host', 'router', 'switch', 'hub', 'bridge']:
-                        sim.add_device(sim.left_panel.current_action, (x, y))
+                        sim.add_device(sim.left_panel.current_action, (round(world_x), round(world_y)))
                         sim.left_panel.current_action = None
 
-            if event.type == pygame.MOUSEMOTION and sim.selected_device:
-                dx, dy = event.rel
-                sim.selected_device.rect.move_ip(dx, dy)
+            if event.type == pygame.MOUSEMOTION and panning:
+                camera.pan(*event.rel)
+            elif event.type == pygame.MOUSEMOTION and timeline is not None and timeline.dragging:
+                seek_to = timeline.time_at(event.pos[0])
+            elif event.type == pygame.MOUSEMOTION and sim.selected_device:
+                world_x, world_y = camera.to_world(*event.pos)
+                device = sim.selected_device
+                sim.move_device(device, round(world_x - drag_offset[0]) - device.x,
+                                round(world_y - drag_offset[1]) - device.y)
 
             if event.type == pygame.KEYDOWN and sim.panel.active_field:
                 field = sim.panel.fields.get(sim.panel.active_field)
@@ -1019,96 +1183,79 @@ def main():
                     field['value'] = field['value'][:-1]
                 else:
                     field['value'] += event.unicode
-
-            if event.type == pygame.MOUSEBUTTONUP and sim.selected_device:
-                sim.selected_device.selected = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_s and event.mod & pygame.KMOD_CTRL:
+                    topology_io.save(sim, save_path)
+                    print(f"Saved {len(sim.devices)} devices to {save_path}")
+                elif event.key == pygame.K_LEFT:
+                    camera.pan(PAN_STEP, 0)
+                elif event.key == pygame.K_RIGHT:
+                    camera.pan(-PAN_STEP, 0)
+                elif event.key == pygame.K_UP:
+                    camera.pan(0, PAN_STEP)
+                elif event.key == pygame.K_DOWN:
+                    camera.pan(0, -PAN_STEP)
+                elif event.key == pygame.K_HOME:
+                    camera.reset()
+                elif event.key == pygame.K_SPACE:
+                    playback.toggle_pause()
+                elif event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+                    playback.faster()
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    playback.slower()
+                elif event.key == pygame.K_END:
+                    playback.finish()
+                elif event.key == pygame.K_PERIOD:
+                    if replay:
+                        replay.process_next_event()
+                    else:
+                        sim.handle_next_event()
+                    playback.sync()
+                elif event.key == pygame.K_COMMA:
+                    if replay:
+                        replay.seek(replay.position - 1)
+                    else:
+                        sim.handle_previous_event()
+                    playback.sync()
+                elif event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN) and replay:
+                    step = max(1, round(len(replay) * SEEK_STEP))
+                    replay.seek(replay.position + (step if event.key == pygame.K_PAGEDOWN else -step))
+                    playback.sync()
+
+            if event.type == pygame.MOUSEBUTTONUP and event.button == 3:
+                panning = False
+            elif event.type == pygame.MOUSEBUTTONUP and timeline is not None and timeline.dragging:
+                timeline.dragging = False
+            elif event.type == pygame.MOUSEBUTTONUP and sim.selected_device:
+                sim.deselect(sim.selected_device)
                 sim.selected_device = None
             # handle mouse wheel events
             if event.type == pygame.MOUSEWHEEL:
-                if log_box_rect.collidepoint(pygame.mouse.get_pos()):
-                    # Calculate maximum valid scroll offset
-                    log_content_height = len(sim.simulation_event_logs) * LOG_ENTRY_HEIGHT
-                    max_scroll = max(0, log_content_height - log_box_rect.height + 30)
-
-                    # Update scroll offset with clamping
-                    log_scroll_offset = max(0, min(log_scroll_offset + event.y * SCROLL_SPEED, max_scroll))
-
-        if sim.simulation_running:
-            if sim.process_next_event():
-                time.sleep(sim.simulation_speed)
-            else:
-                sim.simulation_running = False
-                print("=== Simulation completed ===")
-
-        screen.fill(COLORS['background'])
-        for device1, device2, _, _ in sim.wires:
-            pygame.draw.line(screen, COLORS['wire'], device1.rect.center, device2.rect.center, 2)
-        for device in sim.devices:
-            device.draw(screen,sim)
-        pygame.draw.rect(screen, COLORS['panel'], sim.left_panel.rect)
-        sim.left_panel.draw(screen)
-
-        pygame.draw.rect(screen, COLORS['log_box_background'], log_box_rect)
-
-        # Draw header
-        header_text = small_font.render("Logs:", True, COLORS['text'])
-        screen.blit(header_text, (log_box_rect.x + 5, log_box_rect.y + 5))
-
-        # Calculate content parameters
-        log_entries = len(sim.simulation_event_logs)
-        log_content_height = log_entries * LOG_ENTRY_HEIGHT
-        visible_height = log_box_rect.height - 30
-
-        # Create scrollable content surface
-        log_content_surface = pygame.Surface((log_box_rect.width - 20, max(log_content_height, visible_height)))
-        log_content_surface.fill(COLORS['log_box_background'])
-
-        # Render log entries
-        if log_entries > 0:
-            for i, log in enumerate(sim.simulation_event_logs):
-                log_text = very_small_font.render(log, True, COLORS['text'])
-                log_content_surface.blit(log_text, (5, i * LOG_ENTRY_HEIGHT))
-
-        # Calculate and clamp scroll offset
-        max_scroll = max(0, log_content_height - visible_height)
-        log_scroll_offset = max(0, min(log_scroll_offset, max_scroll))
-
-        # Draw visible portion
-        screen.blit(log_content_surface,
-                    (log_box_rect.x + 5, log_box_rect.y + 25),
-                    (0, log_scroll_offset, log_box_rect.width - 20, visible_height))
-
-        # Draw scroll bar only if needed
-        if log_content_height > visible_height:
-            scrollbar_height = (visible_height ** 2) / log_content_height
-            scrollbar_pos = (log_scroll_offset / log_content_height) * (visible_height - scrollbar_height)
-
-            pygame.draw.rect(screen, COLORS['text'],
-                             (log_box_rect.right - 8,
-                              log_box_rect.y + 25 + scrollbar_pos,
-                              6,
-                              scrollbar_height))
-
-            pygame.draw.rect(screen, SCROLL_BUTTON_COLOR, up_button_rect)
-            pygame.draw.polygon(screen, (0, 0, 0), [
-                (up_button_rect.centerx, up_button_rect.top + 3),
-                (up_button_rect.left + 3, up_button_rect.bottom - 3),
-                (up_button_rect.right - 3, up_button_rect.bottom - 3)
-            ])
-
-            # Draw down button
-            pygame.draw.rect(screen, SCROLL_BUTTON_COLOR, down_button_rect)
-            pygame.draw.polygon(screen, (0, 0, 0), [
-                (down_button_rect.centerx, down_button_rect.bottom - 3),
-                (down_button_rect.left + 3, down_button_rect.top + 3),
-                (down_button_rect.right - 3, down_button_rect.top + 3)
-            ])
-
-        sim.panel.draw(screen)
-        pygame.display.flip()
+                mouse_pos = pygame.mouse.get_pos()
+                if log_view.rect.collidepoint(mouse_pos):
+                    log_view.scroll(event.y * SCROLL_SPEED, sim.event_log)
+                elif not sim.left_panel.rect.collidepoint(mouse_pos) and not (
+                        sim.panel.current_device and sim.panel.rect.collidepoint(mouse_pos)):
+                    camera.zoom_at(ZOOM_STEP ** event.y, mouse_pos)
+
+        # Dragging the timeline seeks once per frame, to where the mouse ended up
+        if seek_to is not None:
+            replay.seek_time(seek_to)
+            playback.sync()
+            seek_to = None
+
+        # The simulation runs on the playback clock, a time-budgeted slice per frame
+        playback.advance()
+
+        sim.panel.update_cursor(clock.get_time())
+        renderer.render(sim, log_view, playback, timeline)
         clock.tick(60)
 
     pygame.quit()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Interactive PDU journey simulator.")
+    parser.add_argument('--replay', metavar='TRACE', help="Play back a trace recorded with --trace")
+    parser.add_argument('--topology', metavar='PATH', help="Open a saved topology (.json or binary)")
+    args = parser.parse_args()
+    main(args.replay, args.topology)